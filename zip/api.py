@@ -0,0 +1,358 @@
+import argparse
+import asyncio
+import json
+import logging
+import math
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from pathlib import Path
+
+import numpy as np
+
+import audit
+import drift
+import shadow
+from cache import feature_key, get_prediction_cache
+from hooks import after_prediction
+from metrics import get_metrics, stage_timer, start_log_dump
+from microbatch import get_batcher
+from registry import get_registry
+from startup import prewarm, prewarm_requested
+from utils import (
+    DIABETES_GENDER_OPTIONS,
+    HEART_GENDER_OPTIONS,
+    SMOKING_OPTIONS,
+    YES_NO_OPTIONS,
+    ArtifactLoadError,
+    build_diabetes_features,
+    build_heart_features,
+    predict_risk,
+)
+
+
+DEFAULT_PORT = 8000
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4"
+MAX_BODY_BYTES = 16 * 1024 * 1024
+
+
+class RequestError(Exception):
+    """Raised for malformed requests; carries the HTTP status to answer with."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _prediction_label(prediction):
+    return "High Risk" if prediction == 1 else "Low Risk"
+
+
+def _diabetes_row(patient):
+    return build_diabetes_features(**patient), {}
+
+
+def _heart_row(patient):
+    features, bmi = build_heart_features(**patient)
+    return features, {"bmi": float(bmi)}
+
+
+ROW_BUILDERS = {
+    "diabetes": _diabetes_row,
+    "heart": _heart_row,
+}
+
+# Per disease: inputs that must be finite numbers
+NUMERIC_FIELDS = {
+    "diabetes": ("age", "bmi", "hba1c", "glucose"),
+    "heart": ("age", "height_cm", "weight_kg", "systolic_bp", "diastolic_bp", "cholesterol", "glucose"),
+}
+# Per disease: categorical inputs and the choices the app offers for them
+CHOICE_FIELDS = {
+    "diabetes": {
+        "gender_opt": DIABETES_GENDER_OPTIONS,
+        "smoking_opt": SMOKING_OPTIONS,
+        "hypertension_opt": YES_NO_OPTIONS,
+        "heart_disease_opt": YES_NO_OPTIONS,
+    },
+    "heart": {"gender": HEART_GENDER_OPTIONS},
+}
+# Per disease: yes/no inputs, given as true/false or 0/1
+FLAG_FIELDS = {
+    "diabetes": (),
+    "heart": ("smoke", "alco", "active"),
+}
+
+
+def _number(disease, name, value):
+    if isinstance(value, bool):
+        raise RequestError(HTTPStatus.BAD_REQUEST, f"Invalid {disease} inputs: {name} must be a number")
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise RequestError(HTTPStatus.BAD_REQUEST, f"Invalid {disease} inputs: {name} must be a number")
+    if not math.isfinite(number):
+        raise RequestError(HTTPStatus.BAD_REQUEST, f"Invalid {disease} inputs: {name} must be finite")
+    return number
+
+
+def _choice(disease, name, value, options):
+    if value not in options:
+        choices = ", ".join(json.dumps(option) for option in options)
+        raise RequestError(HTTPStatus.BAD_REQUEST, f"Invalid {disease} inputs: {name} must be one of {choices}")
+    return value
+
+
+def _flag(disease, name, value):
+    if not isinstance(value, int) or value not in (0, 1):
+        raise RequestError(HTTPStatus.BAD_REQUEST, f"Invalid {disease} inputs: {name} must be true, false, 0 or 1")
+    return bool(value)
+
+
+def _build_row(disease, patient):
+    if not isinstance(patient, dict):
+        raise RequestError(HTTPStatus.BAD_REQUEST, "Each patient must be a JSON object")
+    patient = dict(patient)
+    for name in NUMERIC_FIELDS[disease]:
+        if name in patient:
+            patient[name] = _number(disease, name, patient[name])
+    for name, options in CHOICE_FIELDS[disease].items():
+        if name in patient:
+            patient[name] = _choice(disease, name, patient[name], options)
+    for name in FLAG_FIELDS[disease]:
+        if name in patient:
+            patient[name] = _flag(disease, name, patient[name])
+    try:
+        features, extra = ROW_BUILDERS[disease](patient)
+    except (TypeError, ValueError, ZeroDivisionError) as exc:
+        raise RequestError(HTTPStatus.BAD_REQUEST, f"Invalid {disease} inputs: {exc}")
+    if not np.isfinite(features).all():
+        raise RequestError(HTTPStatus.BAD_REQUEST, f"Invalid {disease} inputs: values must be finite")
+    return features, extra
+
+
+def _content_length(headers):
+    """Parse Content-Length, raising RequestError for anything but a non-negative integer."""
+    value = headers.get("content-length") or "0"
+    if not value.isdigit():
+        raise RequestError(HTTPStatus.BAD_REQUEST, "Invalid Content-Length")
+    return int(value)
+
+
+def _result(prediction, probability, extra):
+    return {
+        "prediction": int(prediction),
+        "probability": float(probability),
+        "label": _prediction_label(prediction),
+        **extra,
+    }
+
+
+class InferenceService:
+    """
+    JSON prediction API served straight from asyncio.
+
+    Single-patient requests are answered from the prediction cache or go
+    through the per-disease MicroBatcher, so concurrent clients share
+    vectorized model calls; batch requests are
+    scored in a thread pool so the event loop never blocks on the model.
+    """
+
+    def __init__(self, workers=None):
+        self.executor = ThreadPoolExecutor(max_workers=workers or os.cpu_count())
+
+    async def predict_one(self, disease, patient):
+        start = time.perf_counter()
+        features, extra = _build_row(disease, patient)
+        cache = get_prediction_cache()
+        version = get_registry().version(disease)
+        key = feature_key(disease, version, features)
+        cached = cache.get(key)
+        scoring_seconds = None
+        if cached is None:
+            scoring_start = time.perf_counter()
+            result = await asyncio.wrap_future(get_batcher(disease).submit(features))
+            scoring_seconds = time.perf_counter() - scoring_start
+            cached = (int(result.labels[0]), float(result.probabilities[0]))
+            cache.put(key, cached)
+        after_prediction(
+            disease, version, features, cached[0], cached[1], scoring_seconds, time.perf_counter() - start
+        )
+        return _result(*cached, extra)
+
+    async def predict_batch(self, disease, payload):
+        patients = payload.get("patients") if isinstance(payload, dict) else None
+        if not isinstance(patients, list):
+            raise RequestError(HTTPStatus.BAD_REQUEST, 'Batch body must be {"patients": [...]}')
+        if not patients:
+            return {"results": []}
+        start = time.perf_counter()
+        rows = [_build_row(disease, patient) for patient in patients]
+        features = np.vstack([row for row, _ in rows])
+        version = get_registry().version(disease)
+        loop = asyncio.get_running_loop()
+        scoring_start = time.perf_counter()
+        result = await loop.run_in_executor(self.executor, self._score, disease, features)
+        scoring_seconds = time.perf_counter() - scoring_start
+        after_prediction(
+            disease, version, features, result.labels, result.probabilities, scoring_seconds,
+            time.perf_counter() - start,
+        )
+        return {
+            "results": [
+                _result(label, probability, extra)
+                for label, probability, (_, extra) in zip(result.labels, result.probabilities, rows)
+            ]
+        }
+
+    def _score(self, disease, features):
+        return predict_risk(get_registry().get_compiled(disease), None, features)
+
+    async def route(self, method, path, body):
+        if method == "GET" and path == "/health":
+            return {"status": "ok"}
+        if method == "GET" and path == "/metrics":
+            return get_metrics().prometheus()
+        if method == "GET" and path == "/drift":
+            return drift.drift_report()
+        if method == "GET" and path == "/shadow":
+            return shadow.shadow_report()
+        parts = path.strip("/").split("/")
+        if method != "POST" or len(parts) not in (2, 3) or parts[0] != "predict":
+            raise RequestError(HTTPStatus.NOT_FOUND, f"No route for {method} {path}")
+        disease = parts[1]
+        if disease not in ROW_BUILDERS or (len(parts) == 3 and parts[2] != "batch"):
+            raise RequestError(HTTPStatus.NOT_FOUND, f"No route for {method} {path}")
+        try:
+            payload = json.loads(body or b"{}")
+        except ValueError:
+            raise RequestError(HTTPStatus.BAD_REQUEST, "Body is not valid JSON")
+        if len(parts) == 3:
+            return await self.predict_batch(disease, payload)
+        return await self.predict_one(disease, payload)
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, target, version = request_line.decode("latin1").split()
+                except ValueError:
+                    await self._respond(writer, HTTPStatus.BAD_REQUEST, {"error": "Bad request line"}, False)
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                keep_alive = headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+                try:
+                    length = _content_length(headers)
+                except RequestError as exc:
+                    await self._respond(writer, exc.status, {"error": str(exc)}, False)
+                    break
+                if length > MAX_BODY_BYTES:
+                    await self._respond(writer, HTTPStatus.REQUEST_ENTITY_TOO_LARGE, {"error": "Body too large"}, False)
+                    break
+                body = await reader.readexactly(length) if length else b""
+
+                try:
+                    with stage_timer("api_request"):
+                        status, payload = HTTPStatus.OK, await self.route(method, target.split("?")[0], body)
+                except RequestError as exc:
+                    status, payload = exc.status, {"error": str(exc)}
+                except ArtifactLoadError as exc:
+                    status, payload = HTTPStatus.SERVICE_UNAVAILABLE, {"error": str(exc)}
+                except Exception as exc:
+                    status, payload = HTTPStatus.INTERNAL_SERVER_ERROR, {"error": f"Prediction failed: {exc}"}
+                await self._respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, writer, status, payload, keep_alive):
+        if isinstance(payload, str):
+            body, content_type = payload.encode(), PROMETHEUS_CONTENT_TYPE
+        else:
+            body, content_type = json.dumps(payload).encode(), "application/json"
+        head = (
+            f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        )
+        writer.write(head.encode("latin1") + body)
+        await writer.drain()
+
+
+async def serve(host, port, workers=None, warm=False):
+    if warm:
+        # Load models before accepting connections so no client pays for it
+        prewarm(reports=False)
+    service = InferenceService(workers=workers)
+    server = await asyncio.start_server(service.handle_connection, host, port)
+    async with server:
+        await server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the prediction models over a JSON HTTP API.")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=int(os.environ.get("PORT", DEFAULT_PORT)))
+    parser.add_argument("--workers", type=int, default=None, help="Threads for batch scoring")
+    parser.add_argument(
+        "--metrics-log-interval",
+        type=float,
+        default=None,
+        help="Also log stage percentiles every N seconds (metrics must be enabled)",
+    )
+    parser.add_argument(
+        "--prewarm",
+        action="store_true",
+        default=prewarm_requested(),
+        help="Load every model before accepting connections",
+    )
+    parser.add_argument(
+        "--drift-interval",
+        type=float,
+        default=drift.DEFAULT_INTERVAL if drift.enabled() else None,
+        help=f"Compare live inputs with the training data every N seconds (on by default with {drift.ENV_FLAG}=1)",
+    )
+    parser.add_argument(
+        "--shadow",
+        action="append",
+        default=None,
+        metavar="DIR",
+        help=f"Also score requests with this candidate from models/versions/<disease> (repeatable; defaults to {shadow.ENV_FLAG})",
+    )
+    parser.add_argument(
+        "--audit-dir",
+        type=Path,
+        default=audit.AUDIT_DIR if audit.enabled() else None,
+        help=f"Log every prediction to compressed segments here (on by default with {audit.ENV_FLAG}=1)",
+    )
+    args = parser.parse_args(argv)
+    if args.audit_dir:
+        audit.start_audit(args.audit_dir)
+    if args.shadow or shadow.enabled():
+        shadow.start_shadow(args.shadow)
+    if args.drift_interval:
+        logging.basicConfig(level=logging.INFO)
+        drift.start_drift_checks(interval=args.drift_interval)
+    if args.metrics_log_interval:
+        logging.basicConfig(level=logging.INFO)
+        start_log_dump(args.metrics_log_interval)
+    asyncio.run(serve(args.host, args.port, workers=args.workers, warm=args.prewarm))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,111 +1,88 @@
+import logging
+import time
 import streamlit as st
 from datetime import datetime
-from pathlib import Path
-
-try:
-    from fpdf import FPDF
-except ImportError:
-    FPDF = None
 
+import audit
+import drift
+import metrics
+import shadow
+import startup
+from cache import cached_prediction
+from hooks import after_prediction
+from registry import get_registry
+from reports import deferred_pdf_report, pdf_available
 from utils import (
+    DIABETES_GENDER_OPTIONS,
+    HEART_GENDER_OPTIONS,
+    SMOKING_OPTIONS,
+    YES_NO_OPTIONS,
     ArtifactLoadError,
     build_diabetes_features,
     build_heart_features,
-    load_diabetes_model,
-    load_diabetes_scaler,
-    load_heart_model,
-    load_heart_scaler,
     predict_diabetes,
     predict_heart,
 )
+from explain import explain, top_factors
+from whatif import risk_curves
+
+
+def serve_prediction(disease, features, predict):
+    """
+    Return (prediction, probability) through the prediction cache and report it to the hooks.
+
+    Args:
+        predict: Zero-argument callable run on a cache miss, as for cached_prediction()
+    """
+    start = time.perf_counter()
+    result = cached_prediction(disease, features, predict)
+    after_prediction(
+        disease, result.version, features, result.prediction, result.probability,
+        result.scoring_seconds, time.perf_counter() - start,
+    )
+    return result.prediction, result.probability
 
 
-def build_pdf_report(disease_name, patient_name, inputs, prediction_label, probability_percent):
-    if FPDF is None:
-        return None
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M")
-    safe_name = patient_name.strip() or "Unknown"
-    pdf = FPDF()
-    pdf.set_margins(left=12, top=12, right=12)
-    pdf.set_auto_page_break(auto=True, margin=15)
-    pdf.add_page()
-    page_width = getattr(pdf, "epw", None) or (pdf.w - pdf.l_margin - pdf.r_margin)
-
-    pdf.set_fill_color(26, 33, 62)
-    pdf.set_text_color(255, 255, 255)
-    pdf.set_font("Helvetica", style="B", size=16)
-    pdf.rect(pdf.l_margin, pdf.t_margin, page_width, 16, style="F")
-    pdf.set_xy(pdf.l_margin + 4, pdf.t_margin + 4)
-    pdf.cell(page_width - 8, 8, "Disease Prediction Report")
-
-    pdf.set_text_color(0, 0, 0)
-    pdf.ln(20)
-    pdf.set_font("Helvetica", size=11)
-    left_col = page_width * 0.6
-    right_col = page_width - left_col
-    pdf.cell(left_col, 7, f"Generated: {timestamp}")
-    pdf.cell(right_col, 7, f"Condition: {disease_name}", ln=1)
-    pdf.set_font("Helvetica", style="B", size=13)
-    pdf.cell(left_col, 8, f"Patient Name: {safe_name}")
-    pdf.set_font("Helvetica", size=11)
-    pdf.cell(right_col, 8, "", ln=1)
-    pdf.ln(2)
-
-    pdf.set_fill_color(240, 245, 250)
-    pdf.set_text_color(26, 33, 62)
-    pdf.set_font("Helvetica", style="B", size=12)
-    pdf.cell(page_width, 8, "Inputs", ln=1, fill=True)
-    pdf.set_text_color(0, 0, 0)
-    pdf.set_font("Helvetica", size=11)
-
-    label_width = 55
-    value_width = page_width - label_width
-
-    def draw_kv_row(label, value):
-        pdf.set_x(pdf.l_margin)
-        pdf.set_font("Helvetica", style="B", size=11)
-        pdf.cell(label_width, 7, str(label))
-        pdf.set_font("Helvetica", size=11)
-        try:
-            pdf.multi_cell(value_width, 7, str(value), new_x="LMARGIN", new_y="NEXT")
-        except TypeError:
-            pdf.multi_cell(value_width, 7, str(value))
-
-    for key, value in inputs.items():
-        draw_kv_row(key, value)
-
-    pdf.ln(2)
-    pdf.set_fill_color(240, 245, 250)
-    pdf.set_text_color(26, 33, 62)
-    pdf.set_font("Helvetica", style="B", size=12)
-    pdf.cell(page_width, 8, "Result", ln=1, fill=True)
-    pdf.set_text_color(0, 0, 0)
-    pdf.set_font("Helvetica", size=11)
-
-    risk_color = (244, 67, 54) if prediction_label == "High Risk" else (76, 175, 80)
-    pdf.set_text_color(*risk_color)
-    pdf.set_font("Helvetica", style="B", size=12)
-    pdf.cell(page_width, 7, f"Prediction: {prediction_label}", ln=1)
-    pdf.set_text_color(0, 0, 0)
-    pdf.set_font("Helvetica", size=11)
-    pdf.cell(page_width, 7, f"Risk Level: {probability_percent:.1f}%", ln=1)
-
-    pdf_output = pdf.output(dest="S")
-    if isinstance(pdf_output, (bytes, bytearray)):
-        return bytes(pdf_output)
-    return str(pdf_output).encode("latin1")
-
-
-def load_artifacts():
+def load_artifacts(disease):
     try:
-        diabetes_model = load_diabetes_model()
-        heart_model = load_heart_model()
-        diabetes_scaler = load_diabetes_scaler()
-        heart_scaler = load_heart_scaler()
+        model = get_registry().get_compiled(disease)
     except ArtifactLoadError as exc:
         st.error(f"Failed to load model artifacts: {exc}")
         st.stop()
-    return diabetes_model, heart_model, diabetes_scaler, heart_scaler
+    return model
+
+
+@st.cache_resource
+def start_metrics_log():
+    """Start the periodic metrics log once per server process rather than once per rerun."""
+    logging.basicConfig(level=logging.INFO)
+    return metrics.start_log_dump()
+
+
+@st.cache_resource
+def start_drift_checks():
+    """Start comparing live inputs with the training data once per server process."""
+    logging.basicConfig(level=logging.INFO)
+    return drift.start_drift_checks()
+
+
+@st.cache_resource
+def start_audit():
+    """Start the prediction audit log once per server process."""
+    return audit.start_audit()
+
+
+@st.cache_resource
+def start_shadow():
+    """Start shadow scoring of the candidate models once per server process."""
+    logging.basicConfig(level=logging.INFO)
+    return shadow.start_shadow()
+
+
+@st.cache_resource
+def start_prewarm():
+    """Load both models and the PDF library in the background when the server handles its first session."""
+    return startup.start_prewarm()
 
 
 def inject_theme():
@@ -328,7 +305,7 @@ def render_header():
     )
 
 
-def render_diabetes_section(diabetes_model, diabetes_scaler, patient_name):
+def render_diabetes_section(diabetes_model, patient_name):
     st.markdown("## Diabetes Risk Assessment")
     st.markdown(
         """
@@ -344,12 +321,12 @@ def render_diabetes_section(diabetes_model, diabetes_scaler, patient_name):
     col1, col2 = st.columns(2)
     with col1:
         age = st.number_input("Age (years)", 1, 120, 30, help="Range: 1-120", key="diab_age")
-        gender_opt = st.selectbox("Gender", ["Female", "Male", "Other"], index=0, key="diab_gender")
+        gender_opt = st.selectbox("Gender", DIABETES_GENDER_OPTIONS, index=0, key="diab_gender")
     with col2:
         bmi = st.number_input("BMI (kg/m²)", 10.0, 60.0, 25.0, help="Range: 10.0-60.0", key="diab_bmi")
         smoking_opt = st.selectbox(
             "Smoking History",
-            ["never", "former", "ever", "current", "not current"],
+            SMOKING_OPTIONS,
             index=0,
             key="diab_smoking"
         )
@@ -358,13 +335,13 @@ def render_diabetes_section(diabetes_model, diabetes_scaler, patient_name):
     col3, col4 = st.columns(2)
     with col3:
         hypertension_opt = st.selectbox(
-            "Hypertension", ["No", "Yes"], index=0, key="diab_hypertension"
+            "Hypertension", YES_NO_OPTIONS, index=0, key="diab_hypertension"
         )
         hba1c = st.number_input(
             "HbA1c Level (%)", 3.0, 15.0, 5.5, help="Range: 3.0-15.0%", key="diab_hba1c"
         )
     with col4:
-        heart_disease_opt = st.selectbox("Heart Disease History", ["No", "Yes"], index=0, key="diab_heart_disease")
+        heart_disease_opt = st.selectbox("Heart Disease History", YES_NO_OPTIONS, index=0, key="diab_heart_disease")
         glucose = st.number_input(
             "Blood Glucose (mg/dL)", 50, 300, 100, help="Range: 50-300", key="diab_glucose"
         )
@@ -384,10 +361,10 @@ def render_diabetes_section(diabetes_model, diabetes_scaler, patient_name):
                 smoking_opt=smoking_opt,
             )
 
-            prediction, probability = predict_diabetes(
-                diabetes_model,
-                diabetes_scaler,
+            prediction, probability = serve_prediction(
+                "diabetes",
                 diabetes_features,
+                lambda: predict_diabetes(diabetes_model, None, diabetes_features),
             )
             probability_percent = probability * 100
 
@@ -417,6 +394,11 @@ def render_diabetes_section(diabetes_model, diabetes_scaler, patient_name):
                     delta_color="inverse",
                 )
 
+            factors = top_factors(explain(diabetes_model, "diabetes", diabetes_features))
+            render_key_factors(factors)
+            curves = risk_curves(diabetes_model, "diabetes", diabetes_features)
+            render_risk_curves(curves)
+
             # Generate PDF report
             prediction_label = "High Risk" if prediction == 1 else "Low Risk"
             inputs_dict = {
@@ -429,25 +411,29 @@ def render_diabetes_section(diabetes_model, diabetes_scaler, patient_name):
                 "HbA1c Level": hba1c,
                 "Blood Glucose Level": glucose,
             }
-            pdf_bytes = build_pdf_report(
-                disease_name="Diabetes",
-                patient_name=patient_name,
-                inputs=inputs_dict,
-                prediction_label=prediction_label,
-                probability_percent=probability_percent,
-            )
-            if pdf_bytes:
+            if pdf_available():
+                # Rendered on the report pool only when the user clicks Download
+                pdf_report = deferred_pdf_report(
+                    disease_name="Diabetes",
+                    patient_name=patient_name,
+                    inputs=inputs_dict,
+                    prediction_label=prediction_label,
+                    probability_percent=probability_percent,
+                    generated_at=datetime.now(),
+                    factors=factors,
+                    curves=curves,
+                )
                 safe_filename = (patient_name.strip() or "Unknown").replace(" ", "_")
                 st.download_button(
                     label="Download PDF Report",
-                    data=pdf_bytes,
+                    data=pdf_report,
                     file_name=f"Diabetes_Report_{safe_filename}.pdf",
                     mime="application/pdf",
                     use_container_width=True,
                 )
 
 
-def render_heart_section(heart_model, heart_scaler, patient_name):
+def render_heart_section(heart_model, patient_name):
     st.markdown("## Cardiac Health Assessment")
     st.markdown(
         """
@@ -463,7 +449,7 @@ def render_heart_section(heart_model, heart_scaler, patient_name):
     col1, col2 = st.columns(2)
     with col1:
         age = st.number_input("Age (years)", 1, 120, 45, help="Range: 1-120", key="heart_age")
-        gender = st.selectbox("Gender", ["Male", "Female"], index=0, key="heart_gender")
+        gender = st.selectbox("Gender", HEART_GENDER_OPTIONS, index=0, key="heart_gender")
     with col2:
         height_cm = st.number_input(
             "Height (cm)", 120, 220, 170, help="Range: 120-220", key="heart_height"
@@ -516,10 +502,10 @@ def render_heart_section(heart_model, heart_scaler, patient_name):
                 active=active,
             )
 
-            prediction, probability = predict_heart(
-                heart_model,
-                heart_scaler,
+            prediction, probability = serve_prediction(
+                "heart",
                 heart_features,
+                lambda: predict_heart(heart_model, None, heart_features),
             )
             probability_percent = probability * 100
 
@@ -550,6 +536,11 @@ def render_heart_section(heart_model, heart_scaler, patient_name):
                 )
                 st.metric("BMI", f"{bmi_val:.1f}")
 
+            factors = top_factors(explain(heart_model, "heart", heart_features))
+            render_key_factors(factors)
+            curves = risk_curves(heart_model, "heart", heart_features)
+            render_risk_curves(curves)
+
             # Generate PDF report
             prediction_label = "High Risk" if prediction == 1 else "Low Risk"
             inputs_dict = {
@@ -566,24 +557,55 @@ def render_heart_section(heart_model, heart_scaler, patient_name):
                 "Alcohol Use": "Yes" if alco else "No",
                 "Physically Active": "Yes" if active else "No",
             }
-            pdf_bytes = build_pdf_report(
-                disease_name="Heart Disease",
-                patient_name=patient_name,
-                inputs=inputs_dict,
-                prediction_label=prediction_label,
-                probability_percent=probability_percent,
-            )
-            if pdf_bytes:
+            if pdf_available():
+                # Rendered on the report pool only when the user clicks Download
+                pdf_report = deferred_pdf_report(
+                    disease_name="Heart Disease",
+                    patient_name=patient_name,
+                    inputs=inputs_dict,
+                    prediction_label=prediction_label,
+                    probability_percent=probability_percent,
+                    generated_at=datetime.now(),
+                    factors=factors,
+                    curves=curves,
+                )
                 safe_filename = (patient_name.strip() or "Unknown").replace(" ", "_")
                 st.download_button(
                     label="Download PDF Report",
-                    data=pdf_bytes,
+                    data=pdf_report,
                     file_name=f"Heart_Disease_Report_{safe_filename}.pdf",
                     mime="application/pdf",
                     use_container_width=True,
                 )
 
 
+def render_key_factors(factors):
+    """Show the inputs that moved this patient's risk most, as a bar chart of percentage points."""
+    with st.expander("Key Factors", expanded=True):
+        st.caption("How much each input raised (+) or lowered (−) the risk compared with an average patient.")
+        st.bar_chart(
+            {"Input": [name for name, _ in factors], "Points": [contribution * 100 for _, contribution in factors]},
+            x="Input",
+            y="Points",
+            horizontal=True,
+            sort=False,
+        )
+
+
+def render_risk_curves(curves):
+    """Show each what-if curve as a line chart in its own tab."""
+    with st.expander("What-if Analysis", expanded=False):
+        st.caption("Predicted risk as one input varies while all others stay as entered.")
+        for tab, curve in zip(st.tabs([curve.label for curve in curves]), curves):
+            with tab:
+                st.line_chart(
+                    {curve.label: curve.values, "Risk (%)": curve.probabilities * 100},
+                    x=curve.label,
+                    y="Risk (%)",
+                )
+                st.caption(f"Entered value: {curve.current_value:g} → {curve.current_probability * 100:.1f}% risk")
+
+
 def render_footer():
     st.markdown('<div class="divider"></div>', unsafe_allow_html=True)
     st.markdown(
@@ -607,6 +629,16 @@ def main():
         initial_sidebar_state="collapsed",
     )
 
+    if metrics.enabled():
+        start_metrics_log()
+    if drift.enabled():
+        start_drift_checks()
+    if shadow.enabled():
+        start_shadow()
+    if audit.enabled():
+        start_audit()
+    if startup.prewarm_requested():
+        start_prewarm()
     inject_theme()
     render_header()
 
@@ -622,8 +654,6 @@ def main():
         unsafe_allow_html=True,
     )
 
-    diabetes_model, heart_model, diabetes_scaler, heart_scaler = load_artifacts()
-
     st.markdown("### Patient Information")
     patient_name = st.text_input("Enter your name (optional)")
 
@@ -637,9 +667,9 @@ def main():
     st.markdown('<div class="divider"></div>', unsafe_allow_html=True)
 
     if disease == "Diabetes":
-        render_diabetes_section(diabetes_model, diabetes_scaler, patient_name)
+        render_diabetes_section(load_artifacts("diabetes"), patient_name)
     else:
-        render_heart_section(heart_model, heart_scaler, patient_name)
+        render_heart_section(load_artifacts("heart"), patient_name)
 
     render_footer()
 
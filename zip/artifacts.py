@@ -0,0 +1,147 @@
+import argparse
+import json
+from pathlib import Path
+
+import numpy as np
+
+from compiled import model_from_arrays, model_to_arrays, scaler_arrays
+from utils import MODELS_DIR, POINTER_NAME, ArtifactLoadError, current_dir, publish_dir
+
+
+SCHEMA = "disease-prediction-artifact"
+FORMAT_VERSION = 2
+MANIFEST_NAME = "manifest.json"
+
+
+def artifact_dir(disease):
+    """Return the versioned directory holding a disease's array artifacts (see utils.publish_dir)."""
+    return MODELS_DIR / f"{disease}_artifact"
+
+
+def pointer_path(disease):
+    """Return the file naming a disease's current artifact version; it changes on every publish."""
+    return artifact_dir(disease) / POINTER_NAME
+
+
+def write_artifact(disease, compiled_model, scaler, source_version, source_stamp=None):
+    """
+    Write a compiled model as a JSON manifest plus one .npy file per array.
+
+    The scaler's mean and scale vectors are stored as well, even though the
+    compiled model already has them folded in. Each write is a new version
+    directory that is published by replacing a pointer file, so readers
+    never see a half-written artifact, nor a moment without one.
+
+    Args:
+        source_version: Content hash of the source pickles, from
+            ModelRegistry.source_version()
+        source_stamp: Their file stamps, from ModelRegistry.source_stamp()
+
+    Returns:
+        Path: The new version directory
+    """
+    kind, arrays, meta = model_to_arrays(compiled_model)
+    mean, scale = scaler_arrays(scaler, scaler.n_features_in_)
+    arrays = dict(arrays, scaler_mean=mean, scaler_scale=scale)
+
+    root = artifact_dir(disease)
+    with publish_dir(root) as directory:
+        files = {}
+        for name, array in arrays.items():
+            file_name = f"{name}.npy"
+            np.save(directory / file_name, np.ascontiguousarray(array), allow_pickle=False)
+            files[name] = file_name
+        manifest = {
+            "schema": SCHEMA,
+            "format_version": FORMAT_VERSION,
+            "disease": disease,
+            "kind": kind,
+            "meta": meta,
+            "source_version": source_version,
+            "source_stamp": source_stamp,
+            "arrays": files,
+        }
+        with open(directory / MANIFEST_NAME, "w") as f:
+            json.dump(manifest, f, indent=2)
+    return current_dir(root)
+
+
+def read_manifest(disease):
+    """
+    Read and validate an artifact manifest.
+
+    Returns:
+        dict: The manifest, or None if the disease has no array artifact.
+            "directory" is added: the version directory it was read from,
+            which load_artifact() reads the arrays from
+    """
+    directory = current_dir(artifact_dir(disease))
+    if directory is None:
+        return None
+    path = directory / MANIFEST_NAME
+    try:
+        with open(path) as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        raise ArtifactLoadError(f"{artifact_dir(disease)} points to a missing version, {directory.name}")
+    except ValueError as e:
+        raise ArtifactLoadError(f"Corrupt artifact manifest at {path}: {e}")
+    if manifest.get("schema") != SCHEMA:
+        raise ArtifactLoadError(f"{path} is not a {SCHEMA} manifest")
+    if manifest.get("format_version") != FORMAT_VERSION:
+        raise ArtifactLoadError(
+            f"{path} has format version {manifest.get('format_version')}, expected {FORMAT_VERSION}; "
+            "re-run artifacts.py to convert it"
+        )
+    manifest["directory"] = str(directory)
+    return manifest
+
+
+def load_artifact(disease, manifest=None):
+    """
+    Memory-map a disease's array artifact and rebuild the compiled model on top of it.
+
+    No pickle is involved and the arrays are not copied onto the heap, so
+    loading takes milliseconds and processes share the page cache.
+
+    Returns:
+        tuple: (compiled_model, scaler) where scaler is {"mean", "scale"}, or
+            None if there is no artifact
+    """
+    manifest = manifest or read_manifest(disease)
+    if manifest is None:
+        return None
+    directory = Path(manifest["directory"])
+    try:
+        arrays = {
+            name: np.load(directory / file_name, mmap_mode="r", allow_pickle=False)
+            for name, file_name in manifest["arrays"].items()
+        }
+    except (OSError, ValueError) as e:
+        raise ArtifactLoadError(f"Failed to load {disease} artifact arrays: {e}")
+    scaler = {"mean": arrays.pop("scaler_mean"), "scale": arrays.pop("scaler_scale")}
+    return model_from_arrays(manifest["kind"], arrays, manifest["meta"]), scaler
+
+
+def main(argv=None):
+    from registry import ARTIFACTS, get_registry
+
+    parser = argparse.ArgumentParser(description="Convert pickled models into memory-mappable array artifacts.")
+    parser.add_argument("diseases", nargs="*", help="Defaults to every disease")
+    args = parser.parse_args(argv)
+    unknown = set(args.diseases) - set(ARTIFACTS)
+    if unknown:
+        parser.error(f"unknown disease(s): {', '.join(sorted(unknown))}")
+
+    registry = get_registry()
+    for disease in args.diseases or sorted(ARTIFACTS):
+        model, scaler = registry.get(disease)
+        path = write_artifact(
+            disease, registry.get_compiled(disease), scaler,
+            registry.source_version(disease), registry.source_stamp(disease),
+        )
+        print(f"Wrote {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,408 @@
+import argparse
+import atexit
+import logging
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+from metrics import count
+from utils import atomic_write
+
+
+ENV_FLAG = "DISEASE_PREDICTION_AUDIT"
+AUDIT_DIR = Path(__file__).parent / "audit"
+# A segment is written once this many rows are buffered or the oldest is this old
+DEFAULT_SEGMENT_ROWS = 50_000
+DEFAULT_MAX_DELAY = 5.0
+# Rows held for retry after failed writes; beyond this the oldest are dropped
+DEFAULT_MAX_RETRY_ROWS = 4 * DEFAULT_SEGMENT_ROWS
+# Columns of every segment, besides the per-segment "versions" lookup table
+COLUMNS = ("timestamp", "features", "version", "probability", "label", "seconds")
+
+logger = logging.getLogger(__name__)
+
+_enabled = os.environ.get(ENV_FLAG, "").lower() in ("1", "true", "yes", "on")
+_log = None
+_log_lock = threading.Lock()
+
+
+def enabled():
+    return _enabled
+
+
+def _segment_name(timestamps, sequence):
+    """Segment file name: first and last timestamp in ms, so readers can skip by time."""
+    first, last = int(timestamps[0] * 1000), int(timestamps[-1] * 1000)
+    return f"{first}-{last}-{os.getpid()}-{sequence:06d}.npz"
+
+
+def _segment_span(path):
+    first, last = path.name.split("-")[:2]
+    return int(first) / 1000, int(last) / 1000
+
+
+def write_segment(directory, columns, sequence=0):
+    """
+    Write one compressed columnar segment and rename it into place.
+
+    Model versions are stored once per segment in "versions", with each
+    row holding a uint16 index into it.
+
+    Args:
+        directory: Directory for the disease's segments
+        columns: dict with "timestamp", "features", "version" (strings),
+            "probability", "label" and "seconds" arrays of equal length
+        sequence: Per-process counter keeping names unique
+
+    Returns:
+        Path: The segment file
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    versions, codes = np.unique(np.asarray(columns["version"], dtype=str), return_inverse=True)
+    path = directory / _segment_name(columns["timestamp"], sequence)
+    with atomic_write(path, "wb") as f:
+        np.savez_compressed(
+            f,
+            timestamp=np.asarray(columns["timestamp"], dtype=np.float64),
+            features=np.asarray(columns["features"], dtype=np.float64),
+            versions=versions,
+            version=codes.astype(np.uint16),
+            probability=np.asarray(columns["probability"], dtype=np.float32),
+            label=np.asarray(columns["label"], dtype=np.uint8),
+            seconds=np.asarray(columns["seconds"], dtype=np.float32),
+        )
+    return path
+
+
+class _Buffer:
+    """Records for one disease waiting to be written."""
+
+    def __init__(self):
+        self.timestamps = []
+        self.features = []
+        self.versions = []
+        self.probabilities = []
+        self.labels = []
+        self.seconds = []
+        self.rows = 0
+        self.oldest = None
+
+    def take(self):
+        """Stack the buffered records into segment columns."""
+        counts = [len(p) for p in self.probabilities]
+        return {
+            "timestamp": np.repeat(self.timestamps, counts),
+            "features": np.vstack(self.features),
+            "version": np.repeat(self.versions, counts),
+            "probability": np.concatenate(self.probabilities),
+            "label": np.concatenate(self.labels),
+            "seconds": np.repeat(self.seconds, counts),
+        }
+
+
+class AuditLog:
+    """
+    Append-only log of every prediction, buffered in memory and written in the background.
+
+    record() appends references to the request's arrays to a per-disease
+    buffer under a lock and returns; nothing touches the disk on the
+    request path. A daemon thread writes a buffer out as a new compressed
+    segment, audit/<disease>/<first ms>-<last ms>-<pid>-<seq>.npz, once it
+    holds ``segment_rows`` rows or its oldest record is ``max_delay``
+    seconds old, and whatever is left is written at exit. A segment that
+    fails to write (a full disk, a permissions problem) is kept in memory
+    and retried on every later flush, and counted in stats(). At most
+    ``max_retry_rows`` rows are kept that way; while writes keep failing,
+    the oldest segments are dropped beyond that, logged and counted in
+    stats() and the "audit_rows_dropped" metric.
+    """
+
+    def __init__(
+        self,
+        directory=AUDIT_DIR,
+        segment_rows=DEFAULT_SEGMENT_ROWS,
+        max_delay=DEFAULT_MAX_DELAY,
+        max_retry_rows=DEFAULT_MAX_RETRY_ROWS,
+    ):
+        self.directory = Path(directory)
+        self.segment_rows = segment_rows
+        self.max_delay = max_delay
+        self.max_retry_rows = max_retry_rows
+        self._buffers = {}
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._sequence = 0
+        # (disease, columns) segments whose write failed, retried on every flush
+        self._retry = []
+        self.recorded = 0
+        self.written = 0
+        self.segments = 0
+        self.write_failures = 0
+        self.dropped_rows = 0
+        self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def record(self, disease, version, features, probabilities, labels, seconds):
+        """
+        Buffer one request's predictions.
+
+        Args:
+            disease: "diabetes" or "heart"
+            version: Model version the request was scored with
+            features: Feature rows of shape (n_rows, n_features); not copied,
+                so callers must not modify them afterwards
+            probabilities: Positive-class probability per row, or a scalar
+            labels: 0/1 label per row, or a scalar
+            seconds: Time taken to answer the request
+        """
+        probabilities = np.atleast_1d(probabilities)
+        now = time.time()
+        with self._lock:
+            buffer = self._buffers.get(disease)
+            if buffer is None:
+                buffer = self._buffers[disease] = _Buffer()
+            if buffer.oldest is None:
+                buffer.oldest = now
+            buffer.timestamps.append(now)
+            buffer.features.append(features)
+            buffer.versions.append(version)
+            buffer.probabilities.append(probabilities)
+            buffer.labels.append(np.atleast_1d(labels))
+            buffer.seconds.append(seconds)
+            buffer.rows += len(probabilities)
+            self.recorded += len(probabilities)
+            full = buffer.rows >= self.segment_rows
+        if full:
+            self._wake.set()
+
+    def flush(self, force=True):
+        """
+        Write every buffer that is due, or every non-empty one if force is True.
+
+        Returns:
+            int: Rows written
+        """
+        now = time.time()
+        with self._lock:
+            due = {}
+            for disease, buffer in self._buffers.items():
+                if buffer.rows and (
+                    force or buffer.rows >= self.segment_rows or now - buffer.oldest >= self.max_delay
+                ):
+                    # Swap in an empty buffer; stacking happens outside the lock
+                    due[disease] = buffer
+                    self._buffers[disease] = _Buffer()
+        written = 0
+        with self._write_lock:
+            # Segments that failed to write before go first, so records stay in time order
+            pending = self._retry + [(disease, buffer.take()) for disease, buffer in due.items()]
+            self._retry = []
+            for disease, columns in pending:
+                try:
+                    write_segment(self.directory / disease, columns, self._sequence)
+                except OSError:
+                    logger.exception(
+                        "Failed to write %d audit rows for %s; keeping them to retry", len(columns["label"]), disease
+                    )
+                    self._retry.append((disease, columns))
+                    self.write_failures += 1
+                    continue
+                self._sequence += 1
+                self.segments += 1
+                written += len(columns["label"])
+            self.written += written
+            self._trim_retry()
+        return written
+
+    def _trim_retry(self):
+        """Drop the oldest segments held for retry until at most max_retry_rows rows remain."""
+        held = sum(len(columns["label"]) for _, columns in self._retry)
+        while self._retry and held > self.max_retry_rows:
+            disease, columns = self._retry.pop(0)
+            rows = len(columns["label"])
+            held -= rows
+            self.dropped_rows += rows
+            count("audit_rows_dropped", disease, rows)
+            logger.error("Dropping %d unwritten audit rows for %s; too many are held for retry", rows, disease)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.max_delay / 2)
+            self._wake.clear()
+            self.flush(force=False)
+
+    def close(self):
+        """Stop the writer thread and write whatever is still buffered."""
+        self._stop.set()
+        self._wake.set()
+        self._thread.join()
+        self.flush()
+        unwritten = self.stats()["failed_rows"]
+        if unwritten:
+            logger.error("Exiting with %d audit rows that could not be written", unwritten)
+
+    def stats(self):
+        """
+        Report progress of the log.
+
+        Returns:
+            dict: recorded, written and buffered rows, segments written,
+                failed_rows (held for retry after a failed write), dropped_rows
+                (given up on once too many were held) and write_failures
+        """
+        with self._lock:
+            buffered = sum(buffer.rows for buffer in self._buffers.values())
+        with self._write_lock:
+            failed_rows = sum(len(columns["label"]) for _, columns in self._retry)
+        return {
+            "recorded": self.recorded,
+            "written": self.written,
+            "buffered": buffered,
+            "segments": self.segments,
+            "failed_rows": failed_rows,
+            "dropped_rows": self.dropped_rows,
+            "write_failures": self.write_failures,
+        }
+
+
+def start_audit(directory=AUDIT_DIR, segment_rows=DEFAULT_SEGMENT_ROWS, max_delay=DEFAULT_MAX_DELAY):
+    """Start the process-wide AuditLog; later calls return the running one."""
+    global _log, _enabled
+    with _log_lock:
+        if _log is None:
+            _log = AuditLog(directory, segment_rows=segment_rows, max_delay=max_delay)
+        _enabled = True
+        return _log
+
+
+def record(disease, version, features, probabilities, labels, seconds):
+    """Buffer a request in the process-wide AuditLog; a no-op until start_audit() is called."""
+    if _log is not None:
+        _log.record(disease, version, features, probabilities, labels, seconds)
+
+
+def segment_paths(disease, directory=AUDIT_DIR, start=None, end=None):
+    """
+    List a disease's segments in time order, skipping any wholly outside [start, end].
+
+    Only file names are looked at; start and end are Unix timestamps.
+    """
+    paths = []
+    for path in (Path(directory) / disease).glob("*.npz"):
+        first, last = _segment_span(path)
+        if (start is None or last >= start) and (end is None or first <= end):
+            paths.append((first, path))
+    return [path for _, path in sorted(paths)]
+
+
+def read_audit(disease, directory=AUDIT_DIR, start=None, end=None, columns=COLUMNS):
+    """
+    Read a disease's audit records into concatenated column arrays.
+
+    Only the requested columns are decompressed, and segments outside the
+    time range are not opened. Rows within [start, end] are kept.
+
+    Args:
+        disease: "diabetes" or "heart"
+        directory: Audit directory holding one subdirectory per disease
+        start: Earliest Unix timestamp to include, or None
+        end: Latest Unix timestamp to include, or None
+        columns: Columns to read; "version" comes back as strings
+
+    Returns:
+        dict: One array per requested column, all of the same length
+    """
+    parts = {column: [] for column in columns}
+    for path in segment_paths(disease, directory, start, end):
+        with np.load(path) as segment:
+            timestamps = segment["timestamp"]
+            keep = np.ones(len(timestamps), dtype=bool)
+            if start is not None:
+                keep &= timestamps >= start
+            if end is not None:
+                keep &= timestamps <= end
+            whole = keep.all()
+            for column in columns:
+                if column == "version":
+                    values = segment["versions"][segment["version"]]
+                else:
+                    values = timestamps if column == "timestamp" else segment[column]
+                parts[column].append(values if whole else values[keep])
+    result = {}
+    for column, arrays in parts.items():
+        if arrays:
+            result[column] = np.concatenate(arrays)
+        else:
+            result[column] = np.empty((0, 0) if column == "features" else 0)
+    return result
+
+
+def compact(disease, directory=AUDIT_DIR, segment_rows=1_000_000):
+    """
+    Merge a disease's segments into as few as possible of up to segment_rows rows.
+
+    Run offline, while no process is writing to the directory. The old
+    segments are removed only after the merged ones are in place.
+
+    Returns:
+        tuple: (segments before, segments after)
+    """
+    paths = segment_paths(disease, directory)
+    if len(paths) < 2:
+        return len(paths), len(paths)
+    records = read_audit(disease, directory)
+    target = Path(directory) / disease
+    written = []
+    for sequence, begin in enumerate(range(0, len(records["label"]), segment_rows)):
+        chunk = {column: values[begin:begin + segment_rows] for column, values in records.items()}
+        written.append(write_segment(target, chunk, sequence))
+    for path in paths:
+        if path not in written:
+            path.unlink()
+    return len(paths), len(written)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Summarise or compact the prediction audit log.")
+    parser.add_argument("command", choices=("summary", "compact"))
+    parser.add_argument("diseases", nargs="*", help="Defaults to every disease with records")
+    parser.add_argument("--dir", type=Path, default=AUDIT_DIR)
+    args = parser.parse_args(argv)
+
+    diseases = args.diseases or sorted(path.name for path in args.dir.iterdir() if path.is_dir())
+    for disease in diseases:
+        if args.command == "compact":
+            before, after = compact(disease, args.dir)
+            print(f"{disease}: {before} -> {after} segments", file=sys.stderr)
+            continue
+        start = time.perf_counter()
+        records = read_audit(disease, args.dir, columns=("timestamp", "version", "probability", "label", "seconds"))
+        elapsed = time.perf_counter() - start
+        n = len(records["label"])
+        if not n:
+            print(f"{disease}: no records")
+            continue
+        versions, counts = np.unique(records["version"], return_counts=True)
+        print(
+            f"{disease}: {n} records in {len(segment_paths(disease, args.dir))} segments "
+            f"(read in {elapsed:.2f}s, {n / max(elapsed, 1e-9):,.0f} rows/s), "
+            f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(records['timestamp'][0]))} to "
+            f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(records['timestamp'][-1]))}"
+        )
+        print(
+            f"  high risk {records['label'].mean():.1%}, mean probability {records['probability'].mean():.3f}, "
+            f"p95 response {np.percentile(records['seconds'], 95) * 1e3:.2f}ms"
+        )
+        for version, count in zip(versions, counts):
+            print(f"  version {version}: {count} records")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+import argparse
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from cleaning import clean_heart_frame, read_raw_heart
+from forest import FlatForest, QuantizedForest
+from metrics import count_predictions
+from pool import WorkerPool
+from registry import get_registry
+from utils import (
+    DEFAULT_THRESHOLD,
+    ArtifactLoadError,
+    build_diabetes_feature_matrix,
+    build_heart_feature_matrix,
+    predict_risk,
+)
+
+
+DEFAULT_CHUNK_SIZE = 50_000
+DEFAULT_STREAM_CHUNK_SIZE = 20_000
+
+FEATURE_BUILDERS = {
+    "diabetes": build_diabetes_feature_matrix,
+    "heart": build_heart_feature_matrix,
+}
+
+
+def batch_model(disease):
+    """
+    Return the (model, scaler) pair to score large batches with.
+
+    For forests this is the sklearn model and scaler when their pickles are
+    deployed, since sklearn walks large batches in C faster than the NumPy
+    traversal of FlatForest/QuantizedForest, which is built for low-latency
+    single rows. Otherwise it is the compiled model with no scaler.
+    """
+    registry = get_registry()
+    compiled = registry.get_compiled(disease)
+    if isinstance(compiled, (FlatForest, QuantizedForest)):
+        try:
+            return registry.get(disease)
+        except ArtifactLoadError:
+            pass
+    return compiled, None
+
+
+def score_features(model, scaler, features, chunk_size=DEFAULT_CHUNK_SIZE, threshold=DEFAULT_THRESHOLD):
+    """
+    Score a feature matrix in fixed-size chunks through the scaler and model.
+
+    Pass scaler=None for a compiled model that already has the scaler fused in.
+
+    Returns:
+        tuple: (labels, probabilities) arrays of length n_rows
+    """
+    n_rows = len(features)
+    labels = np.empty(n_rows, dtype=np.int8)
+    probabilities = np.empty(n_rows, dtype=np.float64)
+    for start in range(0, n_rows, chunk_size):
+        stop = min(start + chunk_size, n_rows)
+        result = predict_risk(model, scaler, features[start:stop], threshold=threshold)
+        labels[start:stop] = result.labels
+        probabilities[start:stop] = result.probabilities
+    return labels, probabilities
+
+
+def score_frame(disease, frame, chunk_size=DEFAULT_CHUNK_SIZE, threshold=DEFAULT_THRESHOLD, workers=None):
+    """
+    Score every row of a cohort table.
+
+    Args:
+        disease: "diabetes" or "heart"
+        frame: DataFrame with the raw input columns for the disease
+        chunk_size: Rows passed to the scaler and model per call
+        threshold: Probability above which a row is labelled 1
+        workers: Score across this many processes sharing one copy of the model
+
+    Returns:
+        tuple: (scored_frame, stats) where scored_frame is a copy of frame with
+            prediction and probability columns, and stats holds rows, seconds
+            and rows_per_second for feature building plus scoring
+    """
+    if workers:
+        pool = WorkerPool(diseases=[disease], workers=workers)
+    else:
+        model, scaler = batch_model(disease)
+    start = time.perf_counter()
+    features = FEATURE_BUILDERS[disease](frame)
+    if workers:
+        with pool:
+            labels, probabilities = pool.predict_risk(disease, features, threshold=threshold)
+    else:
+        labels, probabilities = score_features(
+            model, scaler, features, chunk_size=chunk_size, threshold=threshold
+        )
+    elapsed = time.perf_counter() - start
+    count_predictions(disease, labels)
+
+    scored = frame.copy()
+    scored["prediction"] = labels
+    scored["probability"] = probabilities
+    stats = {
+        "rows": len(frame),
+        "seconds": elapsed,
+        "rows_per_second": len(frame) / elapsed if elapsed > 0 else float("inf"),
+    }
+    return scored, stats
+
+
+def score_csv(disease, input_path, output_path, sep=",", chunk_size=DEFAULT_CHUNK_SIZE, threshold=DEFAULT_THRESHOLD, workers=None):
+    """
+    Score a cohort CSV and write it back out with prediction and probability columns.
+
+    Returns:
+        dict: Throughput stats from score_frame()
+    """
+    frame = pd.read_csv(input_path, sep=sep)
+    scored, stats = score_frame(
+        disease, frame, chunk_size=chunk_size, threshold=threshold, workers=workers
+    )
+    scored.to_csv(output_path, index=False)
+    return stats
+
+
+def stream_raw_heart_csv(input_path, output_path, chunk_size=DEFAULT_STREAM_CHUNK_SIZE, threshold=DEFAULT_THRESHOLD):
+    """
+    Clean and score a raw heart.csv export one chunk at a time.
+
+    Only one chunk of input and its scored output are held in memory, so peak
+    memory depends on chunk_size rather than on the size of the file.
+
+    Returns:
+        dict: rows_read, rows_scored, seconds and rows_per_second
+    """
+    model = get_registry().get_compiled("heart")
+    rows_read = 0
+    rows_scored = 0
+    start = time.perf_counter()
+    with open(output_path, "w", newline="") as out:
+        header = True
+        for chunk in read_raw_heart(input_path, chunk_size=chunk_size):
+            rows_read += len(chunk)
+            cleaned = clean_heart_frame(chunk)
+            if len(cleaned) == 0:
+                continue
+            result = predict_risk(
+                model, None, build_heart_feature_matrix(cleaned), threshold=threshold
+            )
+            count_predictions("heart", result.labels)
+            cleaned = cleaned.assign(prediction=result.labels, probability=result.probabilities)
+            cleaned.to_csv(out, header=header, index=False)
+            header = False
+            rows_scored += len(cleaned)
+    elapsed = time.perf_counter() - start
+    return {
+        "rows_read": rows_read,
+        "rows_scored": rows_scored,
+        "seconds": elapsed,
+        "rows_per_second": rows_read / elapsed if elapsed > 0 else float("inf"),
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Score a patient cohort CSV in batch.")
+    parser.add_argument("disease", choices=sorted(FEATURE_BUILDERS))
+    parser.add_argument("input", help="CSV with the raw input columns")
+    parser.add_argument("output", help="Where to write the scored CSV")
+    parser.add_argument("--sep", default=",", help="Input column separator")
+    parser.add_argument("--chunk-size", type=int, default=None)
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument(
+        "--workers", type=int, default=None, help="Score across N processes sharing the model"
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Read a raw heart.csv export in chunks, clean it and stream results to disk",
+    )
+    args = parser.parse_args(argv)
+    if args.stream and args.disease != "heart":
+        parser.error("--stream only supports the raw heart.csv format")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.stream:
+        stats = stream_raw_heart_csv(
+            args.input,
+            args.output,
+            chunk_size=args.chunk_size or DEFAULT_STREAM_CHUNK_SIZE,
+            threshold=args.threshold,
+        )
+        print(
+            f"Scored {stats['rows_scored']} of {stats['rows_read']} rows in {stats['seconds']:.2f}s "
+            f"({stats['rows_per_second']:,.0f} rows/s)",
+            file=sys.stderr,
+        )
+        return
+
+    stats = score_csv(
+        args.disease,
+        args.input,
+        args.output,
+        sep=args.sep,
+        chunk_size=args.chunk_size or DEFAULT_CHUNK_SIZE,
+        threshold=args.threshold,
+        workers=args.workers,
+    )
+    print(
+        f"Scored {stats['rows']} rows in {stats['seconds']:.2f}s "
+        f"({stats['rows_per_second']:,.0f} rows/s)",
+        file=sys.stderr,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,337 @@
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import sklearn
+
+import metrics
+from registry import get_registry
+from reports import build_pdf_report, pdf_available
+from utils import (
+    ArtifactLoadError,
+    DIABETES_RAW_COLUMNS,
+    HEART_RAW_COLUMNS,
+    build_diabetes_feature_matrix,
+    build_diabetes_features,
+    build_heart_feature_matrix,
+    build_heart_features,
+    predict_diabetes,
+    predict_heart,
+    predict_risk,
+)
+from explain import explain
+from whatif import risk_curves
+
+
+DATA_DIR = Path(__file__).parent / "data"
+# Results are kept out of the working tree's tracked files (see .gitignore)
+RESULTS_DIR = Path(__file__).parent / "benchmarks"
+DEFAULT_SIZES = [1, 10, 100, 1_000, 10_000, 100_000]
+DEFAULT_SEED = 42
+# Rendering 100k PDFs would take minutes; report sizes above this are skipped
+DEFAULT_MAX_PDF_BATCH = 1_000
+# A case regresses when its p50 is this much slower than the baseline
+DEFAULT_TOLERANCE = 0.20
+# Approximate timed seconds spent per case when no repeat count is given
+DEFAULT_BUDGET_SECONDS = 1.0
+MIN_REPEATS = 5
+MAX_REPEATS = 200
+
+
+def sample_rows(disease, n, seed=DEFAULT_SEED):
+    """
+    Draw n rows from the disease's CSV with a fixed seed, with replacement if n exceeds the file.
+
+    Returns:
+        DataFrame: Raw input columns for the disease
+    """
+    if disease == "diabetes":
+        frame = pd.read_csv(DATA_DIR / "diabetes.csv", usecols=DIABETES_RAW_COLUMNS)
+    else:
+        frame = pd.read_csv(DATA_DIR / "cleaned_heart.csv", usecols=HEART_RAW_COLUMNS)
+    sampled = frame.sample(n=n, replace=n > len(frame), random_state=seed)
+    return sampled.reset_index(drop=True)
+
+
+def _diabetes_kwargs(frame):
+    return [
+        {
+            "age": row.age,
+            "hypertension_opt": "Yes" if row.hypertension else "No",
+            "heart_disease_opt": "Yes" if row.heart_disease else "No",
+            "bmi": row.bmi,
+            "hba1c": row.HbA1c_level,
+            "glucose": row.blood_glucose_level,
+            "gender_opt": row.gender,
+            "smoking_opt": row.smoking_history,
+        }
+        for row in frame.itertuples()
+    ]
+
+
+def _heart_kwargs(frame):
+    return [
+        {
+            "age": row.age,
+            "gender": "Male" if row.gender == 1 else "Female",
+            "height_cm": row.height,
+            "weight_kg": row.weight,
+            "systolic_bp": row.systolic_bp,
+            "diastolic_bp": row.diastolic_bp,
+            "cholesterol": row.cholesterol,
+            "glucose": row.gluc,
+            "smoke": bool(row.smoke),
+            "alco": bool(row.alco),
+            "active": bool(row.active),
+        }
+        for row in frame.itertuples()
+    ]
+
+
+def _report_kwargs(disease_name, kwargs_rows, probabilities):
+    return [
+        {
+            "disease_name": disease_name,
+            "patient_name": f"Patient {i}",
+            "inputs": kwargs,
+            "prediction_label": "High Risk" if probability > 0.5 else "Low Risk",
+            "probability_percent": probability * 100,
+        }
+        for i, (kwargs, probability) in enumerate(zip(kwargs_rows, probabilities))
+    ]
+
+
+def _predict_call(predict_one, model, scaler, features):
+    """Batch size 1 goes through the single-patient wrapper, larger batches through predict_risk."""
+    if len(features) == 1:
+        return lambda: predict_one(model, scaler, features)
+    return lambda: predict_risk(model, scaler, features)
+
+
+def build_cases(sizes, seed=DEFAULT_SEED, max_pdf_batch=DEFAULT_MAX_PDF_BATCH):
+    """
+    Prepare every (target, batch size) case with its inputs already built.
+
+    Prediction is timed twice: "[compiled]" is the served model from
+    get_compiled(), and "[sklearn]" is the unpickled sklearn model and scaler
+    it was compiled from, as the baseline the compiled engines are measured
+    against. The sklearn case is left out when the pickles are not deployed.
+
+    Returns:
+        list: (target, batch_size, zero-argument callable) tuples
+    """
+    registry = get_registry()
+    largest = max(sizes)
+    cases = []
+    for disease, build_one, build_matrix, to_kwargs, predict_one, disease_name in (
+        ("diabetes", build_diabetes_features, build_diabetes_feature_matrix, _diabetes_kwargs, predict_diabetes, "Diabetes"),
+        ("heart", build_heart_features, build_heart_feature_matrix, _heart_kwargs, predict_heart, "Heart Disease"),
+    ):
+        frame = sample_rows(disease, largest, seed=seed)
+        kwargs_rows = to_kwargs(frame)
+        features = build_matrix(frame)
+        model = registry.get_compiled(disease)
+        try:
+            sources = registry.get(disease)
+        except ArtifactLoadError:
+            sources = None
+        probabilities = predict_risk(model, None, features).probabilities
+        reports = _report_kwargs(disease_name, kwargs_rows, probabilities)
+
+        for n in sizes:
+            rows = kwargs_rows[:n]
+            cases.append((
+                build_one.__name__, n,
+                lambda rows=rows, build_one=build_one: [build_one(**kwargs) for kwargs in rows],
+            ))
+            cases.append((
+                build_matrix.__name__, n,
+                lambda block=frame.iloc[:n], build_matrix=build_matrix: build_matrix(block),
+            ))
+            cases.append((f"{predict_one.__name__}[compiled]", n, _predict_call(predict_one, model, None, features[:n])))
+            if sources is not None:
+                cases.append((
+                    f"{predict_one.__name__}[sklearn]", n, _predict_call(predict_one, *sources, features[:n]),
+                ))
+            if n == 1:
+                # One patient's attributions and what-if curves, as the app computes them
+                cases.append((
+                    f"explain[{disease}]", n,
+                    lambda disease=disease, model=model, row=features[:1]: explain(model, disease, row),
+                ))
+                cases.append((
+                    f"risk_curves[{disease}]", n,
+                    lambda disease=disease, model=model, row=features[:1]: risk_curves(model, disease, row),
+                ))
+            if pdf_available() and n <= max_pdf_batch:
+                cases.append((
+                    f"build_pdf_report[{disease}]", n,
+                    lambda batch=reports[:n]: [build_pdf_report(**report) for report in batch],
+                ))
+    return cases
+
+
+def run_case(target, batch_size, func, repeats=None, warmup=2, budget_seconds=DEFAULT_BUDGET_SECONDS):
+    """
+    Time one case, then measure its peak traced memory in a separate call.
+
+    Without an explicit repeat count, the case is repeated as often as fits
+    in budget_seconds (between MIN_REPEATS and MAX_REPEATS times), judged by
+    the warmup calls. Memory is measured apart from the timed runs because
+    tracemalloc slows down every allocation.
+
+    Returns:
+        dict: Latency percentiles in milliseconds, rows_per_second and peak_memory_bytes
+    """
+    start = time.perf_counter()
+    for _ in range(warmup):
+        func()
+    per_call = (time.perf_counter() - start) / warmup
+    if repeats is None:
+        repeats = int(min(MAX_REPEATS, max(MIN_REPEATS, budget_seconds / max(per_call, 1e-9))))
+    timings = np.empty(repeats)
+    for i in range(repeats):
+        start = time.perf_counter()
+        func()
+        timings[i] = time.perf_counter() - start
+
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    p50, p95, p99 = np.percentile(timings, [50, 95, 99])
+    return {
+        "target": target,
+        "batch_size": batch_size,
+        "repeats": repeats,
+        "p50_ms": float(p50 * 1e3),
+        "p95_ms": float(p95 * 1e3),
+        "p99_ms": float(p99 * 1e3),
+        "mean_ms": float(timings.mean() * 1e3),
+        "rows_per_second": float(batch_size / p50) if p50 > 0 else float("inf"),
+        "peak_memory_bytes": peak,
+    }
+
+
+def run_suite(sizes=DEFAULT_SIZES, seed=DEFAULT_SEED, targets=None, max_pdf_batch=DEFAULT_MAX_PDF_BATCH, repeats=None):
+    """
+    Run every benchmark case.
+
+    Args:
+        sizes: Batch sizes to run each target at
+        seed: Seed for sampling rows from the CSVs
+        targets: Only run targets whose name contains one of these strings
+        max_pdf_batch: Largest batch size for build_pdf_report
+        repeats: Timed repetitions per case; sized to a time budget when None
+
+    Returns:
+        dict: {"meta": {...}, "results": [...]}
+    """
+    # Benchmarks measure the code itself, not the instrumentation
+    metrics.disable()
+    results = []
+    for target, batch_size, func in build_cases(sizes, seed=seed, max_pdf_batch=max_pdf_batch):
+        if targets and not any(name in target for name in targets):
+            continue
+        result = run_case(target, batch_size, func, repeats=repeats)
+        results.append(result)
+        print(
+            f"{target:<32} n={batch_size:<7} p50={result['p50_ms']:9.3f}ms "
+            f"p99={result['p99_ms']:9.3f}ms {result['rows_per_second']:>12,.0f} rows/s "
+            f"peak={result['peak_memory_bytes'] / 1e6:8.2f}MB",
+            file=sys.stderr,
+        )
+    meta = {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "sklearn": sklearn.__version__,
+        "seed": seed,
+        "sizes": list(sizes),
+    }
+    return {"meta": meta, "results": results}
+
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """
+    Compare p50 latencies against a baseline run.
+
+    Returns:
+        list: One dict per case present in both runs with target, batch_size,
+            baseline_ms, current_ms, ratio and regressed
+    """
+    previous = {(r["target"], r["batch_size"]): r for r in baseline["results"]}
+    comparison = []
+    for result in results["results"]:
+        before = previous.get((result["target"], result["batch_size"]))
+        if before is None:
+            continue
+        ratio = result["p50_ms"] / before["p50_ms"] if before["p50_ms"] > 0 else float("inf")
+        comparison.append({
+            "target": result["target"],
+            "batch_size": result["batch_size"],
+            "baseline_ms": before["p50_ms"],
+            "current_ms": result["p50_ms"],
+            "ratio": ratio,
+            "regressed": bool(ratio > 1 + tolerance),
+        })
+    return comparison
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark feature building, prediction and PDF reports.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--targets", nargs="+", default=None, help="Only run targets containing these names")
+    parser.add_argument("--repeats", type=int, default=None)
+    parser.add_argument("--max-pdf-batch", type=int, default=DEFAULT_MAX_PDF_BATCH)
+    parser.add_argument(
+        "--output", default=str(RESULTS_DIR / "benchmark_results.json"), help="Where to write the JSON results"
+    )
+    parser.add_argument("--baseline", default=None, help="Earlier results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="Allowed p50 slowdown, e.g. 0.2 = 20%%")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    results = run_suite(
+        sizes=args.sizes,
+        seed=args.seed,
+        targets=args.targets,
+        max_pdf_batch=args.max_pdf_batch,
+        repeats=args.repeats,
+    )
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        results["comparison"] = compare(results, baseline, tolerance=args.tolerance)
+    Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Wrote {args.output}", file=sys.stderr)
+
+    regressions = [c for c in results.get("comparison", []) if c["regressed"]]
+    for c in regressions:
+        print(
+            f"REGRESSION {c['target']} n={c['batch_size']}: "
+            f"{c['baseline_ms']:.3f}ms -> {c['current_ms']:.3f}ms ({c['ratio']:.2f}x)",
+            file=sys.stderr,
+        )
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
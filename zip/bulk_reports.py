@@ -0,0 +1,345 @@
+import argparse
+import io
+import itertools
+import os
+import sys
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import pandas as pd
+
+from reports import build_pdf_document, build_pdf_report, pdf_available
+
+try:
+    from pypdf import PdfReader, PdfWriter
+    from pypdf.generic import ArrayObject, DictionaryObject, IndirectObject, NameObject, NumberObject
+except ImportError:
+    PdfReader = PdfWriter = None
+
+
+# Reports rendered per task sent to a worker process
+DEFAULT_CHUNK_SIZE = 64
+# Rows of the scored CSV read into memory at a time
+DEFAULT_READ_SIZE = 10_000
+
+DISEASE_NAMES = {
+    "diabetes": "Diabetes",
+    "heart": "Heart Disease",
+}
+
+
+def _yes_no(value):
+    return "Yes" if value in (1, "1", True, "Yes") else "No"
+
+
+def _diabetes_inputs(row):
+    return {
+        "Age": row.age,
+        "Gender": row.gender,
+        "BMI": row.bmi,
+        "Smoking History": row.smoking_history,
+        "Hypertension": _yes_no(row.hypertension),
+        "Heart Disease": _yes_no(row.heart_disease),
+        "HbA1c Level": row.HbA1c_level,
+        "Blood Glucose Level": row.blood_glucose_level,
+    }
+
+
+def _heart_inputs(row):
+    bmi = row.weight / (row.height / 100) ** 2
+    return {
+        "Age": row.age,
+        "Gender": "Male" if row.gender in (1, "Male") else "Female",
+        "Height (cm)": row.height,
+        "Weight (kg)": row.weight,
+        "BMI": f"{bmi:.1f}",
+        "Systolic BP (mmHg)": row.systolic_bp,
+        "Diastolic BP (mmHg)": row.diastolic_bp,
+        "Cholesterol (mg/dL)": row.cholesterol,
+        "Glucose (mg/dL)": row.gluc,
+        "Smoker": _yes_no(row.smoke),
+        "Alcohol Use": _yes_no(row.alco),
+        "Physically Active": _yes_no(row.active),
+    }
+
+
+INPUT_FORMATTERS = {
+    "diabetes": _diabetes_inputs,
+    "heart": _heart_inputs,
+}
+
+
+def cohort_reports(disease, scored, name_column=None, generated_at=None):
+    """
+    Turn a scored cohort table into report arguments, one row at a time.
+
+    Args:
+        disease: "diabetes" or "heart"
+        scored: DataFrame from batch.score_frame(), or any table with the raw
+            input columns plus prediction and probability
+        name_column: Column holding the patient name; rows are named
+            "Patient <index>" when omitted
+        generated_at: datetime printed on every report; defaults to now
+
+    Yields:
+        dict: Keyword arguments for build_pdf_report()
+    """
+    disease_name = DISEASE_NAMES[disease]
+    format_inputs = INPUT_FORMATTERS[disease]
+    generated_at = generated_at or datetime.now()
+    for row in scored.itertuples():
+        name = getattr(row, name_column) if name_column else f"Patient {row.Index}"
+        yield {
+            "disease_name": disease_name,
+            "patient_name": str(name),
+            "inputs": format_inputs(row),
+            "prediction_label": "High Risk" if row.prediction == 1 else "Low Risk",
+            "probability_percent": float(row.probability) * 100,
+            "generated_at": generated_at,
+        }
+
+
+def _render_chunk(reports, merged):
+    if merged:
+        return [build_pdf_document(reports)]
+    return [build_pdf_report(**report) for report in reports]
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def render_reports(reports, workers=None, chunk_size=DEFAULT_CHUNK_SIZE, merged=False):
+    """
+    Render reports across a process pool, yielding results in input order.
+
+    At most two chunks per worker are queued or waiting to be consumed, so
+    memory stays bounded however long the input iterator is.
+
+    Args:
+        reports: Iterable of keyword-argument dicts for build_pdf_report()
+        workers: Worker processes; defaults to the CPU count
+        chunk_size: Reports sent to a worker per task
+        merged: Render each chunk as one multi-page PDF instead of one PDF per report
+
+    Yields:
+        tuple: (chunk, pdfs) where chunk is the list of report dicts and pdfs
+            holds one document per report, or a single document when merged
+    """
+    if not pdf_available():
+        raise RuntimeError("fpdf2 is required to render PDF reports")
+    workers = workers or os.cpu_count()
+    max_pending = 2 * workers
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for chunk in _chunks(reports, chunk_size):
+            pending.append((chunk, executor.submit(_render_chunk, chunk, merged)))
+            if len(pending) >= max_pending:
+                chunk, future = pending.popleft()
+                yield chunk, future.result()
+        while pending:
+            chunk, future = pending.popleft()
+            yield chunk, future.result()
+
+
+def _report_filename(index, report):
+    safe_name = (report["patient_name"].strip() or "Unknown").replace(" ", "_").replace("/", "_")
+    disease = report["disease_name"].replace(" ", "_")
+    return f"{index:06d}_{disease}_Report_{safe_name}.pdf"
+
+
+def _stats(count, start):
+    elapsed = time.perf_counter() - start
+    return {
+        "reports": count,
+        "seconds": elapsed,
+        "reports_per_second": count / elapsed if elapsed > 0 else float("inf"),
+    }
+
+
+def write_report_zip(reports, output_path, workers=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Render one PDF per report and stream them into a ZIP archive.
+
+    Each PDF is written to the archive as soon as its chunk finishes.
+    PDFs are stored without recompression because they are already
+    deflated.
+
+    Returns:
+        dict: reports, seconds and reports_per_second
+    """
+    start = time.perf_counter()
+    count = 0
+    with zipfile.ZipFile(output_path, "w", compression=zipfile.ZIP_STORED) as archive:
+        for chunk, pdfs in render_reports(reports, workers=workers, chunk_size=chunk_size):
+            for report, pdf in zip(chunk, pdfs):
+                archive.writestr(_report_filename(count, report), pdf)
+                count += 1
+    return _stats(count, start)
+
+
+class StreamingPdfMerger:
+    """
+    Append the pages of finished PDFs to an output file as they arrive.
+
+    Each document is parsed with pypdf, the objects its pages reach are
+    renumbered into the output's numbering and written out straight away,
+    and the document is then dropped. Only the byte offset of every object
+    and the page list are kept until close() writes the page tree, catalog
+    and cross-reference table, so memory does not grow with page content.
+    """
+
+    CATALOG = 1
+    PAGES = 2
+    INHERITED = ("/MediaBox", "/CropBox", "/Resources", "/Rotate")
+
+    def __init__(self, f):
+        self.f = f
+        # Byte offset of every object, indexed by object number; 0 is the free-list head
+        self.offsets = [0, None, None]
+        self.kids = []
+        f.write(b"%PDF-1.7\n%\xe2\xe3\xcf\xd3\n")
+
+    def _write_object(self, number, obj):
+        self.offsets[number] = self.f.tell()
+        self.f.write(f"{number} 0 obj\n".encode())
+        obj.write_to_stream(self.f)
+        self.f.write(b"\nendobj\n")
+
+    def append(self, pdf):
+        """Copy every page of a PDF (bytes) to the end of the output."""
+        reader = PdfReader(io.BytesIO(pdf))
+        numbers = {}
+        queue = deque()
+
+        def ref(indirect):
+            key = (indirect.idnum, indirect.generation)
+            if key not in numbers:
+                numbers[key] = len(self.offsets)
+                self.offsets.append(None)
+                queue.append((indirect, numbers[key]))
+            return IndirectObject(numbers[key], 0, None)
+
+        def renumber(obj):
+            # Rewrites references in place; the reader is dropped afterwards
+            if isinstance(obj, DictionaryObject):
+                for key, value in list(dict.items(obj)):
+                    dict.__setitem__(obj, key, ref(value) if isinstance(value, IndirectObject) else renumber(value))
+            elif isinstance(obj, ArrayObject):
+                for i, value in enumerate(list.__iter__(obj)):
+                    list.__setitem__(obj, i, ref(value) if isinstance(value, IndirectObject) else renumber(value))
+            return obj
+
+        pages = {}
+        for page in reader.pages:
+            self.kids.append(ref(page.indirect_reference))
+            pages[self.kids[-1].idnum] = page
+        while queue:
+            indirect, number = queue.popleft()
+            obj = indirect.get_object()
+            if number in pages:
+                # The page leaves its page tree behind, so it takes what it inherited from it
+                for key in self.INHERITED:
+                    if key not in obj and key in pages[number]:
+                        dict.__setitem__(obj, NameObject(key), dict.__getitem__(pages[number], key))
+            obj = renumber(obj)
+            if number in pages:
+                dict.__setitem__(obj, NameObject("/Parent"), IndirectObject(self.PAGES, 0, None))
+            self._write_object(number, obj)
+
+    def close(self):
+        """Write the page tree, catalog, cross-reference table and trailer."""
+        pages = DictionaryObject({
+            NameObject("/Type"): NameObject("/Pages"),
+            NameObject("/Kids"): ArrayObject(self.kids),
+            NameObject("/Count"): NumberObject(len(self.kids)),
+        })
+        self._write_object(self.PAGES, pages)
+        catalog = DictionaryObject({
+            NameObject("/Type"): NameObject("/Catalog"),
+            NameObject("/Pages"): IndirectObject(self.PAGES, 0, None),
+        })
+        self._write_object(self.CATALOG, catalog)
+        xref = self.f.tell()
+        self.f.write(f"xref\n0 {len(self.offsets)}\n0000000000 65535 f \n".encode())
+        self.f.write(b"".join(f"{offset:010d} 00000 n \n".encode() for offset in self.offsets[1:]))
+        self.f.write(
+            f"trailer\n<< /Size {len(self.offsets)} /Root {self.CATALOG} 0 R >>\n"
+            f"startxref\n{xref}\n%%EOF\n".encode()
+        )
+
+
+def write_merged_pdf(reports, output_path, workers=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Render every report as a page of one merged PDF.
+
+    Workers render each chunk as a multi-page document and the parent
+    streams each chunk's pages to the output file in order (see
+    StreamingPdfMerger), so memory stays bounded like the ZIP output.
+    Requires pypdf.
+
+    Returns:
+        dict: reports, seconds and reports_per_second
+    """
+    if PdfWriter is None:
+        raise RuntimeError("pypdf is required to write a merged PDF")
+    start = time.perf_counter()
+    count = 0
+    with open(output_path, "wb") as f:
+        merger = StreamingPdfMerger(f)
+        for chunk, (pdf,) in render_reports(reports, workers=workers, chunk_size=chunk_size, merged=True):
+            merger.append(pdf)
+            count += len(chunk)
+        merger.close()
+    return _stats(count, start)
+
+
+def read_scored_reports(disease, input_path, name_column=None, read_size=DEFAULT_READ_SIZE):
+    """
+    Stream report arguments out of a scored CSV written by batch.py.
+
+    Yields:
+        dict: Keyword arguments for build_pdf_report()
+    """
+    generated_at = datetime.now()
+    for frame in pd.read_csv(input_path, chunksize=read_size):
+        yield from cohort_reports(disease, frame, name_column=name_column, generated_at=generated_at)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Render PDF reports for a scored cohort CSV.")
+    parser.add_argument("disease", choices=sorted(DISEASE_NAMES))
+    parser.add_argument("input", help="Scored CSV written by batch.py")
+    parser.add_argument("output", help="Where to write the .zip, or the .pdf with --merged")
+    parser.add_argument("--merged", action="store_true", help="Write one multi-page PDF instead of a ZIP")
+    parser.add_argument("--name-column", default=None, help="Column holding the patient name")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    args = parser.parse_args(argv)
+    if args.merged and PdfWriter is None:
+        parser.error("--merged needs pypdf installed")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    reports = read_scored_reports(args.disease, args.input, name_column=args.name_column)
+    write = write_merged_pdf if args.merged else write_report_zip
+    stats = write(reports, args.output, workers=args.workers, chunk_size=args.chunk_size)
+    print(
+        f"Rendered {stats['reports']} reports in {stats['seconds']:.2f}s "
+        f"({stats['reports_per_second']:,.0f} reports/s)",
+        file=sys.stderr,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+
+from registry import get_registry
+
+
+DEFAULT_MAX_ENTRIES = 10_000
+DEFAULT_TTL_SECONDS = 3600.0
+
+CachedPrediction = namedtuple("CachedPrediction", ["prediction", "probability", "version", "scoring_seconds"])
+
+
+def feature_key(disease, version, features):
+    """
+    Build a cache key from the canonical bytes of a feature row and the model version.
+
+    Rows are normalised to contiguous float64 so 1 and 1.0, or int and float
+    inputs from different callers, hash the same.
+    """
+    canonical = np.ascontiguousarray(features, dtype=np.float64)
+    digest = hashlib.blake2b(canonical.tobytes(), digest_size=16).hexdigest()
+    return disease, version, digest
+
+
+class PredictionCache:
+    """
+    Size-bounded LRU cache of predictions with a per-entry time to live.
+
+    Entries for a disease are dropped as soon as a lookup sees a new model
+    version for it, so answers from replaced artifacts are never served.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, ttl_seconds=DEFAULT_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def _check_version(self, disease, version):
+        if self._versions.get(disease, version) != version:
+            stale = [key for key in self._entries if key[0] == disease]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+        self._versions[disease] = version
+
+    def get(self, key):
+        """Return the cached value for a key, or None on a miss."""
+        disease, version, _ = key
+        with self._lock:
+            self._check_version(disease, version)
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires_at = entry
+            if time.monotonic() >= expires_at:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        disease, version, _ = key
+        with self._lock:
+            self._check_version(disease, version)
+            self._entries[key] = (value, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """
+        Report cache effectiveness.
+
+        Returns:
+            dict: size, hits, misses, hit_rate, evictions, expirations and invalidations
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_prediction_cache():
+    """Return the process-wide PredictionCache, creating it on first use."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = PredictionCache()
+    return _cache
+
+
+def cached_prediction(disease, features, predict):
+    """
+    Return a cached (prediction, probability) for a feature row, computing it on a miss.
+
+    Args:
+        disease: "diabetes" or "heart"
+        features: Feature array from build_diabetes_features() or build_heart_features()
+        predict: Zero-argument callable returning (prediction, probability), e.g.
+            lambda: predict_diabetes(model, None, features)
+
+    Returns:
+        CachedPrediction: (prediction, probability, version, scoring_seconds),
+            with the registry version the row was keyed on and scoring_seconds
+            None on a cache hit, for hooks.after_prediction()
+    """
+    cache = get_prediction_cache()
+    version = get_registry().version(disease)
+    key = feature_key(disease, version, features)
+    result = cache.get(key)
+    scoring_seconds = None
+    if result is None:
+        scoring_start = time.perf_counter()
+        result = predict()
+        scoring_seconds = time.perf_counter() - scoring_start
+        cache.put(key, result)
+    return CachedPrediction(result[0], result[1], version, scoring_seconds)
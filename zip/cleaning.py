@@ -0,0 +1,85 @@
+import pandas as pd
+
+
+# Column renames applied to the raw heart.csv export
+HEART_RENAMES = {
+    "ap_hi": "systolic_bp",
+    "ap_lo": "diastolic_bp",
+    "cardio": "target",
+}
+
+DIABETES_NUMERIC_COLUMNS = ["age", "bmi", "HbA1c_level", "blood_glucose_level"]
+DIABETES_CATEGORICAL_COLUMNS = ["gender", "smoking_history"]
+
+
+def clean_heart_frame(frame):
+    """
+    Apply the cleaning rules from clean_heart.ipynb to raw heart.csv rows.
+
+    Rows are filtered independently of each other, so the function can be
+    applied to one chunk of a large file at a time. Duplicates are only
+    removed within the given frame.
+
+    Args:
+        frame: DataFrame in the raw heart.csv layout (ap_hi/ap_lo/cardio, age in days)
+
+    Returns:
+        pd.DataFrame: Cleaned rows in the cleaned_heart.csv layout
+    """
+    df = frame.rename(columns=HEART_RENAMES).drop_duplicates()
+
+    df = df[
+        (df["systolic_bp"] > 0) &
+        (df["diastolic_bp"] > 0) &
+        (df["systolic_bp"] < 250) &
+        (df["diastolic_bp"] < 200)
+    ]
+    df = df[
+        (df["height"] > 120) & (df["height"] < 220) &
+        (df["weight"] > 30) & (df["weight"] < 200)
+    ]
+
+    df = df.assign(
+        bmi=df["weight"] / ((df["height"] / 100) ** 2),
+        age=(df["age"] / 365.25).round(1),
+    )
+    df = df[(df["age"] >= 0) & (df["age"] <= 90)]
+
+    return df
+
+
+def clean_diabetes_frame(frame):
+    """
+    Apply the cleaning rules from clean_diab.ipynb to raw diabetes.csv rows.
+
+    Missing numbers are filled with the column median and missing categories
+    with the most common value, then rows with a non-positive bmi, age or
+    glucose are dropped. The gender and smoking one-hot columns are left to
+    build_diabetes_feature_matrix(), which always produces the same columns
+    as the app, even when a category is missing from the data.
+
+    Args:
+        frame: DataFrame in the raw diabetes.csv layout
+
+    Returns:
+        pd.DataFrame: Cleaned rows, same columns as the input
+    """
+    df = frame.copy()
+    for col in DIABETES_NUMERIC_COLUMNS:
+        df[col] = df[col].fillna(df[col].median())
+    for col in DIABETES_CATEGORICAL_COLUMNS:
+        df[col] = df[col].fillna(df[col].mode()[0])
+
+    df = df[(df["bmi"] > 0) & (df["age"] > 0) & (df["blood_glucose_level"] > 0)]
+
+    return df
+
+
+def read_raw_heart(path, chunk_size=None):
+    """
+    Read the semicolon-separated raw heart.csv export.
+
+    Returns:
+        pd.DataFrame, or an iterator of DataFrames when chunk_size is given
+    """
+    return pd.read_csv(path, sep=";", chunksize=chunk_size)
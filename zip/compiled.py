@@ -0,0 +1,254 @@
+import argparse
+import copy
+import pickle
+
+import numpy as np
+
+from forest import FlatForest, QuantizedForest
+from utils import MODELS_DIR, ArtifactLoadError, atomic_write
+
+
+COMPILED_VERSION = 3
+
+# Forests whose predict_proba is the mean of per-tree leaf probabilities
+FLAT_FOREST_TYPES = ("RandomForestClassifier", "ExtraTreesClassifier")
+
+
+def compiled_path(disease):
+    """Return where the compiled artifact for a disease is stored."""
+    return MODELS_DIR / f"{disease}_compiled.pkl"
+
+
+def scaler_arrays(scaler, n_features):
+    """Return the (mean, scale) vectors a StandardScaler applies, with identity defaults."""
+    mean = scaler.mean_ if getattr(scaler, "with_mean", True) else np.zeros(n_features)
+    scale = scaler.scale_ if getattr(scaler, "with_std", True) else np.ones(n_features)
+    return np.asarray(mean, dtype=np.float64), np.asarray(scale, dtype=np.float64)
+
+
+class FusedLinearModel:
+    """
+    Binary logistic model whose coefficients already include the StandardScaler.
+
+    For z = (x - mean) / scale, w . z + b == (w / scale) . x + (b - w . mean / scale),
+    so raw feature rows can be scored directly.
+    """
+
+    def __init__(self, coef, intercept, classes):
+        self.coef = np.asarray(coef, dtype=np.float64)
+        self.intercept = float(intercept)
+        self.classes_ = np.asarray(classes)
+
+    def decision_function(self, features):
+        scores = np.asarray(features, dtype=np.float64) @ self.coef + self.intercept
+        # sklearn's LogisticRegression rejects these rows rather than scoring them as NaN
+        if not np.isfinite(scores).all():
+            raise ValueError("Input contains NaN or infinity")
+        return scores
+
+    def predict_proba(self, features):
+        positive = 1.0 / (1.0 + np.exp(-self.decision_function(features)))
+        return np.column_stack([1.0 - positive, positive])
+
+    def predict(self, features):
+        return self.classes_[(self.decision_function(features) > 0).astype(int)]
+
+    def to_arrays(self):
+        """Split the model into plain arrays and JSON-serialisable metadata."""
+        return {"coef": self.coef}, {"intercept": self.intercept, "classes": self.classes_.tolist()}
+
+    @classmethod
+    def from_arrays(cls, arrays, meta):
+        return cls(arrays["coef"], meta["intercept"], meta["classes"])
+
+
+class ScaledModel:
+    """Fallback for models that cannot be fused: applies the scaler, then the model."""
+
+    def __init__(self, model, scaler):
+        self.model = model
+        self.scaler = scaler
+        self.classes_ = model.classes_
+
+    def predict_proba(self, features):
+        return self.model.predict_proba(self.scaler.transform(features))
+
+    def predict(self, features):
+        return self.model.predict(self.scaler.transform(features))
+
+
+def fuse_linear_model(model, scaler):
+    """Fold a StandardScaler into a fitted binary LogisticRegression."""
+    coef = np.asarray(model.coef_, dtype=np.float64).ravel()
+    mean, scale = scaler_arrays(scaler, coef.shape[0])
+    fused_coef = coef / scale
+    fused_intercept = float(np.ravel(model.intercept_)[0]) - float(np.dot(fused_coef, mean))
+    return FusedLinearModel(fused_coef, fused_intercept, model.classes_)
+
+
+def _tree_estimators(model):
+    if hasattr(model, "tree_"):
+        return [model]
+    return list(np.ravel(model.estimators_))
+
+
+def raw_thresholds(thresholds, features, mean, scale):
+    """
+    Map split thresholds learned on scaled features back into raw feature units.
+
+    sklearn trees compare float32(z) <= t. Rounding to float32 means that split
+    really sits halfway between the largest float32 <= t and the next float32,
+    so that boundary (rather than t itself) is mapped through x = z * scale + mean.
+    Raw rows compared in float64 against the result follow the same branches
+    as the scaled rows did.
+    """
+    thresholds = np.asarray(thresholds, dtype=np.float64)
+    lower = thresholds.astype(np.float32)
+    lower = np.where(lower > thresholds, np.nextafter(lower, np.float32(-np.inf)), lower)
+    upper = np.nextafter(lower, np.float32(np.inf))
+    boundary = (lower.astype(np.float64) + upper.astype(np.float64)) / 2
+    return boundary * scale[features] + mean[features]
+
+
+def fuse_tree_model(model, scaler):
+    """
+    Fold a StandardScaler into the split thresholds of a fitted sklearn tree model.
+
+    A split (x - mean) / scale <= t is the same as x <= t * scale + mean, so
+    every internal node's threshold is mapped back into raw feature units.
+    The input model is left untouched. sklearn casts rows to float32 before
+    walking the trees, so rows lying within float32 rounding of a split can
+    take the other branch; probabilities then differ by a few trees' votes.
+    """
+    fused = copy.deepcopy(model)
+    mean, scale = scaler_arrays(scaler, model.n_features_in_)
+    for estimator in _tree_estimators(fused):
+        tree = estimator.tree_
+        internal = tree.feature >= 0
+        tree.threshold[internal] = raw_thresholds(
+            tree.threshold[internal], tree.feature[internal], mean, scale
+        )
+    return fused
+
+
+def fuse_model(model, scaler):
+    """
+    Return a model that scores raw feature rows without a separate scaler step.
+
+    Linear models and sklearn tree ensembles are fused, with binary random
+    forests packed into a FlatForest; anything else is wrapped in ScaledModel
+    so callers can always pass scaler=None.
+    """
+    if hasattr(model, "coef_") and np.ravel(model.intercept_).shape[0] == 1:
+        return fuse_linear_model(model, scaler)
+    if type(model).__name__ in FLAT_FOREST_TYPES and len(model.classes_) == 2:
+        return FlatForest.from_sklearn(model, scaler)
+    if hasattr(model, "tree_") or (
+        hasattr(model, "estimators_") and all(hasattr(e, "tree_") for e in _tree_estimators(model))
+    ):
+        return fuse_tree_model(model, scaler)
+    return ScaledModel(model, scaler)
+
+
+# Compiled model types that can be stored as plain arrays, keyed by kind
+ARRAY_MODEL_TYPES = {
+    "linear": FusedLinearModel,
+    "flat_forest": FlatForest,
+    "quantized_forest": QuantizedForest,
+}
+
+
+def model_to_arrays(model):
+    """
+    Decompose a compiled model into arrays for shared memory or on-disk storage.
+
+    Returns:
+        tuple: (kind, arrays, meta)
+    """
+    for kind, model_type in ARRAY_MODEL_TYPES.items():
+        if isinstance(model, model_type):
+            arrays, meta = model.to_arrays()
+            return kind, arrays, meta
+    raise ValueError(f"{type(model).__name__} cannot be stored as plain arrays")
+
+
+def model_from_arrays(kind, arrays, meta):
+    """Rebuild a compiled model from the output of model_to_arrays()."""
+    try:
+        model_type = ARRAY_MODEL_TYPES[kind]
+    except KeyError:
+        raise ArtifactLoadError(f"Unknown compiled model kind: {kind}")
+    return model_type.from_arrays(arrays, meta)
+
+
+def export_compiled(disease, model, scaler, source_version, source_stamp=None):
+    """
+    Fuse a model/scaler pair and write it next to the source artifacts.
+
+    Args:
+        source_version: Content hash of the source pickles, from
+            ModelRegistry.source_version()
+        source_stamp: Their file stamps, from ModelRegistry.source_stamp()
+
+    Returns:
+        Path: Location of the compiled artifact
+    """
+    path = compiled_path(disease)
+    payload = {
+        "compiled_version": COMPILED_VERSION,
+        "source_version": source_version,
+        "source_stamp": source_stamp,
+        "model": fuse_model(model, scaler),
+    }
+    with atomic_write(path, "wb") as f:
+        pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+    return path
+
+
+def load_compiled(disease, built_from_sources):
+    """
+    Load a compiled artifact, provided it was built from the current source artifacts.
+
+    Args:
+        built_from_sources: Called with the stored payload; returns whether
+            its "source_version"/"source_stamp" match the current sources
+
+    Returns:
+        The fused model, or None if no up-to-date compiled artifact exists
+    """
+    path = compiled_path(disease)
+    try:
+        with open(path, "rb") as f:
+            payload = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        raise ArtifactLoadError(f"Failed to load compiled {disease} model: {e}")
+    if payload.get("compiled_version") != COMPILED_VERSION:
+        return None
+    if not built_from_sources(payload):
+        return None
+    return payload["model"]
+
+
+def main(argv=None):
+    from registry import ARTIFACTS, get_registry
+
+    parser = argparse.ArgumentParser(description="Fuse the scaler into each model and save it.")
+    parser.add_argument("diseases", nargs="*", help="Defaults to every disease")
+    args = parser.parse_args(argv)
+    unknown = set(args.diseases) - set(ARTIFACTS)
+    if unknown:
+        parser.error(f"unknown disease(s): {', '.join(sorted(unknown))}")
+
+    registry = get_registry()
+    for disease in args.diseases or sorted(ARTIFACTS):
+        model, scaler = registry.get(disease)
+        path = export_compiled(
+            disease, model, scaler, registry.source_version(disease), registry.source_stamp(disease)
+        )
+        print(f"Wrote {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from cleaning import clean_diabetes_frame, clean_heart_frame, read_raw_heart
+from utils import atomic_write, current_dir, file_sha256, publish_dir
+
+
+DATA_DIR = Path(__file__).parent / "data"
+STORE_DIR = DATA_DIR / "store"
+SCHEMA = "disease-prediction-dataset"
+FORMAT_VERSION = 1
+MANIFEST_NAME = "manifest.json"
+# Bump when the cleaning rules change so stored datasets are rebuilt
+CLEANING_VERSION = 1
+
+
+def _read_diabetes(path):
+    return clean_diabetes_frame(pd.read_csv(path))
+
+
+def _read_heart(path):
+    return clean_heart_frame(read_raw_heart(path))
+
+
+# Per dataset: raw source, reader applying the notebook cleaning rules, and
+# the narrowest dtype that holds every cleaned value. "category" columns are
+# stored as int8 codes plus the category list in the manifest.
+DATASETS = {
+    "diabetes": {
+        "source": DATA_DIR / "diabetes.csv",
+        "read": _read_diabetes,
+        "columns": {
+            "gender": "category",
+            "age": "float32",
+            "hypertension": "int8",
+            "heart_disease": "int8",
+            "smoking_history": "category",
+            "bmi": "float32",
+            "HbA1c_level": "float32",
+            "blood_glucose_level": "int16",
+            "diabetes": "int8",
+        },
+    },
+    "heart": {
+        "source": DATA_DIR / "heart.csv",
+        "read": _read_heart,
+        "columns": {
+            "id": "int32",
+            "age": "float32",
+            "gender": "int8",
+            "height": "int16",
+            "weight": "float32",
+            "systolic_bp": "int16",
+            "diastolic_bp": "int16",
+            "cholesterol": "int8",
+            "gluc": "int8",
+            "smoke": "int8",
+            "alco": "int8",
+            "active": "int8",
+            "target": "int8",
+            "bmi": "float32",
+        },
+    },
+}
+
+
+def dataset_dir(name):
+    """Return the versioned directory holding a stored dataset (see utils.publish_dir)."""
+    return STORE_DIR / name
+
+
+def _source_stamp(path):
+    stat = Path(path).stat()
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def _narrow(values, dtype):
+    """Cast a column to its stored dtype, refusing integer casts that would change values."""
+    narrowed = np.asarray(values).astype(dtype)
+    if narrowed.dtype.kind in "iu" and not np.array_equal(narrowed, values):
+        raise ValueError(f"values do not fit in {dtype}")
+    return narrowed
+
+
+def materialize(name, source=None):
+    """
+    Clean a raw CSV and write it as one .npy file per column plus a JSON manifest.
+
+    Each build is a new version directory published by replacing a pointer
+    file, so concurrent readers never see a half-written dataset.
+
+    Returns:
+        dict: The manifest, with "directory" as in read_manifest()
+    """
+    spec = DATASETS[name]
+    source = Path(source or spec["source"])
+    start = time.perf_counter()
+    frame = spec["read"](source)
+
+    with publish_dir(dataset_dir(name)) as directory:
+        columns = {}
+        for column, dtype in spec["columns"].items():
+            entry = {"file": f"{column}.npy"}
+            if dtype == "category":
+                categorical = pd.Categorical(frame[column])
+                values = categorical.codes.astype(np.int8)
+                entry["categories"] = [str(category) for category in categorical.categories]
+            else:
+                try:
+                    values = _narrow(frame[column].to_numpy(), dtype)
+                except ValueError as e:
+                    raise ValueError(f"{name}.{column}: {e}")
+            entry["dtype"] = values.dtype.str
+            np.save(directory / entry["file"], np.ascontiguousarray(values), allow_pickle=False)
+            columns[column] = entry
+
+        manifest = {
+            "schema": SCHEMA,
+            "format_version": FORMAT_VERSION,
+            "cleaning_version": CLEANING_VERSION,
+            "name": name,
+            "source": str(source),
+            "source_sha256": file_sha256(source),
+            "source_stamp": _source_stamp(source),
+            "rows": len(frame),
+            "columns": columns,
+            "build_seconds": time.perf_counter() - start,
+        }
+        with open(directory / MANIFEST_NAME, "w") as f:
+            json.dump(manifest, f, indent=2)
+    manifest["directory"] = str(current_dir(dataset_dir(name)))
+    return manifest
+
+
+def read_manifest(name):
+    """
+    Return a stored dataset's manifest, or None if it is missing or in an old format.
+
+    "directory" is added to the manifest: the version directory it was read
+    from, which its column files must be read from too.
+    """
+    directory = current_dir(dataset_dir(name))
+    if directory is None:
+        return None
+    try:
+        with open(directory / MANIFEST_NAME) as f:
+            manifest = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+    if (
+        manifest.get("schema") != SCHEMA
+        or manifest.get("format_version") != FORMAT_VERSION
+        or manifest.get("cleaning_version") != CLEANING_VERSION
+    ):
+        return None
+    manifest["directory"] = str(directory)
+    return manifest
+
+
+def _refresh_stamp(manifest, stamp):
+    manifest["source_stamp"] = stamp
+    stored = {key: value for key, value in manifest.items() if key != "directory"}
+    with atomic_write(Path(manifest["directory"]) / MANIFEST_NAME) as f:
+        json.dump(stored, f, indent=2)
+
+
+def ensure_dataset(name, source=None):
+    """
+    Return an up-to-date manifest for a dataset, rebuilding it only if its source changed.
+
+    The source file's mtime and size are checked first; the file is only
+    hashed when they differ from the manifest, and the dataset is only
+    rebuilt when the hash differs too (a touched but unchanged file just has
+    its stamp updated).
+
+    Returns:
+        dict: The manifest
+    """
+    source = Path(source or DATASETS[name]["source"])
+    manifest = read_manifest(name)
+    if manifest is None or manifest["source"] != str(source):
+        return materialize(name, source)
+    stamp = _source_stamp(source)
+    if manifest["source_stamp"] == stamp:
+        return manifest
+    if file_sha256(source) != manifest["source_sha256"]:
+        return materialize(name, source)
+    _refresh_stamp(manifest, stamp)
+    return manifest
+
+
+def stored_manifest(name, source=None):
+    """
+    Return a stored dataset's manifest if it is current for its source, without writing anything.
+
+    Returns:
+        dict: The manifest, or None if the dataset is missing or stale
+    """
+    source = Path(source or DATASETS[name]["source"])
+    manifest = read_manifest(name)
+    if manifest is None or manifest["source"] != str(source):
+        return None
+    if manifest["source_stamp"] == _source_stamp(source) or file_sha256(source) == manifest["source_sha256"]:
+        return manifest
+    return None
+
+
+def _map_columns(manifest, columns):
+    directory = Path(manifest["directory"])
+    return {
+        column: np.load(directory / manifest["columns"][column]["file"], mmap_mode="r", allow_pickle=False)
+        for column in columns or manifest["columns"]
+    }
+
+
+def open_columns(name, columns=None, source=None):
+    """
+    Memory-map a stored dataset's columns, building or rebuilding it first if needed.
+
+    Args:
+        name: "diabetes" or "heart"
+        columns: Column names to map; defaults to all of them
+        source: Raw CSV to build from; defaults to the one in data/
+
+    Returns:
+        tuple: (arrays, manifest) where arrays maps column name to a read-only
+            memory-mapped array (category codes for category columns)
+    """
+    manifest = ensure_dataset(name, source)
+    return _map_columns(manifest, columns), manifest
+
+
+def load_frame(name, columns=None, source=None, build=True):
+    """
+    Return a stored dataset as a DataFrame, with category columns decoded.
+
+    Args:
+        build: Build or refresh the store first if needed. With False nothing
+            is written: a missing or stale store is bypassed and the CSV is
+            cleaned in memory instead, for request paths and read-only deploys.
+
+    Returns:
+        tuple: (frame, source_sha256)
+    """
+    if not build:
+        manifest = stored_manifest(name, source)
+        if manifest is None:
+            spec = DATASETS[name]
+            source = Path(source or spec["source"])
+            frame = spec["read"](source)
+            return frame[list(columns or spec["columns"])], file_sha256(source)
+        arrays = _map_columns(manifest, columns)
+    else:
+        arrays, manifest = open_columns(name, columns, source)
+    data = {}
+    for column, values in arrays.items():
+        categories = manifest["columns"][column].get("categories")
+        data[column] = pd.Categorical.from_codes(values, categories) if categories else values
+    return pd.DataFrame(data), manifest["source_sha256"]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the columnar store of cleaned training data.")
+    parser.add_argument("datasets", nargs="*", help="Defaults to every dataset")
+    parser.add_argument("--force", action="store_true", help="Rebuild even if the source is unchanged")
+    args = parser.parse_args(argv)
+    unknown = set(args.datasets) - set(DATASETS)
+    if unknown:
+        parser.error(f"unknown dataset(s): {', '.join(sorted(unknown))}")
+
+    for name in args.datasets or sorted(DATASETS):
+        manifest = materialize(name) if args.force else ensure_dataset(name)
+        directory = Path(manifest["directory"])
+        size = sum((directory / entry["file"]).stat().st_size for entry in manifest["columns"].values())
+        print(f"{name}: {manifest['rows']} rows, {size / 1e6:.1f} MB in {directory}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
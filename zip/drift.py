@@ -0,0 +1,450 @@
+import argparse
+import bisect
+import json
+import logging
+import os
+import sys
+import threading
+
+import numpy as np
+
+from utils import MODELS_DIR, SMOKING_CATEGORIES, atomic_write
+
+
+ENV_FLAG = "DISEASE_PREDICTION_DRIFT"
+DRIFT_DIR = MODELS_DIR / "drift"
+REFERENCE_VERSION = 1
+
+# Continuous inputs are sketched in this many equal-frequency bins of the training data.
+# These fixed bins stand in for streaming quantile sketches (KLL, t-digest):
+# PSI needs live and reference counts over the same bins anyway, and a fixed
+# histogram costs one bisect per value. The price is resolution: live values
+# are only located to within a bin (about 1/20 of the training data each), so
+# KS is evaluated at the bin edges only (see ks()).
+CONTINUOUS_BINS = 20
+PROBABILITY_EDGES = np.linspace(0, 1, 21)[1:-1]
+# Conventional PSI cut-offs: below WARN is stable, above ALERT has drifted
+PSI_WARN = 0.1
+PSI_ALERT = 0.25
+# Bins with no rows are counted as this share so PSI stays finite
+PSI_FLOOR = 1e-4
+DEFAULT_INTERVAL = 300.0
+DEFAULT_MIN_ROWS = 100
+
+# Per disease: monitored inputs as (name, kind, feature columns, categories).
+# "continuous" inputs get quantile bins from the training data; "category"
+# inputs count each listed value plus one bin for anything else; "one_hot"
+# inputs count which of their columns is set, with the first category for none.
+DRIFT_VARIABLES = {
+    "diabetes": [
+        ("age", "continuous", [0], None),
+        ("bmi", "continuous", [3], None),
+        ("HbA1c_level", "continuous", [4], None),
+        ("blood_glucose_level", "continuous", [5], None),
+        ("hypertension", "category", [1], [0, 1]),
+        ("heart_disease", "category", [2], [0, 1]),
+        ("gender", "one_hot", [6, 7], ["Female", "Male", "Other"]),
+        ("smoking_history", "one_hot", [8, 9, 10, 11, 12], ["No Info"] + SMOKING_CATEGORIES),
+    ],
+    "heart": [
+        ("age", "continuous", [1], None),
+        ("height", "continuous", [3], None),
+        ("weight", "continuous", [4], None),
+        ("systolic_bp", "continuous", [5], None),
+        ("diastolic_bp", "continuous", [6], None),
+        ("bmi", "continuous", [12], None),
+        ("gender", "category", [2], [1, 2]),
+        ("cholesterol", "category", [7], [1, 2, 3]),
+        ("gluc", "category", [8], [1, 2, 3]),
+        ("smoke", "category", [9], [0, 1]),
+        ("alco", "category", [10], [0, 1]),
+        ("active", "category", [11], [0, 1]),
+    ],
+}
+
+logger = logging.getLogger(__name__)
+
+_enabled = os.environ.get(ENV_FLAG, "").lower() in ("1", "true", "yes", "on")
+_monitors = {}
+_reports = {}
+_lock = threading.Lock()
+
+
+def enabled():
+    return _enabled
+
+
+def enable():
+    global _enabled
+    _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def reference_path(disease):
+    return DRIFT_DIR / f"{disease}_reference.json"
+
+
+class Variable:
+    """One monitored input (or the predicted probability) and the fixed bins it is counted in."""
+
+    def __init__(self, name, kind, columns, categories=None, edges=None):
+        self.name = name
+        self.kind = kind
+        self.columns = list(columns)
+        self.categories = categories
+        self.edges = None if edges is None else np.asarray(edges, dtype=np.float64)
+        self._edge_list = None if edges is None else self.edges.tolist()
+        if kind == "category":
+            self.n_bins = len(categories) + 1
+        elif kind == "one_hot":
+            self.n_bins = len(categories)
+        else:
+            self.n_bins = len(self.edges) + 1
+
+    def bins(self, values):
+        """Map a (rows, len(columns)) block of values to bin indices."""
+        if self.kind == "one_hot":
+            # 0 when no column is set, otherwise 1 + the set column
+            return np.where(values.any(axis=1), values.argmax(axis=1) + 1, 0)
+        column = values[:, 0]
+        if self.kind == "category":
+            index = np.full(len(column), len(self.categories))
+            for i, category in enumerate(self.categories):
+                index[column == category] = i
+            return index
+        return np.searchsorted(self.edges, column, side="right")
+
+    def bin_one(self, values):
+        """Bin index for a single row's values (a list, one per column), without NumPy overhead."""
+        if self.kind == "one_hot":
+            for i, value in enumerate(values):
+                if value:
+                    return i + 1
+            return 0
+        if self.kind == "category":
+            return self.categories.index(values[0]) if values[0] in self.categories else len(self.categories)
+        return bisect.bisect_right(self._edge_list, values[0])
+
+    def to_json(self):
+        return {
+            "name": self.name,
+            "kind": self.kind,
+            "columns": self.columns,
+            "categories": self.categories,
+            "edges": None if self.edges is None else self.edges.tolist(),
+        }
+
+    @classmethod
+    def from_json(cls, data):
+        return cls(data["name"], data["kind"], data["columns"], data["categories"], data["edges"])
+
+
+def _quantile_edges(values, n_bins=CONTINUOUS_BINS):
+    """
+    Return bin edges splitting values into roughly equal-frequency bins.
+
+    Each edge sits halfway between two neighbouring distinct values, so
+    readings such as HbA1c 6.6 fall in the same bin whether they arrive as
+    float64 or as the float32 stored in the dataset store.
+    """
+    distinct = np.unique(values)
+    cuts = np.quantile(values, np.linspace(0, 1, n_bins + 1)[1:-1])
+    upper = np.unique(np.clip(np.searchsorted(distinct, cuts, side="right"), 1, len(distinct) - 1))
+    return (distinct[upper - 1] + distinct[upper]) / 2
+
+
+def _variables(disease, features):
+    """Build the disease's Variables, with continuous bin edges taken from its training features."""
+    variables = []
+    for name, kind, columns, categories in DRIFT_VARIABLES[disease]:
+        edges = _quantile_edges(features[:, columns[0]]) if kind == "continuous" else None
+        variables.append(Variable(name, kind, columns, categories, edges))
+    variables.append(Variable("probability", "continuous", [], edges=PROBABILITY_EDGES))
+    return variables
+
+
+def _count(variables, features, probabilities):
+    """Return the concatenated bin counts of every variable for a block of rows."""
+    offsets = np.cumsum([0] + [v.n_bins for v in variables])
+    features = np.asarray(features, dtype=np.float64)
+    probabilities = np.asarray(probabilities, dtype=np.float64).reshape(-1, 1)
+    index = np.column_stack([
+        offset + variable.bins(features[:, variable.columns] if variable.columns else probabilities)
+        for variable, offset in zip(variables, offsets)
+    ])
+    return np.bincount(index.ravel(), minlength=offsets[-1])
+
+
+def build_reference(disease):
+    """
+    Sketch a disease's training data and the served model's probabilities on it.
+
+    Written to models/drift/<disease>_reference.json along with the model
+    version, so a newly published model gets a new reference.
+
+    Returns:
+        dict: The reference
+    """
+    from datastore import load_frame
+    from registry import get_registry
+    from utils import build_diabetes_feature_matrix, build_heart_feature_matrix, predict_risk
+
+    builder = build_diabetes_feature_matrix if disease == "diabetes" else build_heart_feature_matrix
+    frame, source_hash = load_frame(disease)
+    features = builder(frame)
+    registry = get_registry()
+    probabilities = predict_risk(registry.get_compiled(disease), None, features).probabilities
+
+    variables = _variables(disease, features)
+    reference = {
+        "reference_version": REFERENCE_VERSION,
+        "disease": disease,
+        "source_sha256": source_hash,
+        "model_version": registry.source_version(disease),
+        "rows": len(features),
+        "variables": [variable.to_json() for variable in variables],
+        "counts": _count(variables, features, probabilities).tolist(),
+    }
+    DRIFT_DIR.mkdir(parents=True, exist_ok=True)
+    with atomic_write(reference_path(disease)) as f:
+        json.dump(reference, f)
+    return reference
+
+
+def load_reference(disease):
+    """Return the saved reference if it matches the served model, building it otherwise."""
+    from registry import get_registry
+
+    try:
+        with open(reference_path(disease)) as f:
+            reference = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return build_reference(disease)
+    if (
+        reference.get("reference_version") != REFERENCE_VERSION
+        or reference.get("model_version") != get_registry().source_version(disease)
+    ):
+        return build_reference(disease)
+    return reference
+
+
+def psi(expected, actual):
+    """Population stability index between two count vectors over the same bins."""
+    expected = np.maximum(expected / max(expected.sum(), 1), PSI_FLOOR)
+    actual = np.maximum(actual / max(actual.sum(), 1), PSI_FLOOR)
+    return float(np.sum((actual - expected) * np.log(actual / expected)))
+
+
+def ks(expected, actual):
+    """
+    Kolmogorov-Smirnov distance between two binned distributions, evaluated at the bin edges.
+
+    This is a lower bound on the KS statistic of the raw values: the CDFs
+    are only compared between bins, so a gap that opens and closes inside
+    one bin is missed. The shortfall is at most the larger of the two shares
+    of any single bin, about 0.05 for 20 equal-frequency bins when the live
+    data still resembles the training data. Live values beyond the training
+    range are counted in the end bins, so a shift past the extremes shows up
+    in PSI and KS only by how much it moves those bins' shares.
+    """
+    expected_cdf = np.cumsum(expected) / max(expected.sum(), 1)
+    actual_cdf = np.cumsum(actual) / max(actual.sum(), 1)
+    return float(np.abs(expected_cdf - actual_cdf).max())
+
+
+class DriftMonitor:
+    """
+    Fixed-size counts of live inputs and probabilities for one disease.
+
+    Every variable is counted in the bins of its reference sketch, so memory
+    is a few hundred integers however much traffic arrives, and recording a
+    request is one binning pass over its rows and one bincount.
+    """
+
+    def __init__(self, disease, reference):
+        self.disease = disease
+        self.variables = [Variable.from_json(v) for v in reference["variables"]]
+        self.offsets = np.cumsum([0] + [v.n_bins for v in self.variables])
+        self.reference_counts = np.asarray(reference["counts"], dtype=np.int64)
+        self.model_version = reference["model_version"]
+        self.counts = np.zeros(self.offsets[-1], dtype=np.int64)
+        self.rows = 0
+        self.total_rows = 0
+        self._lock = threading.Lock()
+
+    def observe(self, features, probabilities):
+        probabilities = np.atleast_1d(probabilities)
+        if len(probabilities) == 1:
+            # A single form or API request: plain Python is several times faster than NumPy here
+            row = np.asarray(features).reshape(-1).tolist()
+            probability = [float(probabilities[0])]
+            index = [
+                offset + variable.bin_one([row[c] for c in variable.columns] if variable.columns else probability)
+                for variable, offset in zip(self.variables, self.offsets)
+            ]
+            with self._lock:
+                self.counts[index] += 1
+                self.rows += 1
+            return
+        counts = _count(self.variables, features, probabilities)
+        with self._lock:
+            self.counts += counts
+            self.rows += len(probabilities)
+
+    def compare(self, reset=True):
+        """
+        Compare the rows seen since the last comparison with the reference.
+
+        Returns:
+            dict: rows plus per variable psi, ks (continuous only) and status
+                ("ok", "warn" or "drift")
+        """
+        with self._lock:
+            counts, rows = self.counts.copy(), self.rows
+            if reset:
+                self.counts[:] = 0
+                self.total_rows += self.rows
+                self.rows = 0
+        variables = {}
+        for variable, start, stop in zip(self.variables, self.offsets[:-1], self.offsets[1:]):
+            expected, actual = self.reference_counts[start:stop], counts[start:stop]
+            value = psi(expected, actual)
+            variables[variable.name] = {
+                "psi": value,
+                "ks": ks(expected, actual) if variable.kind == "continuous" else None,
+                "status": "drift" if value >= PSI_ALERT else "warn" if value >= PSI_WARN else "ok",
+            }
+        return {"disease": self.disease, "rows": rows, "variables": variables}
+
+
+def record(disease, features, probabilities):
+    """
+    Count one request's feature rows and predicted probabilities.
+
+    A no-op until start_drift_checks() has loaded the disease's reference,
+    and when drift monitoring is disabled.
+    """
+    if not _enabled:
+        return
+    monitor = _monitors.get(disease)
+    if monitor is not None:
+        monitor.observe(features, probabilities)
+
+
+def check(min_rows=DEFAULT_MIN_ROWS):
+    """
+    Compare every monitor that has seen at least min_rows since its last check.
+
+    Drifted variables are logged as warnings. A monitor whose model has been
+    republished is replaced with one for the new reference.
+
+    Returns:
+        dict: The latest report per disease
+    """
+    from registry import get_registry
+
+    registry = get_registry()
+    for disease, monitor in list(_monitors.items()):
+        if monitor.model_version != registry.source_version(disease):
+            _monitors[disease] = DriftMonitor(disease, load_reference(disease))
+            continue
+        if monitor.rows < min_rows:
+            continue
+        report = monitor.compare(reset=True)
+        with _lock:
+            _reports[disease] = report
+        drifted = {name: v for name, v in report["variables"].items() if v["status"] != "ok"}
+        for name, values in drifted.items():
+            logger.warning(
+                "%s.%s %s over %d rows: psi=%.3f ks=%s",
+                disease, name, values["status"], report["rows"], values["psi"],
+                "n/a" if values["ks"] is None else f"{values['ks']:.3f}",
+            )
+    return drift_report()
+
+
+def drift_report():
+    """Return the latest comparison per disease."""
+    with _lock:
+        return dict(_reports)
+
+
+def _start_monitors(diseases):
+    """
+    Start a monitor for every disease that does not have one yet.
+
+    A reference that fails to load or build is logged and left for the next
+    call, so one unreadable model does not stop the others being monitored.
+    """
+    for disease in diseases:
+        if disease in _monitors:
+            continue
+        try:
+            _monitors[disease] = DriftMonitor(disease, load_reference(disease))
+        except Exception:
+            logger.exception("Could not load the %s drift reference; retrying at the next check", disease)
+
+
+def start_drift_checks(diseases=None, interval=DEFAULT_INTERVAL, min_rows=DEFAULT_MIN_ROWS):
+    """
+    Load reference sketches and compare live traffic against them every interval seconds, on a daemon thread.
+
+    Enables recording. References are loaded (or built, which takes a few
+    seconds) on the thread, so requests are only counted once it is ready.
+    References that fail to load are retried before every check.
+
+    Returns:
+        threading.Event: Set it to stop the thread
+    """
+    from registry import ARTIFACTS
+
+    enable()
+    stop = threading.Event()
+    diseases = [disease for disease in diseases or sorted(DRIFT_VARIABLES) if disease in ARTIFACTS]
+
+    def run():
+        _start_monitors(diseases)
+        while not stop.wait(interval):
+            _start_monitors(diseases)
+            try:
+                check(min_rows)
+            except Exception:
+                logger.exception("Drift check failed")
+
+    threading.Thread(target=run, name="drift-checks", daemon=True).start()
+    return stop
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build drift reference sketches or compare a CSV against them.")
+    parser.add_argument("disease", choices=sorted(DRIFT_VARIABLES))
+    parser.add_argument("csv", nargs="?", help="Batch-layout CSV to compare; omit to only (re)build the reference")
+    args = parser.parse_args(argv)
+
+    if args.csv is None:
+        reference = build_reference(args.disease)
+        print(f"Wrote {reference_path(args.disease)} ({reference['rows']} rows)", file=sys.stderr)
+        return
+
+    import pandas as pd
+    from registry import get_registry
+    from utils import build_diabetes_feature_matrix, build_heart_feature_matrix, predict_risk
+
+    builder = build_diabetes_feature_matrix if args.disease == "diabetes" else build_heart_feature_matrix
+    features = builder(pd.read_csv(args.csv))
+    probabilities = predict_risk(get_registry().get_compiled(args.disease), None, features).probabilities
+    monitor = DriftMonitor(args.disease, load_reference(args.disease))
+    monitor.observe(features, probabilities)
+    report = monitor.compare()
+    print(f"{args.disease}: {report['rows']} rows")
+    for name, values in report["variables"].items():
+        ks_text = "" if values["ks"] is None else f" ks={values['ks']:.3f}"
+        print(f"  {name:<22} psi={values['psi']:.3f}{ks_text} {values['status']}")
+
+
+if __name__ == "__main__":
+    main()
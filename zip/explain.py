@@ -0,0 +1,203 @@
+from collections import namedtuple
+from functools import lru_cache
+
+import numpy as np
+
+from compiled import FusedLinearModel
+from forest import LEAF_LEVELS, DEFAULT_BLOCK_ROWS, FlatForest, QuantizedForest
+from metrics import stage_timer
+
+
+Explanation = namedtuple("Explanation", ["names", "contributions", "base_values", "probabilities"])
+
+# Per disease: user-facing inputs and the feature columns each one covers.
+# One-hot columns are summed into their input. The heart id column is a
+# constant placeholder and is left out.
+EXPLAIN_GROUPS = {
+    "diabetes": [
+        ("Age", [0]),
+        ("Hypertension", [1]),
+        ("Heart Disease", [2]),
+        ("BMI", [3]),
+        ("HbA1c Level", [4]),
+        ("Blood Glucose Level", [5]),
+        ("Gender", [6, 7]),
+        ("Smoking History", [8, 9, 10, 11, 12]),
+    ],
+    "heart": [
+        ("Age", [1]),
+        ("Gender", [2]),
+        ("Height", [3]),
+        ("Weight", [4]),
+        ("Systolic BP", [5]),
+        ("Diastolic BP", [6]),
+        ("Cholesterol", [7]),
+        ("Glucose", [8]),
+        ("Smoker", [9]),
+        ("Alcohol Use", [10]),
+        ("Physically Active", [11]),
+        ("BMI", [12]),
+    ],
+}
+
+
+@lru_cache(maxsize=None)
+def background_means(disease):
+    """
+    Return the mean feature row of a disease's cleaned training data.
+
+    Computed once per process, normally by the startup prewarm, from the
+    dataset store (see datastore.py). Nothing is written: if the store has
+    not been built ahead of time, the CSV is cleaned in memory instead.
+
+    Returns:
+        np.ndarray: Read-only array of shape (n_features,)
+    """
+    from datastore import load_frame
+    from utils import build_diabetes_feature_matrix, build_heart_feature_matrix
+
+    builder = build_diabetes_feature_matrix if disease == "diabetes" else build_heart_feature_matrix
+    frame, _ = load_frame(disease, build=False)
+    means = builder(frame).mean(axis=0)
+    means.setflags(write=False)
+    return means
+
+
+def _sigmoid(z):
+    return 1.0 / (1.0 + np.exp(-z))
+
+
+def linear_contributions(model, features, background):
+    """
+    Exact per-feature contributions of a fused linear model.
+
+    In log-odds, feature i contributes coef_i * (x_i - background_i), and
+    these sum to the row's log-odds minus the background row's. They are
+    rescaled by (p - p_base) / (z - z_base) so that, like the tree
+    contributions, they are in probability units and sum to p - p_base.
+
+    Returns:
+        tuple: (contributions, base_value, probabilities)
+    """
+    features = np.asarray(features, dtype=np.float64)
+    log_odds = features * model.coef - background * model.coef
+    z = model.decision_function(features)
+    z_base = float(background @ model.coef + model.intercept)
+    p, p_base = _sigmoid(z), _sigmoid(z_base)
+    dz = z - z_base
+    # Where z == z_base the secant becomes the sigmoid's slope
+    safe_dz = np.where(np.abs(dz) > 1e-12, dz, 1.0)
+    scale = np.where(np.abs(dz) > 1e-12, (p - p_base) / safe_dz, p * (1 - p))
+    return log_odds * scale[:, None], np.full(len(p), p_base), p
+
+
+def forest_contributions(forest, features, block_rows=DEFAULT_BLOCK_ROWS):
+    """
+    Path-based (Saabas) contributions of a FlatForest or QuantizedForest.
+
+    Each tree's prediction is its root value plus, for every split on the
+    row's path, the change in node value from parent to child, credited to
+    the split's feature. Averaged over trees, the contributions sum exactly
+    to predict_proba minus the mean root value. The paths come from the
+    forest's own walk(), so missing values are routed exactly as in
+    predict_proba; the cost is O(rows * trees * depth).
+
+    Returns:
+        tuple: (contributions, base_values, probabilities)
+    """
+    features = np.asarray(features)
+    n_rows, n_features = features.shape
+    quantized = isinstance(forest, QuantizedForest)
+    roots = forest.offsets if quantized else forest.roots
+    values = forest.value.astype(np.float64) / LEAF_LEVELS if quantized else forest.value
+    base = float(values[roots].mean())
+
+    contributions = np.zeros((n_rows, n_features))
+    probabilities = np.empty(n_rows)
+    for start in range(0, n_rows, block_rows):
+        block = features[start:start + block_rows]
+        rows = len(block)
+        row_offsets = (np.arange(rows, dtype=np.int64) * n_features)[:, None]
+        totals = np.zeros(rows * n_features)
+        path = forest.walk(block)
+        nodes = next(path)
+        for children in path:
+            # Leaves point to themselves, so finished paths add zero
+            delta = values[children] - values[nodes]
+            columns = row_offsets + np.take(forest.feature, nodes)
+            totals += np.bincount(columns.ravel(), weights=delta.ravel(), minlength=totals.size)
+            nodes = children
+        contributions[start:start + rows] = totals.reshape(rows, n_features) / forest.n_trees
+        probabilities[start:start + rows] = values[nodes].mean(axis=1)
+    return contributions, np.full(n_rows, base), probabilities
+
+
+def occlusion_contributions(model, disease, features):
+    """
+    Model-agnostic contributions of each input group, for models without an exact method.
+
+    A group's contribution is the row's probability minus the probability
+    with that group's columns set to the training means. Every occluded copy
+    goes through one predict_proba call. Unlike the exact methods, the
+    contributions do not in general sum to the row's probability minus the
+    base value (the probability of the mean row).
+
+    Returns:
+        tuple: (grouped contributions of shape (n_rows, n_groups), base_values, probabilities)
+    """
+    features = np.asarray(features, dtype=np.float64)
+    background = background_means(disease)
+    groups = EXPLAIN_GROUPS[disease]
+    n_rows = len(features)
+    occluded = np.tile(features, (len(groups), 1))
+    for i, (_, columns) in enumerate(groups):
+        occluded[i * n_rows:(i + 1) * n_rows, columns] = background[columns]
+    scores = model.predict_proba(np.vstack([features, occluded, background[None, :]]))[:, 1]
+    probabilities = scores[:n_rows]
+    occluded_scores = scores[n_rows:-1].reshape(len(groups), n_rows).T
+    return probabilities[:, None] - occluded_scores, np.full(n_rows, scores[-1]), probabilities
+
+
+def explain(model, disease, features):
+    """
+    Attribute each prediction to the inputs the user entered.
+
+    Args:
+        model: Compiled model from the registry. FusedLinearModel, FlatForest
+            and QuantizedForest are explained exactly; any other model with
+            predict_proba by occlusion (see occlusion_contributions)
+        disease: "diabetes" or "heart"
+        features: Feature array of shape (n_rows, n_features)
+
+    Returns:
+        Explanation: names of the inputs, contributions of shape
+            (n_rows, len(names)) in probability units, base_values and
+            probabilities; for the exact methods
+            base_value + contributions.sum(axis=1) == probability
+    """
+    groups = EXPLAIN_GROUPS[disease]
+    with stage_timer("explain"):
+        if isinstance(model, FusedLinearModel):
+            contributions, base_values, probabilities = linear_contributions(
+                model, features, background_means(disease)
+            )
+        elif isinstance(model, (FlatForest, QuantizedForest)):
+            contributions, base_values, probabilities = forest_contributions(model, features)
+        else:
+            grouped, base_values, probabilities = occlusion_contributions(model, disease, features)
+            return Explanation([name for name, _ in groups], grouped, base_values, probabilities)
+
+        grouped = np.column_stack([contributions[:, columns].sum(axis=1) for _, columns in groups])
+        return Explanation([name for name, _ in groups], grouped, base_values, probabilities)
+
+
+def top_factors(explanation, row=0, limit=5):
+    """
+    Return the largest contributions for one row, strongest first.
+
+    Returns:
+        list: (name, contribution) pairs, contributions in probability units
+    """
+    contributions = explanation.contributions[row]
+    order = np.argsort(-np.abs(contributions))[:limit]
+    return [(explanation.names[i], float(contributions[i])) for i in order]
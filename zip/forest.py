@@ -0,0 +1,553 @@
+import numpy as np
+
+
+# Rows walked through the forest at once; bounds the (rows, trees) node index array
+DEFAULT_BLOCK_ROWS = 4096
+# From this many rows, predict_proba walks one tree at a time over the whole
+# block instead of every tree one level at a time: each step then gathers
+# from one small tree's nodes, and the per-call overhead of trees * depth
+# NumPy steps is spread over enough rows to pay off.
+PER_TREE_MIN_ROWS = 2048
+PER_TREE_BLOCK_ROWS = 32768
+
+
+def _per_tree_sum(columns, n_rows, feature, threshold, children, value, starts, ends, max_depth, local_children,
+                  missing=None, missing_left=None):
+    """
+    Walk each tree over every row of a block and return the per-row sum of leaf values.
+
+    Args:
+        columns: Feature-major inputs, columns.ravel()[f * n_rows + row]
+        children: right/left child pairs per node; global node indices, or
+            indices local to each tree if local_children is True
+        starts, ends: Node range of each tree
+        missing: Optional boolean array laid out like columns marking missing
+            inputs, which go left at the nodes flagged in missing_left
+    """
+    rows = np.arange(n_rows, dtype=np.intp)
+    total = np.zeros(n_rows, dtype=np.float64)
+    flat_columns = columns.ravel()
+    flat_missing = None if missing is None else missing.ravel()
+    for start, end in zip(starts.tolist(), ends.tolist()):
+        tree_feature = feature[start:end].astype(np.intp) * n_rows
+        tree_threshold = threshold[start:end]
+        tree_children = children[2 * start:2 * end].astype(np.intp)
+        if not local_children:
+            tree_children -= start
+        tree_missing_left = None if missing is None else missing_left[start:end]
+        nodes = np.zeros(n_rows, dtype=np.intp)
+        for _ in range(max_depth):
+            index = tree_feature[nodes] + rows
+            go_left = flat_columns[index] <= tree_threshold[nodes]
+            if flat_missing is not None:
+                go_left |= flat_missing[index] & tree_missing_left[nodes]
+            nodes = tree_children[nodes * 2 + go_left]
+        total += value[start:end][nodes]
+    return total
+
+
+class FlatForest:
+    """
+    A binary random forest packed into flat NumPy node arrays.
+
+    All trees share one set of node arrays and are walked together, one level
+    per step, for every row at once. Leaves point back to themselves, so after
+    max_depth steps every (row, tree) pair sits on its leaf and the forest
+    probability is the mean of the leaf values.
+
+    Attributes:
+        feature: Split feature per node (0 for leaves)
+        threshold: Split threshold per node (+inf for leaves, so leaves go "left" to themselves)
+        left, right: Child node indices
+        value: Positive-class probability per node, for internal nodes as well as leaves
+        roots: Index of each tree's root node
+        max_depth: Deepest leaf in any tree
+        input_dtype: float32 when thresholds are in sklearn's scaled float32 space,
+            float64 when the scaler has been folded into raw-unit thresholds
+        children: right/left child pairs, so children[2 * node + go_left] is the next node
+        missing_left: Per node, whether a missing (NaN) input goes left. Taken
+            from sklearn's missing_go_to_left; NaN fails every <= comparison,
+            so without it missing inputs would always go right.
+    """
+
+    def __init__(self, feature, threshold, left, right, value, roots, max_depth, n_features, classes, input_dtype=np.float64, children=None, missing_left=None):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+        self.missing_left = np.zeros(len(feature), dtype=bool) if missing_left is None else missing_left
+        self.roots = roots
+        self.max_depth = int(max_depth)
+        self.n_features_in_ = int(n_features)
+        self.classes_ = np.asarray(classes)
+        self.input_dtype = np.dtype(input_dtype)
+        # children[2 * node + go_left] gives the next node in a single gather
+        self.children = np.stack([right, left], axis=1).ravel() if children is None else children
+
+    @classmethod
+    def from_sklearn(cls, model, scaler=None):
+        """
+        Pack a fitted binary RandomForestClassifier/ExtraTreesClassifier.
+
+        Args:
+            model: Fitted sklearn forest classifier with two classes
+            scaler: Optional StandardScaler to fold into the thresholds, so rows
+                are passed in raw units
+
+        Returns:
+            FlatForest
+        """
+        from compiled import scaler_arrays, raw_thresholds
+
+        if len(model.classes_) != 2:
+            raise ValueError("FlatForest only supports binary classifiers")
+        trees = [estimator.tree_ for estimator in model.estimators_]
+        sizes = np.array([tree.node_count for tree in trees])
+        offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+        n_nodes = int(sizes.sum())
+
+        feature = np.zeros(n_nodes, dtype=np.int32)
+        threshold = np.full(n_nodes, np.inf, dtype=np.float64)
+        left = np.empty(n_nodes, dtype=np.int32)
+        right = np.empty(n_nodes, dtype=np.int32)
+        value = np.empty(n_nodes, dtype=np.float64)
+        missing_left = np.zeros(n_nodes, dtype=bool)
+        if scaler is not None:
+            mean, scale = scaler_arrays(scaler, model.n_features_in_)
+
+        for tree, offset, size in zip(trees, offsets, sizes):
+            nodes = slice(offset, offset + size)
+            internal = tree.children_left >= 0
+            own = np.arange(offset, offset + size, dtype=np.int32)
+
+            tree_feature = tree.feature[internal]
+            tree_threshold = tree.threshold[internal]
+            if scaler is not None:
+                tree_threshold = raw_thresholds(tree_threshold, tree_feature, mean, scale)
+            feature[nodes][internal] = tree_feature
+            threshold[nodes][internal] = tree_threshold
+            left[nodes] = np.where(internal, tree.children_left + offset, own)
+            right[nodes] = np.where(internal, tree.children_right + offset, own)
+            # Trees from sklearn < 1.3 have no missing_go_to_left; their NaNs go right
+            tree_missing_left = getattr(tree, "missing_go_to_left", None)
+            if tree_missing_left is not None:
+                missing_left[nodes] = (np.asarray(tree_missing_left) != 0) & internal
+
+            counts = tree.value[:, 0, :]
+            value[nodes] = counts[:, 1] / counts.sum(axis=1)
+
+        return cls(
+            feature=feature,
+            threshold=threshold,
+            left=left,
+            right=right,
+            value=value,
+            roots=offsets.astype(np.int32),
+            max_depth=max(tree.max_depth for tree in trees),
+            n_features=model.n_features_in_,
+            classes=model.classes_,
+            input_dtype=np.float32 if scaler is None else np.float64,
+            missing_left=missing_left,
+        )
+
+    def to_arrays(self):
+        """
+        Split the forest into plain arrays and JSON-serialisable metadata.
+
+        Returns:
+            tuple: (arrays, meta) accepted by FlatForest.from_arrays()
+        """
+        arrays = {
+            "feature": self.feature,
+            "threshold": self.threshold,
+            "left": self.left,
+            "right": self.right,
+            "value": self.value,
+            "roots": self.roots,
+            "children": self.children,
+            "missing_left": self.missing_left,
+        }
+        meta = {
+            "max_depth": self.max_depth,
+            "n_features": self.n_features_in_,
+            "classes": self.classes_.tolist(),
+            "input_dtype": self.input_dtype.name,
+        }
+        return arrays, meta
+
+    @classmethod
+    def from_arrays(cls, arrays, meta):
+        """Rebuild a forest around existing arrays (e.g. shared memory views) without copying."""
+        return cls(
+            feature=arrays["feature"],
+            threshold=arrays["threshold"],
+            left=arrays["left"],
+            right=arrays["right"],
+            value=arrays["value"],
+            roots=arrays["roots"],
+            max_depth=meta["max_depth"],
+            n_features=meta["n_features"],
+            classes=meta["classes"],
+            input_dtype=meta["input_dtype"],
+            children=arrays.get("children"),
+            missing_left=arrays["missing_left"],
+        )
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    def walk(self, features):
+        """
+        Walk every tree for every row at once, one level per step.
+
+        Missing (NaN) inputs follow missing_left, as in predict_proba.
+        Leaves point to themselves, so rows that reach a leaf early stay on it.
+
+        Yields:
+            np.ndarray: The node each row is at in every tree, shape
+                (n_rows, n_trees) with global node indices: first the
+                roots, then one array per level down to the leaves
+        """
+        features = np.ascontiguousarray(features, dtype=self.input_dtype)
+        n_rows, n_features = features.shape
+        flat_features = features.ravel()
+        missing = bool(np.isnan(flat_features).any())
+        row_offsets = (np.arange(n_rows, dtype=np.int64) * n_features)[:, None]
+        nodes = np.broadcast_to(self.roots, (n_rows, self.n_trees)).copy()
+        yield nodes
+        for _ in range(self.max_depth):
+            values = np.take(flat_features, row_offsets + np.take(self.feature, nodes))
+            go_left = values <= np.take(self.threshold, nodes)
+            if missing:
+                go_left |= np.isnan(values) & np.take(self.missing_left, nodes)
+            nodes = np.take(self.children, nodes * 2 + go_left)
+            yield nodes
+
+    def apply(self, features):
+        """
+        Return the leaf index reached in every tree for each row.
+
+        Returns:
+            np.ndarray: Array of shape (n_rows, n_trees) with global node indices
+        """
+        for nodes in self.walk(features):
+            pass
+        return nodes
+
+    def predict_proba(self, features, block_rows=DEFAULT_BLOCK_ROWS):
+        """
+        Return class probabilities with the same layout as sklearn's predict_proba.
+
+        Small batches walk every tree at once with apply(); from
+        PER_TREE_MIN_ROWS rows the trees are walked one at a time.
+        """
+        features = np.asarray(features)
+        n_rows = features.shape[0]
+        positive = np.empty(n_rows, dtype=np.float64)
+        if n_rows >= PER_TREE_MIN_ROWS:
+            ends = np.append(self.roots[1:], len(self.feature))
+            for start in range(0, n_rows, PER_TREE_BLOCK_ROWS):
+                block = features[start:start + PER_TREE_BLOCK_ROWS]
+                columns = np.ascontiguousarray(block.T, dtype=self.input_dtype)
+                missing = np.isnan(columns)
+                total = _per_tree_sum(
+                    columns, len(block), self.feature, self.threshold, self.children, self.value,
+                    self.roots, ends, self.max_depth, local_children=False,
+                    missing=missing if missing.any() else None, missing_left=self.missing_left,
+                )
+                positive[start:start + len(block)] = total / self.n_trees
+            return np.column_stack([1.0 - positive, positive])
+        for start in range(0, n_rows, block_rows):
+            stop = start + block_rows
+            positive[start:stop] = self.value[self.apply(features[start:stop])].mean(axis=1)
+        return np.column_stack([1.0 - positive, positive])
+
+    def predict(self, features):
+        return self.classes_[(self.predict_proba(features)[:, 1] > 0.5).astype(int)]
+
+    def quantize(self, bounds):
+        """
+        Pack the forest into a QuantizedForest for the given input ranges.
+
+        Branches that no row inside the bounds can reach are pruned, so a
+        split whose threshold lies outside its feature's range is replaced by
+        its only reachable child. A branch only missing (NaN) inputs take is
+        kept, pruned as if the feature were always missing. A split whose two
+        leaves round to the same uint8 probability is replaced by that leaf.
+
+        Args:
+            bounds: (lower, upper) per feature, in raw units
+
+        Returns:
+            QuantizedForest
+        """
+        if self.input_dtype != np.float64:
+            raise ValueError("Only forests with the scaler folded in (raw-unit thresholds) can be quantized")
+        lower, upper = (np.asarray(b, dtype=np.float64) for b in zip(*bounds))
+        if lower.shape[0] != self.n_features_in_:
+            raise ValueError(f"Expected bounds for {self.n_features_in_} features, got {lower.shape[0]}")
+        levels = np.rint(np.asarray(self.value) * LEAF_LEVELS).astype(np.uint8)
+
+        def missing_only(low, high, f):
+            # NaN bounds mark a feature that is missing on every row reaching a branch
+            low, high = low.copy(), high.copy()
+            low[f] = high[f] = np.nan
+            return low, high
+
+        def prune(node, low, high):
+            # Returns a leaf as (level,) and a split as (feature, threshold, level, left, right, missing_left)
+            if self.left[node] == node:
+                return (levels[node],)
+            f = self.feature[node]
+            t = self.threshold[node]
+            missing_left = bool(self.missing_left[node])
+            if np.isnan(low[f]):
+                return prune(self.left[node] if missing_left else self.right[node], low, high)
+            reaches_left = low[f] <= t
+            reaches_right = high[f] > t
+            if not reaches_right and missing_left:
+                return prune(self.left[node], low, high)
+            if not reaches_left and not missing_left:
+                return prune(self.right[node], low, high)
+            if reaches_left:
+                left_high = high.copy()
+                left_high[f] = min(high[f], t)
+                left = prune(self.left[node], low, left_high)
+            else:
+                left = prune(self.left[node], *missing_only(low, high, f))
+            if reaches_right:
+                right_low = low.copy()
+                right_low[f] = max(low[f], np.nextafter(t, np.inf))
+                right = prune(self.right[node], right_low, high)
+            else:
+                right = prune(self.right[node], *missing_only(low, high, f))
+            if len(left) == 1 and left == right:
+                return left
+            return (f, t, levels[node], left, right, missing_left)
+
+        trees = [prune(root, lower, upper) for root in self.roots]
+        cuts = [
+            np.unique([t for f, t in _splits(trees) if f == feature]) for feature in range(self.n_features_in_)
+        ]
+        if max(len(c) for c in cuts) >= MISSING_CODE:
+            raise ValueError("A feature has too many distinct thresholds for uint16 codes")
+
+        feature, threshold, children, value, offsets, missing_left = [], [], [], [], [], []
+        max_depth = 0
+        for tree in trees:
+            offsets.append(len(feature))
+            # (subtree, depth, slot in children to patch with its local index)
+            stack = [(tree, 0, None)]
+            while stack:
+                subtree, depth, slot = stack.pop()
+                index = len(feature) - offsets[-1]
+                if slot is not None:
+                    children[slot] = index
+                max_depth = max(max_depth, depth)
+                if len(subtree) == 1:
+                    feature.append(0)
+                    threshold.append(LEAF_CODE)
+                    value.append(subtree[0])
+                    missing_left.append(False)
+                    children.extend([index, index])
+                    continue
+                f, t, level, left, right, goes_left = subtree
+                feature.append(f)
+                threshold.append(np.searchsorted(cuts[f], t))
+                value.append(level)
+                missing_left.append(goes_left)
+                # children[2 * node + go_left]: right child first, then left
+                children.extend([-1, -1])
+                stack.append((right, depth + 1, len(children) - 2))
+                stack.append((left, depth + 1, len(children) - 1))
+
+        tree_sizes = np.diff(offsets + [len(feature)])
+        index_dtype = np.uint16 if tree_sizes.max() <= np.iinfo(np.uint16).max else np.uint32
+        return QuantizedForest(
+            feature=np.asarray(feature, dtype=np.uint8 if self.n_features_in_ <= 256 else np.uint16),
+            threshold=np.asarray(threshold, dtype=np.uint16),
+            children=np.asarray(children, dtype=index_dtype),
+            value=np.asarray(value, dtype=np.uint8),
+            missing_left=np.asarray(missing_left, dtype=bool),
+            offsets=np.asarray(offsets, dtype=np.int32),
+            cuts=np.concatenate(cuts),
+            cut_offsets=np.cumsum([0] + [len(c) for c in cuts]).astype(np.int32),
+            lower=lower,
+            upper=upper,
+            max_depth=max_depth,
+            n_features=self.n_features_in_,
+            classes=self.classes_,
+        )
+
+
+def _splits(trees):
+    """Yield (feature, threshold) for every split in pruned subtrees from FlatForest.quantize."""
+    stack = list(trees)
+    while stack:
+        subtree = stack.pop()
+        if len(subtree) > 1:
+            yield subtree[0], subtree[1]
+            stack.extend(subtree[3:5])
+
+
+# Leaf probabilities are stored as uint8 steps of 1 / LEAF_LEVELS
+LEAF_LEVELS = 255
+# Threshold code of a leaf; every input code is below it, so leaves go "left" to themselves
+LEAF_CODE = np.iinfo(np.uint16).max
+# Input code of a missing (NaN) value; above every split's code, so it goes right unless flagged
+MISSING_CODE = LEAF_CODE - 1
+
+
+class QuantizedForest:
+    """
+    A FlatForest stored with narrow dtypes for a bounded input range.
+
+    Thresholds are stored as uint16 codes: the rank of the split among its
+    feature's distinct thresholds (``cuts``). Rows are coded the same way
+    with a binary search per feature, and x <= cut[k] exactly when the
+    row's code is <= k, so every row takes the same branches as in the
+    full-precision forest. Child indices are local to each tree (uint16 for
+    trees under 65536 nodes), features are uint8 and node probabilities are
+    uint8 steps of 1/255, which puts predict_proba within 1/510 of the
+    original. Rows are clipped to the (lower, upper) bounds the forest was
+    pruned for, so a row outside them is scored as if it sat on the bound.
+    Missing (NaN) values are coded as MISSING_CODE and follow missing_left
+    at each split, as in FlatForest.
+    """
+
+    def __init__(self, feature, threshold, children, value, offsets, cuts, cut_offsets, lower, upper, max_depth, n_features, classes, missing_left):
+        self.feature = feature
+        self.threshold = threshold
+        self.children = children
+        self.value = value
+        self.missing_left = missing_left
+        self.offsets = offsets
+        self.cuts = cuts
+        self.cut_offsets = cut_offsets
+        self.lower = np.asarray(lower, dtype=np.float64)
+        self.upper = np.asarray(upper, dtype=np.float64)
+        self.max_depth = int(max_depth)
+        self.n_features_in_ = int(n_features)
+        self.classes_ = np.asarray(classes)
+
+    def to_arrays(self):
+        """Split the forest into plain arrays and JSON-serialisable metadata."""
+        arrays = {
+            "feature": self.feature,
+            "threshold": self.threshold,
+            "children": self.children,
+            "value": self.value,
+            "missing_left": self.missing_left,
+            "offsets": self.offsets,
+            "cuts": self.cuts,
+            "cut_offsets": self.cut_offsets,
+            "lower": self.lower,
+            "upper": self.upper,
+        }
+        meta = {
+            "max_depth": self.max_depth,
+            "n_features": self.n_features_in_,
+            "classes": self.classes_.tolist(),
+        }
+        return arrays, meta
+
+    @classmethod
+    def from_arrays(cls, arrays, meta):
+        return cls(
+            feature=arrays["feature"],
+            threshold=arrays["threshold"],
+            children=arrays["children"],
+            value=arrays["value"],
+            missing_left=arrays["missing_left"],
+            offsets=arrays["offsets"],
+            cuts=arrays["cuts"],
+            cut_offsets=arrays["cut_offsets"],
+            lower=arrays["lower"],
+            upper=arrays["upper"],
+            max_depth=meta["max_depth"],
+            n_features=meta["n_features"],
+            classes=meta["classes"],
+        )
+
+    @property
+    def n_trees(self):
+        return len(self.offsets)
+
+    def encode(self, features):
+        """Clip rows to the bounds and replace each value by its threshold code (MISSING_CODE for NaN)."""
+        features = np.clip(np.asarray(features, dtype=np.float64), self.lower, self.upper)
+        codes = np.empty(features.shape, dtype=np.uint16)
+        for f in range(self.n_features_in_):
+            cuts = self.cuts[self.cut_offsets[f]:self.cut_offsets[f + 1]]
+            codes[:, f] = np.searchsorted(cuts, features[:, f], side="left")
+        missing = np.isnan(features)
+        if missing.any():
+            codes[missing] = MISSING_CODE
+        return codes
+
+    def walk(self, features):
+        """
+        Walk every tree for every row at once, one level per step; see FlatForest.walk.
+
+        Yields:
+            np.ndarray: Global node indices of shape (n_rows, n_trees), from
+                the roots down to the leaves
+        """
+        codes = self.encode(features)
+        n_rows, n_features = codes.shape
+        flat_codes = codes.ravel()
+        missing = bool((flat_codes == MISSING_CODE).any())
+        row_offsets = (np.arange(n_rows, dtype=np.int64) * n_features)[:, None]
+        nodes = np.broadcast_to(self.offsets, (n_rows, self.n_trees)).copy()
+        yield nodes
+        for _ in range(self.max_depth):
+            values = np.take(flat_codes, row_offsets + np.take(self.feature, nodes))
+            go_left = values <= np.take(self.threshold, nodes)
+            if missing:
+                go_left |= (values == MISSING_CODE) & np.take(self.missing_left, nodes)
+            nodes = np.take(self.children, nodes * 2 + go_left) + self.offsets
+            yield nodes
+
+    def apply(self, features):
+        """
+        Return the leaf index reached in every tree for each row.
+
+        Returns:
+            np.ndarray: Array of shape (n_rows, n_trees) with global node indices
+        """
+        for nodes in self.walk(features):
+            pass
+        return nodes
+
+    def predict_proba(self, features, block_rows=DEFAULT_BLOCK_ROWS):
+        """
+        Return class probabilities with the same layout as sklearn's predict_proba.
+
+        Like FlatForest.predict_proba, large batches are walked one tree at a time.
+        """
+        features = np.asarray(features)
+        n_rows = features.shape[0]
+        positive = np.empty(n_rows, dtype=np.float64)
+        if n_rows >= PER_TREE_MIN_ROWS:
+            ends = np.append(self.offsets[1:], len(self.feature))
+            for start in range(0, n_rows, PER_TREE_BLOCK_ROWS):
+                block = features[start:start + PER_TREE_BLOCK_ROWS]
+                columns = np.ascontiguousarray(self.encode(block).T)
+                missing = columns == MISSING_CODE
+                total = _per_tree_sum(
+                    columns, len(block), self.feature, self.threshold, self.children, self.value,
+                    self.offsets, ends, self.max_depth, local_children=True,
+                    missing=missing if missing.any() else None, missing_left=self.missing_left,
+                )
+                positive[start:start + len(block)] = total / (self.n_trees * LEAF_LEVELS)
+            return np.column_stack([1.0 - positive, positive])
+        for start in range(0, n_rows, block_rows):
+            stop = start + block_rows
+            leaves = self.value[self.apply(features[start:stop])]
+            positive[start:stop] = leaves.mean(axis=1) / LEAF_LEVELS
+        return np.column_stack([1.0 - positive, positive])
+
+    def predict(self, features):
+        return self.classes_[(self.predict_proba(features)[:, 1] > 0.5).astype(int)]
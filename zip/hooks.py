@@ -0,0 +1,27 @@
+import audit
+import drift
+import shadow
+from metrics import count_predictions
+
+
+def after_prediction(disease, version, features, labels, probabilities, scoring_seconds, total_seconds):
+    """
+    Hand a served prediction to everything that observes predictions.
+
+    Called once per request by the app and the API, after the response is
+    known: prediction counters, drift bin counts, shadow scoring and the
+    audit log. Each hook is a no-op unless it was started.
+
+    Args:
+        disease: "diabetes" or "heart"
+        version: Registry version of the model that served the request
+        features: Feature row, or matrix for a batch
+        labels: Predicted label, or array of labels
+        probabilities: Predicted probability, or array of probabilities
+        scoring_seconds: Time the model took, or None on a prediction cache hit
+        total_seconds: Time the whole request took, for the audit log
+    """
+    count_predictions(disease, labels)
+    drift.record(disease, features, probabilities)
+    shadow.record(disease, features, probabilities, scoring_seconds)
+    audit.record(disease, version, features, probabilities, labels, total_seconds)
@@ -0,0 +1,289 @@
+import bisect
+import logging
+import os
+import threading
+import time
+from contextlib import nullcontext
+from functools import wraps
+
+
+ENV_FLAG = "DISEASE_PREDICTION_METRICS"
+
+# Bucket upper bounds grow by 2**(1/4) (~19%) from 1 microsecond to ~2 minutes,
+# so estimated percentiles are within one bucket width of the true value.
+_BUCKETS_PER_OCTAVE = 4
+BUCKET_BOUNDS = [1e-6 * 2 ** (i / _BUCKETS_PER_OCTAVE) for i in range(27 * _BUCKETS_PER_OCTAVE + 1)]
+QUANTILES = (0.5, 0.95, 0.99)
+
+logger = logging.getLogger(__name__)
+
+_enabled = os.environ.get(ENV_FLAG, "").lower() in ("1", "true", "yes", "on")
+_null_timer = nullcontext()
+
+
+def enabled():
+    return _enabled
+
+
+def enable():
+    """Start recording timers and counters, regardless of the environment flag."""
+    global _enabled
+    _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+class LatencyHistogram:
+    """
+    Fixed-bucket latency histogram with percentile estimates.
+
+    Recording is a bisect into a constant bucket list plus a counter bump,
+    so it costs the same however many samples have been seen.
+    """
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKET_BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        index = bisect.bisect_left(BUCKET_BOUNDS, seconds)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.total += seconds
+
+    def snapshot(self):
+        with self._lock:
+            return list(self.counts), self.count, self.total
+
+    @staticmethod
+    def quantile(counts, count, q):
+        """Estimate a quantile by interpolating geometrically inside its bucket."""
+        if count == 0:
+            return 0.0
+        rank = q * count
+        seen = 0
+        for index, bucket_count in enumerate(counts):
+            if bucket_count and seen + bucket_count >= rank:
+                if index >= len(BUCKET_BOUNDS):
+                    return BUCKET_BOUNDS[-1]
+                upper = BUCKET_BOUNDS[index]
+                lower = BUCKET_BOUNDS[index - 1] if index else upper / 2 ** (1 / _BUCKETS_PER_OCTAVE)
+                fraction = (rank - seen) / bucket_count
+                return lower * (upper / lower) ** fraction
+            seen += bucket_count
+        return BUCKET_BOUNDS[-1]
+
+
+class MetricsRegistry:
+    """Per-stage latency histograms and prediction counters for one process."""
+
+    def __init__(self):
+        self.stages = {}
+        self.predictions = {}
+        self.counters = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, stage):
+        histogram = self.stages.get(stage)
+        if histogram is None:
+            with self._lock:
+                histogram = self.stages.setdefault(stage, LatencyHistogram())
+        return histogram
+
+    def count_predictions(self, disease, n_high, n_total):
+        with self._lock:
+            for label, n in (("High Risk", n_high), ("Low Risk", n_total - n_high)):
+                if n:
+                    key = (disease, label)
+                    self.predictions[key] = self.predictions.get(key, 0) + n
+
+    def increment(self, counter, disease, n):
+        with self._lock:
+            key = (counter, disease)
+            self.counters[key] = self.counters.get(key, 0) + n
+
+    def summary(self):
+        """
+        Summarise every stage and counter.
+
+        Returns:
+            dict: {"stages": {stage: {"count", "sum_seconds", "p50", "p95", "p99"}},
+                "predictions": {disease: {label: count}},
+                "counters": {counter: {disease: count}}}
+        """
+        stages = {}
+        for stage, histogram in sorted(self.stages.items()):
+            counts, count, total = histogram.snapshot()
+            stages[stage] = {"count": count, "sum_seconds": total}
+            for q in QUANTILES:
+                stages[stage][f"p{round(q * 100)}"] = LatencyHistogram.quantile(counts, count, q)
+        predictions = {}
+        counters = {}
+        with self._lock:
+            for (disease, label), n in sorted(self.predictions.items()):
+                predictions.setdefault(disease, {})[label] = n
+            for (counter, disease), n in sorted(self.counters.items()):
+                counters.setdefault(counter, {})[disease] = n
+        return {"stages": stages, "predictions": predictions, "counters": counters}
+
+    def prometheus(self):
+        """Render the metrics in the Prometheus text exposition format."""
+        lines = [
+            "# HELP prediction_stage_seconds Time spent in each prediction stage.",
+            "# TYPE prediction_stage_seconds histogram",
+        ]
+        quantile_lines = [
+            "# HELP prediction_stage_quantile_seconds Estimated latency percentiles per stage.",
+            "# TYPE prediction_stage_quantile_seconds gauge",
+        ]
+        for stage, histogram in sorted(self.stages.items()):
+            counts, count, total = histogram.snapshot()
+            cumulative = 0
+            # Only whole octaves are exported to keep the payload short; the
+            # cumulative counts at those bounds are still exact.
+            for index, bound in enumerate(BUCKET_BOUNDS):
+                cumulative += counts[index]
+                if index % _BUCKETS_PER_OCTAVE == 0:
+                    lines.append(f'prediction_stage_seconds_bucket{{stage="{stage}",le="{bound:.6g}"}} {cumulative}')
+            lines.append(f'prediction_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {count}')
+            lines.append(f'prediction_stage_seconds_sum{{stage="{stage}"}} {total:.9g}')
+            lines.append(f'prediction_stage_seconds_count{{stage="{stage}"}} {count}')
+            for q in QUANTILES:
+                value = LatencyHistogram.quantile(counts, count, q)
+                quantile_lines.append(
+                    f'prediction_stage_quantile_seconds{{stage="{stage}",quantile="{q}"}} {value:.9g}'
+                )
+        lines.extend(quantile_lines)
+        lines.append("# HELP predictions_total Predictions served, by disease and label.")
+        lines.append("# TYPE predictions_total counter")
+        with self._lock:
+            for (disease, label), n in sorted(self.predictions.items()):
+                lines.append(f'predictions_total{{disease="{disease}",label="{label}"}} {n}')
+            counter_names = sorted({counter for counter, _ in self.counters})
+            for name in counter_names:
+                lines.append(f"# TYPE {name}_total counter")
+                for (counter, disease), n in sorted(self.counters.items()):
+                    if counter == name:
+                        lines.append(f'{name}_total{{disease="{disease}"}} {n}')
+        return "\n".join(lines) + "\n"
+
+    def clear(self):
+        with self._lock:
+            self.stages.clear()
+            self.predictions.clear()
+            self.counters.clear()
+
+
+_metrics = MetricsRegistry()
+
+
+def get_metrics():
+    """Return the process-wide MetricsRegistry."""
+    return _metrics
+
+
+class _StageTimer:
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start)
+        return False
+
+
+def stage_timer(stage):
+    """
+    Context manager timing one stage of a prediction.
+
+    When metrics are disabled this returns a shared no-op context manager,
+    so the cost is a flag check and an empty with block.
+    """
+    if not _enabled:
+        return _null_timer
+    return _StageTimer(_metrics.histogram(stage))
+
+
+def timed(stage):
+    """Decorator recording every call of a function under the given stage."""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            with _StageTimer(_metrics.histogram(stage)):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def observe(stage, seconds):
+    """Record a duration that was already measured elsewhere."""
+    if _enabled:
+        _metrics.histogram(stage).observe(seconds)
+
+
+def count_predictions(disease, labels):
+    """
+    Count served predictions by disease and label.
+
+    Args:
+        disease: "diabetes" or "heart"
+        labels: A 0/1 label or an array of them
+    """
+    if not _enabled:
+        return
+    if hasattr(labels, "sum"):
+        _metrics.count_predictions(disease, int(labels.sum()), int(labels.size))
+    else:
+        _metrics.count_predictions(disease, int(labels == 1), 1)
+
+
+def count(counter, disease, n=1):
+    """
+    Add to a per-disease event counter, exported as <counter>_total.
+
+    Args:
+        counter: Counter name, e.g. "audit_rows_dropped"
+        disease: "diabetes" or "heart"
+        n: Amount to add
+    """
+    if _enabled:
+        _metrics.increment(counter, disease, n)
+
+
+def start_log_dump(interval=60.0):
+    """
+    Log a one-line summary of every stage from a daemon thread every interval seconds.
+
+    Returns:
+        threading.Event: Set it to stop the thread
+    """
+    stop = threading.Event()
+
+    def dump():
+        while not stop.wait(interval):
+            summary = _metrics.summary()
+            for stage, values in summary["stages"].items():
+                logger.info(
+                    "%s: n=%d p50=%.3fms p95=%.3fms p99=%.3fms",
+                    stage, values["count"], values["p50"] * 1e3, values["p95"] * 1e3, values["p99"] * 1e3,
+                )
+            if summary["predictions"]:
+                logger.info("predictions: %s", summary["predictions"])
+            if summary["counters"]:
+                logger.info("counters: %s", summary["counters"])
+
+    threading.Thread(target=dump, name="metrics-dump", daemon=True).start()
+    return stop
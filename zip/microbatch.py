@@ -0,0 +1,180 @@
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+
+import numpy as np
+
+from registry import get_registry
+from utils import DEFAULT_THRESHOLD, RiskResult, predict_risk
+
+
+DEFAULT_WINDOW_SECONDS = 0.002
+DEFAULT_MAX_BATCH_ROWS = 256
+
+_STOP = object()
+
+
+class _Request:
+    def __init__(self, features):
+        self.features = features
+        self.future = Future()
+        self.submitted_at = time.perf_counter()
+
+
+class MicroBatcher:
+    """
+    Collects concurrent prediction requests for one disease and scores them together.
+
+    A background thread waits for the first request, then keeps collecting
+    until ``window_seconds`` have passed or ``max_batch_rows`` rows are queued,
+    and runs a single predict_risk call on the stacked rows. Each caller gets
+    a Future for its own rows.
+    """
+
+    def __init__(
+        self,
+        disease,
+        window_seconds=DEFAULT_WINDOW_SECONDS,
+        max_batch_rows=DEFAULT_MAX_BATCH_ROWS,
+        threshold=DEFAULT_THRESHOLD,
+        model_loader=None,
+    ):
+        self.disease = disease
+        self.window_seconds = window_seconds
+        self.max_batch_rows = max_batch_rows
+        self.threshold = threshold
+        self.model_loader = model_loader or (lambda: get_registry().get_compiled(disease))
+
+        self._queue = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._batch_sizes = Counter()
+        self._batches = 0
+        self._requests = 0
+        self._rows = 0
+        self._wait_seconds_total = 0.0
+        self._wait_seconds_max = 0.0
+        self._thread = threading.Thread(
+            target=self._run, name=f"microbatch-{disease}", daemon=True
+        )
+        self._thread.start()
+
+    def submit(self, features):
+        """
+        Queue feature rows for scoring.
+
+        Args:
+            features: Feature array of shape (n_rows, 13) in raw units
+
+        Returns:
+            Future: Resolves to a RiskResult for the submitted rows
+        """
+        request = _Request(np.atleast_2d(features))
+        self._queue.put(request)
+        return request.future
+
+    def predict(self, features, timeout=None):
+        """Score a single row and return (prediction, probability) like predict_diabetes()."""
+        result = self.submit(features).result(timeout=timeout)
+        return int(result.labels[0]), float(result.probabilities[0])
+
+    def close(self):
+        """Stop the background thread after the queued requests are served."""
+        self._queue.put(_STOP)
+        self._thread.join()
+
+    def _collect(self, first):
+        batch = [first]
+        rows = len(first.features)
+        deadline = time.perf_counter() + self.window_seconds
+        while rows < self.max_batch_rows:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if request is _STOP:
+                self._queue.put(_STOP)
+                break
+            batch.append(request)
+            rows += len(request.features)
+        return batch, rows
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is _STOP:
+                return
+            batch, rows = self._collect(first)
+            started = time.perf_counter()
+            self._record(batch, rows, started)
+            try:
+                result = predict_risk(
+                    self.model_loader(),
+                    None,
+                    np.concatenate([request.features for request in batch]),
+                    threshold=self.threshold,
+                )
+            except Exception as exc:
+                for request in batch:
+                    request.future.set_exception(exc)
+                continue
+            start = 0
+            for request in batch:
+                stop = start + len(request.features)
+                request.future.set_result(
+                    RiskResult(result.labels[start:stop], result.probabilities[start:stop])
+                )
+                start = stop
+
+    def _record(self, batch, rows, started):
+        waits = [started - request.submitted_at for request in batch]
+        with self._stats_lock:
+            self._batches += 1
+            self._requests += len(batch)
+            self._rows += rows
+            self._batch_sizes[_size_bucket(rows)] += 1
+            self._wait_seconds_total += sum(waits)
+            self._wait_seconds_max = max(self._wait_seconds_max, max(waits))
+
+    def stats(self):
+        """
+        Report queue depth, batch-size histogram and the latency added by batching.
+
+        Returns:
+            dict: queue_depth, batches, requests, rows, batch_size_histogram (bucket upper
+                bound -> count), mean_added_latency_ms and max_added_latency_ms
+        """
+        with self._stats_lock:
+            requests = self._requests
+            return {
+                "queue_depth": self._queue.qsize(),
+                "batches": self._batches,
+                "requests": requests,
+                "rows": self._rows,
+                "batch_size_histogram": dict(sorted(self._batch_sizes.items())),
+                "mean_added_latency_ms": (
+                    1000 * self._wait_seconds_total / requests if requests else 0.0
+                ),
+                "max_added_latency_ms": 1000 * self._wait_seconds_max,
+            }
+
+
+def _size_bucket(rows):
+    """Round a batch size up to the next power of two for the histogram."""
+    return 1 << max(rows - 1, 0).bit_length()
+
+
+_batchers = {}
+_batchers_lock = threading.Lock()
+
+
+def get_batcher(disease):
+    """Return the process-wide MicroBatcher for a disease, starting it on first use."""
+    with _batchers_lock:
+        if disease not in _batchers:
+            _batchers[disease] = MicroBatcher(disease)
+        return _batchers[disease]
@@ -0,0 +1,316 @@
+import argparse
+import copy
+import hashlib
+import io
+import json
+import os
+import pickle
+import sys
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import SGDClassifier
+from sklearn.metrics import roc_auc_score
+from sklearn.model_selection import train_test_split
+from sklearn.preprocessing import StandardScaler
+
+from registry import get_registry, publish_lock
+from train import TEST_SIZE, publish_version, save_version
+from utils import MODELS_DIR, atomic_write, build_diabetes_feature_matrix, build_heart_feature_matrix
+
+
+ONLINE_DIR = MODELS_DIR / "online"
+CLASSES = np.array([0, 1])
+DEFAULT_LEARNING_RATE = 0.001
+DEFAULT_ALPHA = 1e-4
+DEFAULT_SEED = 42
+BOOTSTRAP_CHUNK_SIZE = 10_000
+
+# Per disease: label column in appended records and the feature builder
+ONLINE_SPECS = {
+    "diabetes": {"label": "diabetes", "features": build_diabetes_feature_matrix},
+    "heart": {"label": "target", "features": build_heart_feature_matrix},
+}
+
+
+def state_path(disease):
+    return ONLINE_DIR / f"{disease}_state.pkl"
+
+
+def holdout_split(disease, seed=DEFAULT_SEED):
+    """
+    Split the stored dataset into training and held-out rows the way train.py does.
+
+    With train.py's seed the held-out rows are the ones the served model was
+    not fitted on, so it and an online model can be compared on them.
+
+    Returns:
+        tuple: (train_features, test_features, train_labels, test_labels)
+    """
+    from datastore import load_frame
+
+    spec = ONLINE_SPECS[disease]
+    frame, _ = load_frame(disease)
+    features = spec["features"](frame)
+    labels = frame[spec["label"]].to_numpy()
+    return train_test_split(features, labels, test_size=TEST_SIZE, random_state=seed, stratify=labels)
+
+
+def holdout_roc_auc(model, scaler, features, labels):
+    """Return a model and scaler pair's ROC AUC on held-out rows."""
+    return float(roc_auc_score(labels, model.predict_proba(scaler.transform(features))[:, 1]))
+
+
+def _sgd(learning_rate=DEFAULT_LEARNING_RATE, alpha=DEFAULT_ALPHA, seed=DEFAULT_SEED):
+    # A constant step keeps warm-started coefficients stable; the default
+    # "optimal" schedule starts with large steps that would undo them.
+    return SGDClassifier(
+        loss="log_loss", learning_rate="constant", eta0=learning_rate, alpha=alpha, random_state=seed
+    )
+
+
+def _rescale_coefficients(model, old_mean, old_scale, new_mean, new_scale):
+    """
+    Re-express a linear model's coefficients for a scaler whose mean and scale have moved.
+
+    With w' = w * new_scale / old_scale and b' = b + (w / old_scale) . (new_mean - old_mean),
+    the model gives every raw row the same decision value as before, so
+    what it has learned is not shifted by the scaler update.
+    """
+    raw_coef = model.coef_ / old_scale
+    model.intercept_ = model.intercept_ + raw_coef @ (new_mean - old_mean)
+    model.coef_ = raw_coef * new_scale
+
+
+class OnlineState:
+    """
+    A StandardScaler and SGD logistic model that are updated one batch of records at a time.
+
+    The scaler's running mean and variance are merged with each batch's
+    statistics through StandardScaler.partial_fit, the model's coefficients
+    are re-expressed for the moved scaler, and the model then takes one SGD
+    pass over the batch, so earlier records are never read again.
+    ``offsets`` remembers how far into each appended records file has
+    already been learned.
+    """
+
+    def __init__(self, disease, scaler, model):
+        self.disease = disease
+        self.scaler = scaler
+        self.model = model
+        self.rows_seen = 0
+        self.updates = 0
+        self.offsets = {}
+
+    def update(self, features, labels):
+        old_mean, old_scale = self.scaler.mean_.copy(), self.scaler.scale_.copy()
+        self.scaler.partial_fit(features)
+        if hasattr(self.model, "coef_"):
+            _rescale_coefficients(self.model, old_mean, old_scale, self.scaler.mean_, self.scaler.scale_)
+        self.model.partial_fit(self.scaler.transform(features), labels, classes=CLASSES)
+        self.rows_seen += len(labels)
+        self.updates += 1
+
+
+def init_state(
+    disease, bootstrap=False, split=None, learning_rate=DEFAULT_LEARNING_RATE, alpha=DEFAULT_ALPHA, seed=DEFAULT_SEED
+):
+    """
+    Start online learning from the model the app currently serves.
+
+    A served logistic model is continued as-is: its coefficients seed the
+    SGD model and its scaler's statistics seed the running mean and variance.
+    Other models (e.g. the diabetes random forest) cannot be updated in
+    place; with bootstrap=True a logistic model is instead fitted once over
+    the training rows of the stored cleaned dataset and continued from there.
+
+    Args:
+        split: holdout_split() result to bootstrap from; computed when omitted
+
+    Returns:
+        OnlineState
+    """
+    model, scaler = get_registry().get(disease)
+    sgd = _sgd(learning_rate=learning_rate, alpha=alpha, seed=seed)
+    if hasattr(model, "coef_") and np.ravel(model.intercept_).shape[0] == 1:
+        sgd.coef_ = np.array(model.coef_, dtype=np.float64)
+        sgd.intercept_ = np.array(model.intercept_, dtype=np.float64)
+        sgd.classes_ = np.asarray(model.classes_)
+        return OnlineState(disease, copy.deepcopy(scaler), sgd)
+    if not bootstrap:
+        raise ValueError(
+            f"The served {disease} model is a {type(model).__name__}, which cannot be updated "
+            "incrementally; pass --bootstrap to start a logistic model from the stored dataset"
+        )
+
+    if split is None:
+        split = holdout_split(disease, seed=seed)
+    features, _, labels, _ = split
+    state = OnlineState(disease, StandardScaler().fit(features), sgd)
+    scaled = state.scaler.transform(features)
+    for start in range(0, len(labels), BOOTSTRAP_CHUNK_SIZE):
+        stop = start + BOOTSTRAP_CHUNK_SIZE
+        sgd.partial_fit(scaled[start:stop], labels[start:stop], classes=CLASSES)
+    state.rows_seen = len(labels)
+    return state
+
+
+def load_state(disease):
+    """Return the saved OnlineState for a disease, or None if online learning has not started."""
+    try:
+        with open(state_path(disease), "rb") as f:
+            saved = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    state = OnlineState(disease, saved["scaler"], saved["model"])
+    state.rows_seen = saved["rows_seen"]
+    state.updates = saved["updates"]
+    state.offsets = saved["offsets"]
+    return state
+
+
+def save_state(state):
+    # Saved as a plain dict so the pickle does not depend on the module the
+    # class was defined in (``__main__`` when run as a script)
+    ONLINE_DIR.mkdir(parents=True, exist_ok=True)
+    with atomic_write(state_path(state.disease), "wb") as f:
+        pickle.dump(
+            {
+                "scaler": state.scaler,
+                "model": state.model,
+                "rows_seen": state.rows_seen,
+                "updates": state.updates,
+                "offsets": state.offsets,
+            },
+            f,
+        )
+
+
+def read_new_records(path, offset=0):
+    """
+    Read the complete lines appended to a CSV since a byte offset.
+
+    A trailing line without a newline is left for the next call, in case
+    the writer is still appending it.
+
+    Returns:
+        tuple: (frame, raw_bytes, new_offset)
+    """
+    with open(path, "rb") as f:
+        header = f.readline()
+        size = os.fstat(f.fileno()).st_size
+        if offset > size:
+            raise ValueError(f"{path} is shorter than the {offset} bytes already learned; was it rewritten?")
+        f.seek(max(offset, len(header)))
+        data = f.read()
+    complete = data[: data.rfind(b"\n") + 1]
+    start = max(offset, len(header))
+    if not complete:
+        return pd.DataFrame(), b"", start
+    return pd.read_csv(io.BytesIO(header + complete)), complete, start + len(complete)
+
+
+def update(disease, paths, publish=True, bootstrap=False):
+    """
+    Learn from records appended to CSV files since the last update, then publish the result.
+
+    Records use the batch-scoring layout of the disease (see batch.py) plus
+    its label column ("diabetes" or "target"). The new version is only
+    published when its ROC AUC on the held-out rows (see holdout_split) is
+    at least the served model's; otherwise it is saved but not served, and
+    learning carries on from it next time.
+
+    The publish lock is held exclusively from reading the state to saving
+    it, so concurrent updates and publishes cannot interleave, and the
+    served model cannot change between being scored and being replaced.
+    The state is only saved once the version is saved (and published), so
+    a failed run re-reads the same records next time.
+
+    Returns:
+        tuple: (rows_added, version_dir, published) where version_dir is
+            None if nothing new was read
+    """
+    spec = ONLINE_SPECS[disease]
+    split = holdout_split(disease)
+    _, test_features, _, test_labels = split
+    with publish_lock(MODELS_DIR, exclusive=True):
+        state = load_state(disease) or init_state(disease, bootstrap=bootstrap, split=split)
+        digest = hashlib.sha256()
+        rows_added = 0
+        for path in paths:
+            key = str(Path(path).resolve())
+            frame, raw, state.offsets[key] = read_new_records(path, state.offsets.get(key, 0))
+            if frame.empty:
+                continue
+            frame = frame.dropna()
+            digest.update(raw)
+            if frame.empty:
+                continue
+            state.update(spec["features"](frame), frame[spec["label"]].to_numpy())
+            rows_added += len(frame)
+
+        version_dir = None
+        published = False
+        if rows_added:
+            served_model, served_scaler = get_registry().get(disease)
+            metadata = {
+                "disease": disease,
+                "created_at": datetime.now().isoformat(timespec="seconds"),
+                "source": "online",
+                "source_sha256": digest.hexdigest(),
+                "rows_added": rows_added,
+                "rows_seen": state.rows_seen,
+                "updates": state.updates,
+                "learning_rate": state.model.eta0,
+                "alpha": state.model.alpha,
+                "holdout_roc_auc": holdout_roc_auc(state.model, state.scaler, test_features, test_labels),
+                "served_holdout_roc_auc": holdout_roc_auc(served_model, served_scaler, test_features, test_labels),
+            }
+            version_dir = save_version(disease, state.model, state.scaler, metadata)
+            if publish and metadata["holdout_roc_auc"] >= metadata["served_holdout_roc_auc"]:
+                publish_version(disease, version_dir)
+                published = True
+        save_state(state)
+    return rows_added, version_dir, published
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Update a model incrementally from newly labeled records.")
+    parser.add_argument("disease", choices=sorted(ONLINE_SPECS))
+    parser.add_argument("records", nargs="+", help="CSV files of labeled records; only appended lines are read")
+    parser.add_argument("--no-publish", action="store_true", help="Save the version without serving it")
+    parser.add_argument(
+        "--bootstrap",
+        action="store_true",
+        help="If the served model is not linear, start from a logistic model fitted on the stored dataset",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    rows_added, version_dir, published = update(
+        args.disease, args.records, publish=not args.no_publish, bootstrap=args.bootstrap
+    )
+    if version_dir is None:
+        print(f"{args.disease}: no new records", file=sys.stderr)
+        return
+    with open(version_dir / "metadata.json") as f:
+        metadata = json.load(f)
+    scores = (
+        f"held-out roc_auc={metadata['holdout_roc_auc']:.4f} "
+        f"(served {metadata['served_holdout_roc_auc']:.4f})"
+    )
+    if published:
+        action = "published"
+    elif args.no_publish:
+        action = "saved"
+    else:
+        action = "saved (not published: below the served model)"
+    print(f"{args.disease}: learned {rows_added} records, {action} {version_dir.name}; {scores}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from compiled import model_from_arrays, model_to_arrays
+from registry import ARTIFACTS, get_registry
+from utils import DEFAULT_THRESHOLD, RiskResult, predict_risk
+
+
+# Rows below which a request is scored by one worker instead of being split
+MIN_ROWS_PER_WORKER = 2048
+_ALIGNMENT = 64
+
+# Compiled models rebuilt on top of shared memory inside each worker process
+_worker_models = {}
+_worker_segment = None
+
+
+def _pack(models):
+    """
+    Copy the arrays of every compiled model into one shared memory segment.
+
+    Returns:
+        tuple: (segment, layout) where layout maps disease -> (kind, meta,
+            {array name: (dtype, shape, offset)})
+    """
+    decomposed = {disease: model_to_arrays(model) for disease, model in models.items()}
+    layout = {}
+    offset = 0
+    for disease, (kind, arrays, meta) in decomposed.items():
+        entries = {}
+        for name, array in arrays.items():
+            offset = -(-offset // _ALIGNMENT) * _ALIGNMENT
+            entries[name] = (array.dtype.str, array.shape, offset)
+            offset += array.nbytes
+        layout[disease] = (kind, meta, entries)
+
+    segment = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+    for disease, (kind, arrays, meta) in decomposed.items():
+        for name, array in arrays.items():
+            dtype, shape, start = layout[disease][2][name]
+            view = np.ndarray(shape, dtype=dtype, buffer=segment.buf, offset=start)
+            view[...] = array
+    return segment, layout
+
+
+def _attach(segment_name, layout):
+    """Pool initializer: map the shared segment and rebuild read-only models on it."""
+    global _worker_segment
+    _worker_segment = shared_memory.SharedMemory(name=segment_name)
+    for disease, (kind, meta, entries) in layout.items():
+        arrays = {}
+        for name, (dtype, shape, offset) in entries.items():
+            view = np.ndarray(shape, dtype=dtype, buffer=_worker_segment.buf, offset=offset)
+            view.flags.writeable = False
+            arrays[name] = view
+        _worker_models[disease] = model_from_arrays(kind, arrays, meta)
+
+
+def _score(disease, features, threshold):
+    result = predict_risk(_worker_models[disease], None, features, threshold=threshold)
+    return result.labels, result.probabilities
+
+
+class WorkerPool:
+    """
+    Pre-started inference processes sharing one copy of the compiled model arrays.
+
+    The parent loads and compiles each disease's model once, copies the node
+    and coefficient arrays into a shared memory segment, and every worker maps
+    that segment read-only instead of unpickling its own copy. Large batches
+    are split across the workers.
+    """
+
+    def __init__(self, diseases=None, workers=None, start_method=None):
+        diseases = diseases or sorted(ARTIFACTS)
+        registry = get_registry()
+        models = {disease: registry.get_compiled(disease) for disease in diseases}
+        self.workers = workers or os.cpu_count()
+        self._segment, layout = _pack(models)
+        try:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context(start_method),
+                initializer=_attach,
+                initargs=(self._segment.name, layout),
+            )
+        except Exception:
+            self._release()
+            raise
+
+    def predict_risk(self, disease, features, threshold=DEFAULT_THRESHOLD):
+        """
+        Score feature rows in raw units across the worker processes.
+
+        Returns:
+            RiskResult: (labels, probabilities) arrays of length n_rows
+        """
+        features = np.atleast_2d(features)
+        n_chunks = max(1, min(self.workers, len(features) // MIN_ROWS_PER_WORKER))
+        futures = [
+            self._executor.submit(_score, disease, chunk, threshold)
+            for chunk in np.array_split(features, n_chunks)
+        ]
+        parts = [future.result() for future in futures]
+        return RiskResult(
+            np.concatenate([labels for labels, _ in parts]),
+            np.concatenate([probabilities for _, probabilities in parts]),
+        )
+
+    def close(self):
+        """Stop the workers and free the shared memory segment."""
+        self._executor.shutdown()
+        self._release()
+
+    def _release(self):
+        self._segment.close()
+        self._segment.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,189 @@
+import argparse
+import subprocess
+import sys
+from pathlib import Path
+
+import numpy as np
+
+from artifacts import artifact_dir, write_artifact
+from forest import FlatForest, LEAF_LEVELS
+from utils import DIABETES_FEATURE_BOUNDS, MODELS_DIR
+
+
+APP_DIR = Path(__file__).parent
+# Per disease: input bounds the quantized forest is pruned and clipped to
+QUANTIZE_BOUNDS = {
+    "diabetes": DIABETES_FEATURE_BOUNDS,
+}
+# Largest allowed |quantized - sklearn| positive-class probability. Leaf
+# rounding alone accounts for at most 1 / (2 * LEAF_LEVELS); the rest covers
+# rows within float32 rounding of a split, where sklearn's own float32 cast
+# can send a few trees the other way (see compiled.fuse_tree_model).
+DEFAULT_TOLERANCE = 0.01
+DEFAULT_CHECK_ROWS = 20_000
+
+# Peak RSS in KiB of a fresh interpreter after scoring one row. VmHWM is
+# read rather than ru_maxrss, which Linux carries over from the parent
+# process across exec.
+_RSS_SCRIPT = """
+import sys
+import numpy as np
+{load}
+model.predict_proba(np.zeros((1, model.n_features_in_)))
+with open("/proc/self/status") as f:
+    print(next(line.split()[1] for line in f if line.startswith("VmHWM:")))
+"""
+_RSS_LOADERS = {
+    "baseline": "class model:\n    n_features_in_ = 1\n    predict_proba = staticmethod(lambda x: x)",
+    "pickle": (
+        "import pickle\n"
+        "with open(sys.argv[1], 'rb') as f:\n"
+        "    model = pickle.load(f)"
+    ),
+    "artifact": "from artifacts import load_artifact\nmodel, _ = load_artifact(sys.argv[2])",
+}
+
+
+def _array_bytes(model):
+    arrays, _ = model.to_arrays()
+    return sum(array.nbytes for array in arrays.values())
+
+
+def check_tolerance(model, scaler, quantized, features, tolerance=DEFAULT_TOLERANCE):
+    """
+    Compare a quantized forest with the sklearn model it came from.
+
+    Returns:
+        dict: max_abs_error, mean_abs_error, label_agreement and within_tolerance
+    """
+    expected = model.predict_proba(scaler.transform(features))[:, 1]
+    actual = quantized.predict_proba(features)[:, 1]
+    error = np.abs(actual - expected)
+    return {
+        "max_abs_error": float(error.max()),
+        "mean_abs_error": float(error.mean()),
+        "label_agreement": float(np.mean((actual > 0.5) == (expected > 0.5))),
+        "within_tolerance": bool(error.max() <= tolerance),
+    }
+
+
+def check_rows(disease, n, seed=0):
+    """Return n dataset rows plus n rows drawn uniformly inside the bounds, as features."""
+    from benchmark import sample_rows
+    from utils import build_diabetes_feature_matrix
+
+    features = build_diabetes_feature_matrix(sample_rows(disease, n, seed=seed))
+    lower, upper = np.array(QUANTIZE_BOUNDS[disease], dtype=np.float64).T
+    uniform = np.random.default_rng(seed).uniform(lower, upper, size=(n, len(lower)))
+    # 0/1 flag columns only ever hold 0 or 1
+    flags = (lower == 0) & (upper == 1)
+    uniform[:, flags] = np.rint(uniform[:, flags])
+    return np.vstack([features, uniform])
+
+
+def peak_rss(disease):
+    """
+    Measure peak RSS of scoring with the pickled model and with the array artifact.
+
+    Each is loaded in a fresh interpreter; the baseline interpreter only
+    imports numpy. Linux only (reads /proc/self/status).
+
+    Returns:
+        dict: Peak RSS in bytes keyed by "baseline", "pickle" and "artifact"
+    """
+    rss = {}
+    for name, load in _RSS_LOADERS.items():
+        completed = subprocess.run(
+            [sys.executable, "-c", _RSS_SCRIPT.format(load=load), str(MODELS_DIR / f"{disease}_model.pkl"), disease],
+            cwd=APP_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        rss[name] = int(completed.stdout.split()[-1]) * 1024
+    return rss
+
+
+def quantize_disease(disease, tolerance=DEFAULT_TOLERANCE, n_check=DEFAULT_CHECK_ROWS, write=True):
+    """
+    Quantize a disease's served forest, check it against sklearn and write it as its array artifact.
+
+    Nothing is written if the check fails.
+
+    Returns:
+        dict: Node counts, array sizes in bytes and the tolerance check
+    """
+    from registry import get_registry
+
+    registry = get_registry()
+    model, scaler = registry.get(disease)
+    compiled = registry.get_compiled(disease)
+    if not isinstance(compiled, FlatForest):
+        compiled = FlatForest.from_sklearn(model, scaler)
+    quantized = compiled.quantize(QUANTIZE_BOUNDS[disease])
+
+    report = {
+        "nodes": len(compiled.feature),
+        "quantized_nodes": len(quantized.feature),
+        "max_depth": quantized.max_depth,
+        "pickle_bytes": (MODELS_DIR / f"{disease}_model.pkl").stat().st_size,
+        "flat_forest_bytes": _array_bytes(compiled),
+        "quantized_bytes": _array_bytes(quantized),
+        "check": check_tolerance(model, scaler, quantized, check_rows(disease, n_check), tolerance),
+    }
+    if write and report["check"]["within_tolerance"]:
+        write_artifact(
+            disease, quantized, scaler, registry.source_version(disease), registry.source_stamp(disease)
+        )
+        registry.clear()
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Write a compact quantized forest artifact and check it against the sklearn model."
+    )
+    parser.add_argument("diseases", nargs="*", help="Defaults to every disease with input bounds")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument("--check-rows", type=int, default=DEFAULT_CHECK_ROWS)
+    parser.add_argument("--dry-run", action="store_true", help="Check and report without writing the artifact")
+    parser.add_argument("--rss", action="store_true", help="Also measure peak RSS of pickle vs artifact scoring")
+    args = parser.parse_args(argv)
+    unknown = set(args.diseases) - set(QUANTIZE_BOUNDS)
+    if unknown:
+        parser.error(f"no input bounds for: {', '.join(sorted(unknown))}")
+
+    failed = False
+    for disease in args.diseases or sorted(QUANTIZE_BOUNDS):
+        report = quantize_disease(disease, args.tolerance, args.check_rows, write=not args.dry_run)
+        check = report["check"]
+        print(
+            f"{disease}: {report['nodes']} -> {report['quantized_nodes']} nodes, depth {report['max_depth']}; "
+            f"pickle {report['pickle_bytes'] / 1e6:.1f}MB, flat forest {report['flat_forest_bytes'] / 1e6:.1f}MB, "
+            f"quantized {report['quantized_bytes'] / 1e6:.1f}MB",
+            file=sys.stderr,
+        )
+        print(
+            f"{disease}: max |dp| {check['max_abs_error']:.2e} (tolerance {args.tolerance:g}, "
+            f"leaf rounding <= {1 / (2 * LEAF_LEVELS):.2e}), mean {check['mean_abs_error']:.2e}, "
+            f"labels agree {check['label_agreement']:.4%}",
+            file=sys.stderr,
+        )
+        if not check["within_tolerance"]:
+            print(f"FAIL: {disease} exceeds the tolerance; artifact not written", file=sys.stderr)
+            failed = True
+        elif not args.dry_run:
+            print(f"Wrote {artifact_dir(disease)}", file=sys.stderr)
+        if args.rss and check["within_tolerance"] and not args.dry_run:
+            rss = peak_rss(disease)
+            print(
+                f"{disease}: peak RSS baseline {rss['baseline'] / 1e6:.0f}MB, "
+                f"pickle {rss['pickle'] / 1e6:.0f}MB, artifact {rss['artifact'] / 1e6:.0f}MB",
+                file=sys.stderr,
+            )
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,380 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+import numpy as np
+
+from artifacts import load_artifact, pointer_path, read_manifest
+from compiled import compiled_path, fuse_model, load_compiled
+from metrics import observe
+from utils import (
+    MODELS_DIR,
+    ArtifactLoadError,
+    file_sha256,
+    load_diabetes_model,
+    load_diabetes_scaler,
+    load_heart_model,
+    load_heart_scaler,
+)
+
+
+# Artifacts per disease: (role, file name, loader)
+ARTIFACTS = {
+    "diabetes": (
+        ("model", "diabetes_model.pkl", load_diabetes_model),
+        ("scaler", "diabetes_scaler.pkl", load_diabetes_scaler),
+    ),
+    "heart": (
+        ("model", "heart_model.pkl", load_heart_model),
+        ("scaler", "heart_scaler.pkl", load_heart_scaler),
+    ),
+}
+
+
+PUBLISH_LOCK_NAME = ".publish.lock"
+
+# How many publish_lock blocks the current thread is inside
+_publish_lock_depth = threading.local()
+
+
+@contextmanager
+def publish_lock(models_dir=MODELS_DIR, exclusive=False):
+    """
+    Hold the models directory's publish lock.
+
+    Publishers take it exclusively while they swap a model and scaler pair
+    into place; the registry takes it shared while it stats and loads the
+    pair, so it never sees one new file and one old one. Where fcntl is not
+    available or the directory is read-only, no lock is taken.
+
+    A thread that already holds the lock keeps using it for nested blocks,
+    so a long update can hold it exclusively while it loads and publishes
+    models. The outer block must be the exclusive one if any is.
+    """
+    depth = getattr(_publish_lock_depth, "value", 0)
+    _publish_lock_depth.value = depth + 1
+    try:
+        if depth:
+            yield
+        else:
+            with _flock(models_dir, exclusive):
+                yield
+    finally:
+        _publish_lock_depth.value = depth
+
+
+@contextmanager
+def _flock(models_dir, exclusive):
+    try:
+        fd = os.open(models_dir / PUBLISH_LOCK_NAME, os.O_RDWR | os.O_CREAT, 0o644)
+    except OSError:
+        fd = None
+    if fd is None or fcntl is None:
+        if fd is not None:
+            os.close(fd)
+        yield
+        return
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        yield
+    finally:
+        os.close(fd)
+
+
+def _file_stamp(path):
+    """Return an (mtime_ns, size) stamp for a file, or None if it is missing."""
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _stamps_version(stamps):
+    return "-".join(
+        "0" if stamp is None else f"{stamp[0]:x}.{stamp[1]:x}" for stamp in stamps
+    )
+
+
+def _content_version(paths):
+    """Return the files' content hashes joined into one string, with "0" for a missing file."""
+    digests = []
+    for path in paths:
+        try:
+            digests.append(file_sha256(path)[:16])
+        except FileNotFoundError:
+            digests.append("0")
+    return "-".join(digests)
+
+
+def _timed_load(loader):
+    """
+    Call an artifact loader and measure how long it took.
+
+    Returns:
+        tuple: (artifact, load_seconds)
+    """
+    start = time.perf_counter()
+    artifact = loader()
+    elapsed = time.perf_counter() - start
+    observe("load_artifacts", elapsed)
+    return artifact, elapsed
+
+
+def _memory_bytes(artifact):
+    """
+    Return the bytes a loaded artifact holds in NumPy arrays.
+
+    Compiled models report their node or coefficient arrays (memory-mapped
+    for array artifacts). For sklearn objects the array attributes are
+    summed, plus every tree's node and value arrays for a forest. Python
+    object overhead is not counted.
+    """
+    if hasattr(artifact, "to_arrays"):
+        arrays, _ = artifact.to_arrays()
+        return sum(array.nbytes for array in arrays.values())
+    total = sum(
+        value.nbytes for value in getattr(artifact, "__dict__", {}).values() if isinstance(value, np.ndarray)
+    )
+    for estimator in getattr(artifact, "estimators_", ()):
+        total += _memory_bytes(estimator)
+    tree = getattr(artifact, "tree_", None)
+    if tree is not None:
+        state = tree.__getstate__()
+        total += state["nodes"].nbytes + state["values"].nbytes
+    return total
+
+
+class _LoadedDisease:
+    """Artifacts for one disease together with the file stamps they were loaded from."""
+
+    def __init__(self, stamps, source_paths):
+        self.artifacts = {}
+        self.stamps = stamps
+        self.version = _stamps_version(stamps)
+        self.source_paths = source_paths
+        self.source_stamps = stamps[:len(source_paths)]
+        self.source_stamp = _stamps_version(self.source_stamps)
+        self._source_version = None
+        self.stats = {}
+        self.checked_at = time.monotonic()
+
+    def source_version(self):
+        """Return the content hash of the source pickles, computed on first use."""
+        if self._source_version is None:
+            with publish_lock(MODELS_DIR):
+                self._source_version = _content_version(self.source_paths)
+        return self._source_version
+
+    def built_from_sources(self, exported):
+        """
+        Whether an exported artifact was built from these source pickles.
+
+        Its recorded file stamps are compared first. When they differ, e.g.
+        because a checkout, copy or deploy rewrote the mtimes, the content
+        hash decides, as for the dataset store.
+
+        Args:
+            exported: Artifact manifest or compiled payload, with the
+                "source_stamp" and "source_version" it was written with
+        """
+        if all(stamp is None for stamp in self.source_stamps):
+            # Only the exported artifacts are deployed
+            return True
+        if exported.get("source_stamp") == self.source_stamp:
+            return True
+        return exported.get("source_version") == self.source_version()
+
+    def record(self, name, elapsed, artifact, file_bytes=None):
+        self.stats[name] = {
+            "load_seconds": elapsed,
+            "memory_bytes": _memory_bytes(artifact),
+            "file_bytes": file_bytes,
+            "loaded_at": time.time(),
+        }
+
+
+class ModelRegistry:
+    """
+    Process-wide cache of model and scaler artifacts.
+
+    Each disease is loaded the first time it is requested, so a session that
+    only assesses heart disease never unpickles the diabetes forest. Every
+    disease has its own lock, so a heart request is never held up by a cold
+    diabetes load. The files in MODELS_DIR are re-checked at most every
+    ``check_interval`` seconds and the artifacts are reloaded when their
+    mtime or size changes. Exported artifacts are matched to the source
+    pickles by content hash, so they stay in use when a checkout or copy
+    changes the mtimes.
+
+    Compiled models come from, in order of preference, the memory-mapped
+    array artifact, the compiled pickle, or fusing the pickled pair in memory.
+    The source pickles are only unpickled when they are actually needed.
+    """
+
+    def __init__(self, check_interval=2.0):
+        self.check_interval = check_interval
+        self._loaded = {}
+        self._locks = {disease: threading.Lock() for disease in ARTIFACTS}
+
+    def _lock(self, disease):
+        lock = self._locks.get(disease)
+        if lock is None:
+            raise ArtifactLoadError(f"Unknown disease: {disease}")
+        return lock
+
+    def _source_paths(self, disease):
+        return [MODELS_DIR / file_name for _, file_name, _ in ARTIFACTS[disease]]
+
+    def _watched_paths(self, disease):
+        return self._source_paths(disease) + [compiled_path(disease), pointer_path(disease)]
+
+    def _stamps(self, disease):
+        with publish_lock(MODELS_DIR):
+            return tuple(_file_stamp(path) for path in self._watched_paths(disease))
+
+    def _entry(self, disease):
+        """Return the current entry for a disease, starting a fresh one if its files changed."""
+        loaded = self._loaded.get(disease)
+        now = time.monotonic()
+        if loaded is None or now - loaded.checked_at >= self.check_interval:
+            stamps = self._stamps(disease)
+            if loaded is None or stamps != loaded.stamps:
+                loaded = _LoadedDisease(stamps, self._source_paths(disease))
+                self._loaded[disease] = loaded
+            loaded.checked_at = now
+        return loaded
+
+    def _load_sources(self, disease, loaded):
+        if "model" not in loaded.artifacts:
+            with publish_lock(MODELS_DIR):
+                for (role, file_name, loader), stamp in zip(ARTIFACTS[disease], loaded.source_stamps):
+                    artifact, elapsed = _timed_load(loader)
+                    loaded.artifacts[role] = artifact
+                    loaded.record(file_name, elapsed, artifact, None if stamp is None else stamp[1])
+        return loaded.artifacts["model"], loaded.artifacts["scaler"]
+
+    def _compile(self, disease, loaded):
+        """
+        Load or build the compiled model and record where it came from.
+
+        Only the compiled model's own loading or fusing is timed; unpickling
+        the sources is recorded under their file names.
+        """
+        manifest = read_manifest(disease)
+        if manifest is not None and loaded.built_from_sources(manifest):
+            (compiled, _), elapsed = _timed_load(lambda: load_artifact(disease, manifest))
+            name = str(Path(manifest["directory"]).relative_to(MODELS_DIR))
+        else:
+            compiled, elapsed = _timed_load(lambda: load_compiled(disease, loaded.built_from_sources))
+            name = compiled_path(disease).name
+            if compiled is None:
+                sources = self._load_sources(disease, loaded)
+                compiled, elapsed = _timed_load(lambda: fuse_model(*sources))
+                name = f"{disease} (fused in memory)"
+        loaded.record(name, elapsed, compiled)
+        return compiled
+
+    def get(self, disease):
+        """
+        Return the loaded artifacts for a disease, loading or reloading them if needed.
+
+        Args:
+            disease: "diabetes" or "heart"
+
+        Returns:
+            tuple: (model, scaler)
+        """
+        with self._lock(disease):
+            return self._load_sources(disease, self._entry(disease))
+
+    def get_compiled(self, disease):
+        """
+        Return a model that scores raw feature rows with the scaler already fused in.
+
+        Exported array or pickle artifacts are used when they were built from
+        the current source files (or when the source pickles are not deployed
+        at all); otherwise the pair is fused in memory.
+        """
+        with self._lock(disease):
+            loaded = self._entry(disease)
+            compiled = loaded.artifacts.get("compiled")
+            if compiled is None:
+                compiled = loaded.artifacts["compiled"] = self._compile(disease, loaded)
+        return compiled
+
+    def source_version(self, disease):
+        """Return a content hash of the source pickles a disease's models come from."""
+        with self._lock(disease):
+            return self._entry(disease).source_version()
+
+    def source_stamp(self, disease):
+        """Return the source pickles' mtime and size stamps, recorded next to source_version()."""
+        with self._lock(disease):
+            return self._entry(disease).source_stamp
+
+    def version(self, disease):
+        """
+        Return a string identifying every artifact file a disease's predictions depend on.
+
+        Never takes the disease's lock, so it does not wait for a cold load
+        or fuse running on another thread. It reads the loaded entry, which
+        is swapped in whole, and stats the files itself when that entry is
+        missing or due for a re-check.
+        """
+        self._lock(disease)  # raises for an unknown disease
+        loaded = self._loaded.get(disease)
+        if loaded is None or time.monotonic() - loaded.checked_at >= self.check_interval:
+            return _stamps_version(self._stamps(disease))
+        return loaded.version
+
+    def is_loaded(self, disease):
+        """Return True if any of the disease's artifacts are currently held in memory."""
+        loaded = self._loaded.get(disease)
+        return loaded is not None and bool(loaded.artifacts)
+
+    def stats(self):
+        """
+        Report load time and size for every artifact loaded so far.
+
+        memory_bytes is what the loaded artifact holds in NumPy arrays (see
+        _memory_bytes); file_bytes is a source pickle's size on disk, and
+        None for compiled models.
+
+        Returns:
+            dict: {name: {"load_seconds", "memory_bytes", "file_bytes", "loaded_at"}}
+        """
+        report = {}
+        for disease in list(self._loaded):
+            with self._lock(disease):
+                loaded = self._loaded.get(disease)
+                if loaded is not None:
+                    report.update({name: dict(values) for name, values in loaded.stats.items()})
+        return report
+
+    def clear(self):
+        """Drop all loaded artifacts so the next request reloads them from disk."""
+        for disease, lock in self._locks.items():
+            with lock:
+                self._loaded.pop(disease, None)
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    """Return the process-wide ModelRegistry, creating it on first use."""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = ModelRegistry()
+    return _registry
@@ -0,0 +1,282 @@
+import importlib.util
+from datetime import datetime
+from functools import lru_cache
+
+from metrics import timed
+
+
+HEADER_FILL = (26, 33, 62)
+SECTION_FILL = (240, 245, 250)
+HIGH_RISK_COLOR = (244, 67, 54)
+LOW_RISK_COLOR = (76, 175, 80)
+CURVE_COLOR = (37, 99, 235)
+# Key factor bars are drawn this wide (mm) for a 100 percentage point contribution
+FACTOR_BAR_SCALE = 150
+GRID_COLOR = (203, 213, 225)
+# What-if charts: two per row, each this tall including its title and axis labels
+CURVE_CHART_HEIGHT = 40
+
+
+@lru_cache(maxsize=1)
+def pdf_available():
+    """Return True if fpdf2 is installed and PDF reports can be built, without importing it."""
+    return importlib.util.find_spec("fpdf") is not None
+
+
+@lru_cache(maxsize=1)
+def _fpdf_class():
+    # fpdf2 pulls in fontTools and PIL, so it is only imported for the first report
+    from fpdf import FPDF
+    return FPDF
+
+
+def _page_width(pdf):
+    return getattr(pdf, "epw", None) or (pdf.w - pdf.l_margin - pdf.r_margin)
+
+
+def _section_heading(pdf, title):
+    pdf.set_fill_color(*SECTION_FILL)
+    pdf.set_text_color(*HEADER_FILL)
+    pdf.set_font("Helvetica", style="B", size=12)
+    pdf.cell(_page_width(pdf), 8, title, ln=1, fill=True)
+    pdf.set_text_color(0, 0, 0)
+    pdf.set_font("Helvetica", size=11)
+
+
+def _new_document():
+    pdf = _fpdf_class()()
+    pdf.set_margins(left=12, top=12, right=12)
+    pdf.set_auto_page_break(auto=True, margin=15)
+    return pdf
+
+
+def _draw_static(pdf):
+    """
+    Start a page with the parts of the report that never change: header band and Inputs heading.
+
+    Returns:
+        tuple: (meta_y, body_y) where meta_y is where the timestamp/patient
+            lines go and body_y is where the inputs table starts
+    """
+    pdf.add_page()
+    page_width = _page_width(pdf)
+
+    pdf.set_fill_color(*HEADER_FILL)
+    pdf.set_text_color(255, 255, 255)
+    pdf.set_font("Helvetica", style="B", size=16)
+    pdf.rect(pdf.l_margin, pdf.t_margin, page_width, 16, style="F")
+    pdf.set_xy(pdf.l_margin + 4, pdf.t_margin + 4)
+    pdf.cell(page_width - 8, 8, "Disease Prediction Report")
+
+    pdf.set_text_color(0, 0, 0)
+    pdf.ln(20)
+    meta_y = pdf.get_y()
+
+    # Timestamp row (7) + patient row (8) + spacing (2) are filled in per report
+    pdf.set_y(meta_y + 7 + 8 + 2)
+    _section_heading(pdf, "Inputs")
+    return meta_y, pdf.get_y()
+
+
+def _warm_up():
+    """Import fpdf2 and draw a page header once, so the first report does not pay for either."""
+    _draw_static(_new_document())
+
+
+def _draw_report(pdf, meta_y, body_y, disease_name, patient_name, inputs, prediction_label, probability_percent, generated_at=None, factors=None, curves=None):
+    timestamp = (generated_at or datetime.now()).strftime("%Y-%m-%d %H:%M")
+    safe_name = patient_name.strip() or "Unknown"
+    page_width = _page_width(pdf)
+
+    pdf.set_xy(pdf.l_margin, meta_y)
+    pdf.set_font("Helvetica", size=11)
+    left_col = page_width * 0.6
+    right_col = page_width - left_col
+    pdf.cell(left_col, 7, f"Generated: {timestamp}")
+    pdf.cell(right_col, 7, f"Condition: {disease_name}", ln=1)
+    pdf.set_font("Helvetica", style="B", size=13)
+    pdf.cell(left_col, 8, f"Patient Name: {safe_name}")
+    pdf.set_font("Helvetica", size=11)
+    pdf.cell(right_col, 8, "", ln=1)
+
+    pdf.set_y(body_y)
+    label_width = 55
+    value_width = page_width - label_width
+
+    def draw_kv_row(label, value):
+        pdf.set_x(pdf.l_margin)
+        pdf.set_font("Helvetica", style="B", size=11)
+        pdf.cell(label_width, 7, str(label))
+        pdf.set_font("Helvetica", size=11)
+        try:
+            pdf.multi_cell(value_width, 7, str(value), new_x="LMARGIN", new_y="NEXT")
+        except TypeError:
+            pdf.multi_cell(value_width, 7, str(value))
+
+    for key, value in inputs.items():
+        draw_kv_row(key, value)
+
+    pdf.ln(2)
+    _section_heading(pdf, "Result")
+
+    risk_color = HIGH_RISK_COLOR if prediction_label == "High Risk" else LOW_RISK_COLOR
+    pdf.set_text_color(*risk_color)
+    pdf.set_font("Helvetica", style="B", size=12)
+    pdf.cell(page_width, 7, f"Prediction: {prediction_label}", ln=1)
+    pdf.set_text_color(0, 0, 0)
+    pdf.set_font("Helvetica", size=11)
+    pdf.cell(page_width, 7, f"Risk Level: {probability_percent:.1f}%", ln=1)
+
+    if factors:
+        _draw_factors(pdf, factors)
+    if curves:
+        _draw_risk_curves(pdf, curves)
+
+
+def _draw_factors(pdf, factors):
+    """Draw the Key Factors section: one row per input with its signed contribution and a bar."""
+    page_width = _page_width(pdf)
+    pdf.ln(2)
+    _section_heading(pdf, "Key Factors")
+    pdf.set_font("Helvetica", size=9)
+    pdf.multi_cell(page_width, 5, "Inputs that moved the risk most, in percentage points relative to an average patient.")
+    label_width, value_width = 55, 22
+    for name, contribution in factors:
+        points = contribution * 100
+        y = pdf.get_y()
+        pdf.set_x(pdf.l_margin)
+        pdf.set_font("Helvetica", style="B", size=10)
+        pdf.cell(label_width, 6, name)
+        pdf.set_font("Helvetica", size=10)
+        pdf.cell(value_width, 6, f"{points:+.1f} pts", align="R")
+        bar_width = min(abs(points) / 100 * FACTOR_BAR_SCALE, page_width - label_width - value_width - 4)
+        pdf.set_fill_color(*(HIGH_RISK_COLOR if points > 0 else LOW_RISK_COLOR))
+        if bar_width > 0:
+            pdf.rect(pdf.l_margin + label_width + value_width + 4, y + 1.5, bar_width, 3, style="F")
+        pdf.ln(6)
+    pdf.set_font("Helvetica", size=11)
+
+
+def _draw_curve(pdf, curve, x, y, width):
+    """Draw one what-if curve as a small line chart with the patient's value marked."""
+    pdf.set_font("Helvetica", style="B", size=9)
+    pdf.set_xy(x, y)
+    pdf.cell(width, 5, f"Risk vs {curve.label}")
+
+    plot_x, plot_y = x + 9, y + 6
+    plot_w, plot_h = width - 12, CURVE_CHART_HEIGHT - 16
+    low, high = float(curve.values[0]), float(curve.values[-1])
+    span = (high - low) or 1.0
+
+    def to_page(value, probability):
+        return plot_x + (value - low) / span * plot_w, plot_y + (1 - probability) * plot_h
+
+    pdf.set_draw_color(*GRID_COLOR)
+    pdf.set_line_width(0.2)
+    pdf.set_font("Helvetica", size=7)
+    for probability in (0.0, 0.5, 1.0):
+        _, grid_y = to_page(low, probability)
+        pdf.line(plot_x, grid_y, plot_x + plot_w, grid_y)
+        pdf.set_xy(x, grid_y - 2)
+        pdf.cell(8, 4, f"{probability * 100:.0f}%", align="R")
+    for value, align in ((low, "L"), (high, "R")):
+        pdf.set_xy(plot_x if align == "L" else plot_x + plot_w - 20, plot_y + plot_h + 1)
+        pdf.cell(20, 4, f"{value:g}", align=align)
+
+    pdf.set_draw_color(*CURVE_COLOR)
+    pdf.set_line_width(0.5)
+    pdf.polyline([to_page(v, p) for v, p in zip(curve.values, curve.probabilities)])
+    if low <= curve.current_value <= high:
+        marker_x, marker_y = to_page(curve.current_value, curve.current_probability)
+        pdf.set_fill_color(*HIGH_RISK_COLOR)
+        pdf.ellipse(marker_x - 1.2, marker_y - 1.2, 2.4, 2.4, style="F")
+    pdf.set_draw_color(0, 0, 0)
+    pdf.set_line_width(0.2)
+
+
+def _draw_risk_curves(pdf, curves):
+    """Draw the What-if section: one chart per curve, two per row, moved to a new page if it does not fit."""
+    pdf.ln(3)
+    rows = (len(curves) + 1) // 2
+    if pdf.get_y() + 14 + rows * CURVE_CHART_HEIGHT > pdf.page_break_trigger:
+        pdf.add_page()
+    _section_heading(pdf, "What-if Analysis")
+    pdf.set_font("Helvetica", size=9)
+    pdf.multi_cell(
+        _page_width(pdf), 5,
+        "Predicted risk as one input varies with all others held at the values above. "
+        "The dot marks the entered value.",
+    )
+    page_width = _page_width(pdf)
+    chart_width = page_width / 2
+    top = pdf.get_y() + 1
+    for i, curve in enumerate(curves):
+        row, column = divmod(i, 2)
+        _draw_curve(pdf, curve, pdf.l_margin + column * chart_width, top + row * CURVE_CHART_HEIGHT, chart_width)
+    pdf.set_xy(pdf.l_margin, top + rows * CURVE_CHART_HEIGHT)
+    pdf.set_font("Helvetica", size=11)
+
+
+def _output_bytes(pdf):
+    pdf_output = pdf.output(dest="S")
+    if isinstance(pdf_output, (bytes, bytearray)):
+        return bytes(pdf_output)
+    return str(pdf_output).encode("latin1")
+
+
+@timed("build_pdf_report")
+def build_pdf_report(disease_name, patient_name, inputs, prediction_label, probability_percent, generated_at=None, factors=None, curves=None):
+    """
+    Render a prediction report, one page unless key factors and what-if charts push it onto a second.
+
+    Args:
+        generated_at: datetime shown as the generation time; defaults to now.
+            Pass the prediction time when rendering is deferred.
+        factors: Optional (input name, contribution) pairs from
+            explain.top_factors(), listed with bars below the result
+        curves: Optional what-if curves from whatif.risk_curves(), drawn as
+            charts below the result
+
+    Returns:
+        bytes: The PDF document, or None if fpdf2 is not installed
+    """
+    if not pdf_available():
+        return None
+    pdf = _new_document()
+    meta_y, body_y = _draw_static(pdf)
+    _draw_report(
+        pdf, meta_y, body_y, disease_name, patient_name, inputs,
+        prediction_label, probability_percent, generated_at=generated_at, factors=factors, curves=curves,
+    )
+    return _output_bytes(pdf)
+
+
+def build_pdf_document(reports):
+    """
+    Render several reports as consecutive pages of one PDF.
+
+    Args:
+        reports: Iterable of keyword-argument dicts for build_pdf_report()
+
+    Returns:
+        bytes: The PDF document, or None if fpdf2 is not installed
+    """
+    if not pdf_available():
+        return None
+    pdf = _new_document()
+    for report in reports:
+        meta_y, body_y = _draw_static(pdf)
+        _draw_report(pdf, meta_y, body_y, **report)
+    return _output_bytes(pdf)
+
+
+def deferred_pdf_report(**report):
+    """
+    Return a zero-argument callable that renders the report when it is first called.
+
+    Passed as ``data`` to st.download_button, nothing is rendered until the
+    user actually clicks Download.
+    """
+    def render():
+        return build_pdf_report(**report)
+    return render
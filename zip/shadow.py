@@ -0,0 +1,434 @@
+import argparse
+import logging
+import multiprocessing
+import os
+import pickle
+import queue
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from metrics import QUANTILES, LatencyHistogram
+from utils import DEFAULT_THRESHOLD, ArtifactLoadError, predict_risk
+
+
+# Comma-separated candidate directories to shadow, e.g. models/versions/heart/<version>
+ENV_FLAG = "DISEASE_PREDICTION_SHADOW"
+# Requests waiting for the shadow worker; beyond this they are dropped
+DEFAULT_MAX_QUEUE = 1024
+# Most rows scored by a candidate in one call
+DEFAULT_MAX_BATCH_ROWS = 256
+# Longest a batch waits for more requests before it is sent to the worker
+DEFAULT_MAX_WAIT = 0.05
+# Upper edges of the |candidate - primary| probability buckets in the report
+DELTA_EDGES = (0.01, 0.05, 0.1, 0.25, 0.5)
+# The serving process already runs threads when candidates start, so the
+# scoring process is spawned rather than forked
+DEFAULT_START_METHOD = "spawn"
+# Added to the scoring process's nice value (the lowest priority), so serving wins any contention for a core
+WORKER_NICENESS = 19
+
+Candidate = namedtuple("Candidate", ["name", "disease", "model"])
+
+logger = logging.getLogger(__name__)
+
+_scorers = {}
+_STOP = object()
+
+# Candidates loaded inside a scorer's worker process, by name
+_worker_candidates = {}
+
+
+def enabled():
+    """Whether the environment flag names any candidates."""
+    return bool(candidate_paths())
+
+
+def candidate_paths():
+    """Return the candidate directories listed in the environment flag."""
+    return [Path(path) for path in os.environ.get(ENV_FLAG, "").split(",") if path.strip()]
+
+
+def load_candidate(path):
+    """
+    Load a candidate model saved by train.py.
+
+    The directory holds <disease>_model.pkl and <disease>_scaler.pkl, as in
+    models/versions/<disease>/<version>. The pair is fused like the served
+    model (see compiled.fuse_model), so both are timed on the same footing.
+
+    Returns:
+        Candidate: (name, disease, model) with the directory name as name
+    """
+    from compiled import fuse_model
+
+    path = Path(path)
+    models = sorted(path.glob("*_model.pkl"))
+    if len(models) != 1:
+        raise ArtifactLoadError(f"Expected one <disease>_model.pkl in {path}, found {len(models)}")
+    disease = models[0].name[: -len("_model.pkl")]
+    loaded = []
+    for artifact in (models[0], path / f"{disease}_scaler.pkl"):
+        try:
+            with open(artifact, "rb") as f:
+                loaded.append(pickle.load(f))
+        except FileNotFoundError:
+            raise ArtifactLoadError(f"Candidate artifact not found at {artifact}")
+        except Exception as e:
+            raise ArtifactLoadError(f"Failed to load candidate {artifact}: {e}")
+    return Candidate(path.name, disease, fuse_model(*loaded))
+
+
+def _latency_summary(histogram, rows):
+    counts, calls, total = histogram.snapshot()
+    return {
+        "calls": calls,
+        "seconds_per_row": total / (rows or 1),
+        **{f"p{round(q * 100)}": LatencyHistogram.quantile(counts, calls, q) for q in QUANTILES},
+    }
+
+
+class _CandidateStats:
+    """Running comparison of one candidate with the primary model."""
+
+    def __init__(self):
+        self.rows = 0
+        self.agreements = 0
+        self.delta_total = 0.0
+        self.abs_delta_total = 0.0
+        self.max_abs_delta = 0.0
+        self.delta_counts = np.zeros(len(DELTA_EDGES) + 1, dtype=np.int64)
+        self.errors = 0
+        self.latency = LatencyHistogram()
+
+    def add(self, primary, candidate, seconds, threshold):
+        delta = candidate - primary
+        abs_delta = np.abs(delta)
+        self.rows += len(delta)
+        self.agreements += int(np.count_nonzero((candidate > threshold) == (primary > threshold)))
+        self.delta_total += float(delta.sum())
+        self.abs_delta_total += float(abs_delta.sum())
+        self.max_abs_delta = max(self.max_abs_delta, float(abs_delta.max()))
+        self.delta_counts += np.bincount(
+            np.searchsorted(DELTA_EDGES, abs_delta), minlength=len(self.delta_counts)
+        )
+        self.latency.observe(seconds)
+
+    def summary(self):
+        rows = self.rows or 1
+        labels = [f"<={edge:g}" for edge in DELTA_EDGES] + [f">{DELTA_EDGES[-1]:g}"]
+        return {
+            "rows": self.rows,
+            "agreement_rate": self.agreements / rows,
+            "mean_delta": self.delta_total / rows,
+            "mean_abs_delta": self.abs_delta_total / rows,
+            "max_abs_delta": self.max_abs_delta,
+            "abs_delta_counts": dict(zip(labels, self.delta_counts.tolist())),
+            "errors": self.errors,
+            "latency": _latency_summary(self.latency, self.rows),
+        }
+
+
+def _worker_init():
+    """Worker initializer: lower the scoring process's CPU priority where the platform allows it."""
+    if hasattr(os, "nice"):
+        try:
+            os.nice(WORKER_NICENESS)
+        except OSError:
+            pass
+
+
+def _worker_load(paths):
+    """
+    Load candidates into the worker process.
+
+    Returns:
+        list: (name, error) per path, with error None for a loaded candidate
+    """
+    loaded = []
+    for path in paths:
+        try:
+            candidate = load_candidate(path)
+        except Exception as e:
+            loaded.append((Path(path).name, f"{type(e).__name__}: {e}"))
+            continue
+        _worker_candidates[candidate.name] = candidate
+        loaded.append((candidate.name, None))
+    return loaded
+
+
+def _worker_score(features, threshold):
+    """
+    Score rows with every loaded candidate, in the worker process.
+
+    Returns:
+        dict: name -> (probabilities, seconds, error), with probabilities
+            and seconds None when the candidate raised
+    """
+    results = {}
+    for name, candidate in _worker_candidates.items():
+        start = time.perf_counter()
+        try:
+            probabilities = predict_risk(candidate.model, None, features, threshold).probabilities
+        except Exception as e:
+            results[name] = (None, None, f"{type(e).__name__}: {e}")
+            continue
+        results[name] = (probabilities, time.perf_counter() - start, None)
+    return results
+
+
+class ShadowScorer:
+    """
+    Scores live requests for one disease with candidate models, in a separate process.
+
+    Callers hand over the rows they have already scored with the primary
+    model and return straight away; submit() is a put_nowait onto a bounded
+    queue, and when the queue is full the request is counted as dropped
+    rather than waited on. A background thread collects queued requests for
+    up to ``max_wait`` seconds or ``max_batch_rows`` rows, so the hand-off
+    cost is paid per batch rather than per request, and sends them to a
+    single worker process that holds the candidates and scores the batch
+    with each of them. The
+    thread only stacks rows and updates counters while it waits on the
+    worker, so candidate scoring never holds the serving process's GIL, and
+    the worker runs at the lowest CPU priority. Label agreement, probability
+    deltas and the candidates' latency (timed inside the worker) are
+    recorded. The primary model's own scoring time is passed in with each
+    request and summarised the same way, so the two can be compared.
+    """
+
+    def __init__(
+        self,
+        disease,
+        candidate_paths,
+        max_queue=DEFAULT_MAX_QUEUE,
+        max_batch_rows=DEFAULT_MAX_BATCH_ROWS,
+        max_wait=DEFAULT_MAX_WAIT,
+        threshold=DEFAULT_THRESHOLD,
+        start_method=DEFAULT_START_METHOD,
+    ):
+        self.disease = disease
+        self.max_batch_rows = max_batch_rows
+        self.max_wait = max_wait
+        self.threshold = threshold
+        self._paths = [str(path) for path in candidate_paths]
+        self.candidates = []
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._stats = {}
+        self._stats_lock = threading.Lock()
+        self.submitted = 0
+        self.dropped = 0
+        self.primary_rows = 0
+        self._primary_latency = LatencyHistogram()
+        self._stopping = False
+        self._executor = ProcessPoolExecutor(
+            max_workers=1,
+            mp_context=multiprocessing.get_context(start_method),
+            initializer=_worker_init,
+        )
+        self._thread = threading.Thread(target=self._run, name=f"shadow-{disease}", daemon=True)
+        self._thread.start()
+
+    def submit(self, features, probabilities, seconds=None):
+        """
+        Queue rows and their primary probabilities for shadow scoring; never blocks.
+
+        Args:
+            seconds: Time the primary model took to score the rows, or None
+                if they were not scored (e.g. a prediction cache hit)
+        """
+        if seconds is not None:
+            self._primary_latency.observe(seconds)
+            with self._stats_lock:
+                self.primary_rows += len(np.atleast_1d(probabilities))
+        try:
+            self._queue.put_nowait((features, probabilities))
+        except queue.Full:
+            with self._stats_lock:
+                self.dropped += 1
+            return
+        with self._stats_lock:
+            self.submitted += 1
+
+    def _load(self):
+        try:
+            loaded = self._executor.submit(_worker_load, self._paths).result()
+        except Exception:
+            # Anything escaping here would end the thread before it drains the queue
+            logger.exception("Could not start the shadow worker for %s", self.disease)
+            return
+        for name, error in loaded:
+            if error is not None:
+                logger.error("Skipping shadow candidate %s for %s: %s", name, self.disease, error)
+                continue
+            with self._stats_lock:
+                self._stats[name] = _CandidateStats()
+            self.candidates.append(name)
+
+    def _take(self, first):
+        items = [first]
+        rows = len(np.atleast_1d(first[1]))
+        deadline = time.monotonic() + self.max_wait
+        while rows < self.max_batch_rows:
+            try:
+                item = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                break
+            if item is _STOP:
+                self._stopping = True
+                break
+            items.append(item)
+            rows += len(np.atleast_1d(item[1]))
+        return items
+
+    def _score(self, features, primary):
+        try:
+            results = self._executor.submit(_worker_score, features, self.threshold).result()
+        except Exception:
+            logger.exception("Shadow worker for %s failed", self.disease)
+            with self._stats_lock:
+                for stats in self._stats.values():
+                    stats.errors += 1
+            return
+        for name, (probabilities, seconds, error) in results.items():
+            stats = self._stats[name]
+            if error is not None:
+                logger.error("Shadow candidate %s failed: %s", name, error)
+                with self._stats_lock:
+                    stats.errors += 1
+                continue
+            with self._stats_lock:
+                stats.add(primary, probabilities, seconds, self.threshold)
+
+    def _run(self):
+        self._load()
+        while not self._stopping:
+            first = self._queue.get()
+            if first is _STOP:
+                return
+            items = self._take(first)
+            if not self.candidates:
+                continue
+            features = np.vstack([np.atleast_2d(f) for f, _ in items])
+            primary = np.concatenate([np.atleast_1d(p) for _, p in items]).astype(np.float64)
+            self._score(features, primary)
+
+    def stop(self):
+        """Score everything already queued, then stop the thread and the worker process."""
+        self._queue.put(_STOP)
+        self._thread.join()
+        self._executor.shutdown()
+
+    def report(self):
+        """
+        Summarise the comparison so far.
+
+        Returns:
+            dict: submitted, dropped and queued request counts, the primary
+                model's latency, and per candidate: rows, agreement_rate,
+                mean_delta, mean_abs_delta, max_abs_delta, abs_delta_counts,
+                errors and latency
+        """
+        with self._stats_lock:
+            return {
+                "submitted": self.submitted,
+                "dropped": self.dropped,
+                "queued": self._queue.qsize(),
+                "primary": {"latency": _latency_summary(self._primary_latency, self.primary_rows)},
+                "candidates": {name: stats.summary() for name, stats in self._stats.items()},
+            }
+
+
+def record(disease, features, probabilities, seconds=None):
+    """
+    Hand a scored request and the primary model's scoring time to the disease's shadow scorer.
+
+    A no-op unless start_shadow() was given candidates for the disease.
+    """
+    scorer = _scorers.get(disease)
+    if scorer is not None:
+        scorer.submit(features, probabilities, seconds)
+
+
+def start_shadow(paths=None, max_queue=DEFAULT_MAX_QUEUE):
+    """
+    Start a ShadowScorer per disease for the given candidate directories.
+
+    Candidates are loaded in each scorer's worker process, so startup does
+    not wait for them; requests arriving before then are queued or dropped.
+
+    Args:
+        paths: Candidate directories; defaults to the environment flag
+        max_queue: Requests each scorer queues before dropping
+
+    Returns:
+        dict: The ShadowScorer per disease
+    """
+    from registry import ARTIFACTS
+
+    by_disease = {}
+    for path in paths if paths is not None else candidate_paths():
+        path = Path(path)
+        disease = next((d for d in ARTIFACTS if (path / f"{d}_model.pkl").exists()), None)
+        if disease is None:
+            logger.warning("No <disease>_model.pkl in shadow candidate %s; skipping it", path)
+            continue
+        by_disease.setdefault(disease, []).append(path)
+    for disease, candidates in by_disease.items():
+        if disease not in _scorers:
+            _scorers[disease] = ShadowScorer(disease, candidates, max_queue=max_queue)
+    return dict(_scorers)
+
+
+def shadow_report():
+    """Return the comparison report per disease."""
+    return {disease: scorer.report() for disease, scorer in _scorers.items()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Replay a batch-layout CSV through the served model and shadow candidates."
+    )
+    parser.add_argument("disease", choices=("diabetes", "heart"))
+    parser.add_argument("csv")
+    parser.add_argument("candidates", nargs="+", help="Directories from models/versions/<disease>")
+    parser.add_argument("--batch-rows", type=int, default=1, help="Rows per replayed request")
+    args = parser.parse_args(argv)
+
+    import pandas as pd
+    from registry import get_registry
+    from utils import build_diabetes_feature_matrix, build_heart_feature_matrix
+
+    builder = build_diabetes_feature_matrix if args.disease == "diabetes" else build_heart_feature_matrix
+    features = builder(pd.read_csv(args.csv))
+    model = get_registry().get_compiled(args.disease)
+    # Replay is not latency bound, so nothing is dropped
+    scorer = ShadowScorer(args.disease, args.candidates, max_queue=len(features) + 1)
+    for start in range(0, len(features), args.batch_rows):
+        rows = features[start:start + args.batch_rows]
+        scoring_start = time.perf_counter()
+        probabilities = predict_risk(model, None, rows).probabilities
+        scorer.submit(rows, probabilities, time.perf_counter() - scoring_start)
+    scorer.stop()
+
+    report = scorer.report()
+    primary = report["primary"]["latency"]
+    print(
+        f"{args.disease}: {report['submitted']} requests, {len(features)} rows; "
+        f"primary {primary['seconds_per_row'] * 1e6:.1f}us/row, p95 call {primary['p95'] * 1e3:.2f}ms"
+    )
+    for name, stats in report["candidates"].items():
+        latency = stats["latency"]
+        print(
+            f"  {name}: agreement {stats['agreement_rate']:.2%}, mean |dp| {stats['mean_abs_delta']:.4f}, "
+            f"max |dp| {stats['max_abs_delta']:.4f}, {latency['seconds_per_row'] * 1e6:.1f}us/row, "
+            f"p95 call {latency['p95'] * 1e3:.2f}ms, errors {stats['errors']}"
+        )
+
+
+if __name__ == "__main__":
+    main()
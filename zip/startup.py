@@ -0,0 +1,145 @@
+import argparse
+import os
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+
+APP_DIR = Path(__file__).parent
+ENV_FLAG = "DISEASE_PREDICTION_PREWARM"
+
+# Modules the app's import path must not load; they are only needed for
+# training, batch jobs or the first PDF report.
+DEFAULT_FORBIDDEN = ["pandas", "sklearn", "fpdf"]
+DEFAULT_MODULES = ["app"]
+
+
+def prewarm_requested():
+    return os.environ.get(ENV_FLAG, "").lower() in ("1", "true", "yes", "on")
+
+
+def prewarm(diseases=None, reports=True):
+    """
+    Load everything the first prediction would otherwise wait for.
+
+    Compiled models are loaded through the registry and their arrays are
+    read once so memory-mapped pages are resident, and the background means
+    for explanations are computed; fpdf2 is imported and a report header is
+    drawn once.
+
+    Returns:
+        dict: Seconds spent per step, keyed by disease name or "reports"
+    """
+    from explain import background_means
+    from registry import ARTIFACTS, get_registry
+
+    timings = {}
+    registry = get_registry()
+    for disease in diseases or sorted(ARTIFACTS):
+        start = time.perf_counter()
+        model = registry.get_compiled(disease)
+        to_arrays = getattr(model, "to_arrays", None)
+        if to_arrays is not None:
+            arrays, _ = to_arrays()
+            for array in arrays.values():
+                array.sum()
+        background_means(disease)
+        timings[disease] = time.perf_counter() - start
+    if reports:
+        from reports import _warm_up, pdf_available
+
+        if pdf_available():
+            start = time.perf_counter()
+            _warm_up()
+            timings["reports"] = time.perf_counter() - start
+    return timings
+
+
+def start_prewarm(diseases=None, reports=True):
+    """Run prewarm() on a daemon thread so startup is not blocked by it."""
+    thread = threading.Thread(
+        target=prewarm, kwargs={"diseases": diseases, "reports": reports}, name="prewarm", daemon=True
+    )
+    thread.start()
+    return thread
+
+
+def profile_imports(modules=DEFAULT_MODULES):
+    """
+    Import modules in a fresh interpreter under ``-X importtime``.
+
+    Returns:
+        tuple: (total_seconds, rows) where rows are (module, self_seconds,
+            cumulative_seconds) for every module imported, in import order
+    """
+    code = "; ".join(f"import {module}" for module in modules)
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=APP_DIR,
+        capture_output=True,
+        text=True,
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"Importing {', '.join(modules)} failed:\n{completed.stderr}")
+    rows = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((name.strip(), int(self_us) / 1e6, int(cumulative_us) / 1e6))
+    total = sum(self_seconds for _, self_seconds, _ in rows)
+    return total, rows
+
+
+def forbidden_imports(rows, forbidden=DEFAULT_FORBIDDEN):
+    """Return the forbidden top-level packages that appear in an import profile."""
+    imported = {name.split(".")[0] for name, _, _ in rows}
+    return sorted(imported & set(forbidden))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Startup profiling and model pre-warming.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    profile = commands.add_parser("profile", help="Report import time of the app's startup path")
+    profile.add_argument("--modules", nargs="+", default=DEFAULT_MODULES)
+    profile.add_argument("--top", type=int, default=15, help="Slowest modules to list")
+    profile.add_argument("--budget-ms", type=float, default=None, help="Fail if the total exceeds this")
+    profile.add_argument(
+        "--forbid", nargs="*", default=DEFAULT_FORBIDDEN, help="Fail if any of these packages is imported"
+    )
+
+    warm = commands.add_parser("prewarm", help="Load every compiled model and the PDF library once")
+    warm.add_argument("diseases", nargs="*")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.command == "prewarm":
+        for name, seconds in prewarm(args.diseases or None).items():
+            print(f"{name:<10} {seconds * 1e3:8.1f}ms")
+        return
+
+    total, rows = profile_imports(args.modules)
+    print(f"Importing {', '.join(args.modules)} took {total * 1e3:.1f}ms ({len(rows)} modules)")
+    print(f"{'cumulative':>12} {'self':>10}  module")
+    for name, self_seconds, cumulative in sorted(rows, key=lambda row: row[2], reverse=True)[: args.top]:
+        print(f"{cumulative * 1e3:10.1f}ms {self_seconds * 1e3:8.1f}ms  {name}")
+
+    failed = False
+    leaked = forbidden_imports(rows, args.forbid)
+    if leaked:
+        print(f"FAIL: startup imports {', '.join(leaked)}", file=sys.stderr)
+        failed = True
+    if args.budget_ms is not None and total * 1e3 > args.budget_ms:
+        print(f"FAIL: {total * 1e3:.1f}ms exceeds the {args.budget_ms:.0f}ms budget", file=sys.stderr)
+        failed = True
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Input validation in the JSON API: bad inputs are a 400 naming the field, never a silently wrong row.
+"""
+import asyncio
+import json
+from http import HTTPStatus
+
+import numpy as np
+import pytest
+
+from api import InferenceService, RequestError, _build_row, _content_length
+from utils import build_diabetes_features, build_heart_features
+
+DIABETES = {
+    "age": 50,
+    "hypertension_opt": "No",
+    "heart_disease_opt": "Yes",
+    "bmi": 27.5,
+    "hba1c": 6.1,
+    "glucose": 140,
+    "gender_opt": "Other",
+    "smoking_opt": "not current",
+}
+HEART = {
+    "age": 45,
+    "gender": "Female",
+    "height_cm": 165,
+    "weight_kg": 70.0,
+    "systolic_bp": 130,
+    "diastolic_bp": 85,
+    "cholesterol": 2,
+    "glucose": 1,
+    "smoke": True,
+    "alco": 0,
+    "active": 1,
+}
+
+
+def _bad_request(disease, **changes):
+    with pytest.raises(RequestError) as error:
+        _build_row(disease, {**(DIABETES if disease == "diabetes" else HEART), **changes})
+    assert error.value.status == HTTPStatus.BAD_REQUEST
+    return str(error.value)
+
+
+def test_valid_rows_match_the_app():
+    features, extra = _build_row("diabetes", DIABETES)
+    np.testing.assert_array_equal(features, build_diabetes_features(**DIABETES))
+    assert extra == {}
+    features, extra = _build_row("heart", HEART)
+    expected, bmi = build_heart_features(**{**HEART, "smoke": True, "alco": False, "active": True})
+    np.testing.assert_array_equal(features, expected)
+    assert extra == {"bmi": pytest.approx(bmi)}
+
+
+@pytest.mark.parametrize(
+    "field, value",
+    [
+        ("gender_opt", "Mle"),
+        ("gender_opt", "male"),
+        ("smoking_opt", "bogus"),
+        ("smoking_opt", None),
+        ("hypertension_opt", True),
+        ("heart_disease_opt", "yes"),
+    ],
+)
+def test_unknown_diabetes_choices_are_rejected(field, value):
+    assert field in _bad_request("diabetes", **{field: value})
+
+
+@pytest.mark.parametrize("field, value", [("gender", "Other"), ("gender", 1)])
+def test_unknown_heart_gender_is_rejected(field, value):
+    assert field in _bad_request("heart", **{field: value})
+
+
+@pytest.mark.parametrize("value", [2, -1, "yes", "1", 1.0, None])
+def test_heart_flags_must_be_booleans_or_zero_one(value):
+    assert "smoke" in _bad_request("heart", smoke=value)
+
+
+@pytest.mark.parametrize("value", ["abc", None, True, float("nan"), float("inf")])
+def test_numbers_must_be_finite(value):
+    assert "bmi" in _bad_request("diabetes", bmi=value)
+
+
+def test_missing_field_and_zero_height_are_bad_requests():
+    patient = dict(DIABETES)
+    del patient["gender_opt"]
+    with pytest.raises(RequestError):
+        _build_row("diabetes", patient)
+    _bad_request("heart", height_cm=0)
+
+
+@pytest.mark.parametrize("value", ["-1", "12abc", "1e3", " "])
+def test_content_length_must_be_a_non_negative_integer(value):
+    with pytest.raises(RequestError):
+        _content_length({"content-length": value})
+
+
+def test_route_answers_valid_and_rejects_invalid_heart_patients():
+    service = InferenceService(workers=1)
+    result = asyncio.run(service.route("POST", "/predict/heart", json.dumps(HEART).encode()))
+    assert result["prediction"] in (0, 1)
+    assert 0.0 <= result["probability"] <= 1.0
+    body = json.dumps({"patients": [HEART, {**HEART, "smoke": 3}]}).encode()
+    with pytest.raises(RequestError):
+        asyncio.run(service.route("POST", "/predict/heart/batch", body))
@@ -0,0 +1,74 @@
+"""
+The audit log: segments read back in order, failed writes are retried, and the retry backlog is bounded.
+"""
+import numpy as np
+import pytest
+
+import audit
+import metrics
+
+
+@pytest.fixture
+def log(tmp_path):
+    # A long max_delay keeps the writer thread out of the way; the tests flush explicitly
+    log = audit.AuditLog(tmp_path, max_delay=3600, max_retry_rows=25)
+    yield log
+    log._stop.set()
+    log._wake.set()
+    log._thread.join()
+
+
+def _record(log, rows, version="v1", disease="heart"):
+    features = np.arange(rows * 3, dtype=np.float64).reshape(rows, 3)
+    log.record(disease, version, features, np.full(rows, 0.25), np.zeros(rows, dtype=np.uint8), 0.001)
+
+
+def _fail_writes(monkeypatch):
+    def fail(*args, **kwargs):
+        raise OSError("No space left on device")
+    monkeypatch.setattr(audit, "write_segment", fail)
+
+
+def test_records_read_back_in_order(log, tmp_path):
+    _record(log, 4, "v1")
+    log.flush()
+    _record(log, 2, "v2")
+    assert log.flush() == 2
+    records = audit.read_audit("heart", tmp_path)
+    assert records["version"].tolist() == ["v1"] * 4 + ["v2"] * 2
+    assert records["features"].shape == (6, 3)
+    assert np.all(np.diff(records["timestamp"]) >= 0)
+    assert log.stats()["written"] == 6
+
+
+def test_failed_segments_are_retried_first(log, tmp_path, monkeypatch):
+    write_segment = audit.write_segment
+    _fail_writes(monkeypatch)
+    _record(log, 5, "v1")
+    assert log.flush() == 0
+    assert log.stats()["failed_rows"] == 5 and log.stats()["write_failures"] == 1
+
+    monkeypatch.setattr(audit, "write_segment", write_segment)
+    _record(log, 3, "v2")
+    assert log.flush() == 8
+    assert log.stats()["failed_rows"] == 0
+    assert audit.read_audit("heart", tmp_path)["version"].tolist() == ["v1"] * 5 + ["v2"] * 3
+
+
+def test_retry_backlog_is_capped_while_writes_keep_failing(log, monkeypatch):
+    _fail_writes(monkeypatch)
+    metrics.enable()
+    try:
+        for version in ("v1", "v2", "v3", "v4", "v5"):
+            _record(log, 10, version)
+            log.flush()
+        counters = metrics.get_metrics().summary()["counters"]
+    finally:
+        metrics.disable()
+        metrics.get_metrics().clear()
+    stats = log.stats()
+    # The newest 20 rows fit under the cap of 25; the oldest 30 were dropped
+    assert stats["failed_rows"] == 20
+    assert stats["dropped_rows"] == 30
+    assert [columns["version"][0] for _, columns in log._retry] == ["v4", "v5"]
+    assert counters["audit_rows_dropped"] == {"heart": 30}
@@ -0,0 +1,62 @@
+"""
+Bulk reports: one PDF per scored row, in input order, as a ZIP or one merged PDF.
+"""
+import io
+import zipfile
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+import bulk_reports
+from batch import score_frame
+from datastore import DATA_DIR
+from reports import pdf_available
+
+pytestmark = pytest.mark.skipif(not pdf_available(), reason="fpdf2 is not installed")
+
+ROWS = 10
+
+
+@pytest.fixture(scope="module")
+def scored():
+    frame = pd.read_csv(DATA_DIR / "cleaned_heart.csv", nrows=ROWS).drop(columns=["id", "bmi"])
+    frame["name"] = [f"Patient {chr(ord('A') + i)}" for i in range(ROWS)]
+    scored, _ = score_frame("heart", frame)
+    return scored
+
+
+def _reports(scored):
+    return bulk_reports.cohort_reports("heart", scored, name_column="name", generated_at=datetime(2024, 1, 2))
+
+
+def test_cohort_rows_become_report_arguments(scored):
+    reports = list(_reports(scored))
+    assert [report["patient_name"] for report in reports] == scored["name"].tolist()
+    for report, (_, row) in zip(reports, scored.iterrows()):
+        assert report["prediction_label"] == ("High Risk" if row["prediction"] == 1 else "Low Risk")
+        assert report["probability_percent"] == pytest.approx(row["probability"] * 100)
+        assert report["disease_name"] == "Heart Disease"
+
+
+def test_zip_holds_one_pdf_per_row_in_order(scored, tmp_path):
+    output = tmp_path / "reports.zip"
+    stats = bulk_reports.write_report_zip(_reports(scored), output, workers=2, chunk_size=3)
+    assert stats["reports"] == ROWS
+    with zipfile.ZipFile(output) as archive:
+        names = archive.namelist()
+        assert names == [
+            f"{i:06d}_Heart_Disease_Report_Patient_{chr(ord('A') + i)}.pdf" for i in range(ROWS)
+        ]
+        assert all(archive.read(name).startswith(b"%PDF") for name in names)
+
+
+@pytest.mark.skipif(bulk_reports.PdfReader is None, reason="pypdf is not installed")
+def test_merged_pdf_has_a_page_per_row(scored, tmp_path):
+    output = tmp_path / "reports.pdf"
+    stats = bulk_reports.write_merged_pdf(_reports(scored), output, workers=2, chunk_size=3)
+    assert stats["reports"] == ROWS
+    reader = bulk_reports.PdfReader(io.BytesIO(output.read_bytes()))
+    assert len(reader.pages) == ROWS
+    assert "Patient A" in reader.pages[0].extract_text()
+    assert f"Patient {chr(ord('A') + ROWS - 1)}" in reader.pages[-1].extract_text()
@@ -0,0 +1,81 @@
+"""
+The prediction cache: LRU and TTL bounds, and invalidation when the model version changes.
+"""
+import numpy as np
+import pytest
+
+import cache
+from cache import PredictionCache, cached_prediction, feature_key
+
+
+class _Registry:
+    def __init__(self):
+        self.versions = {"heart": "v1", "diabetes": "v1"}
+
+    def version(self, disease):
+        return self.versions[disease]
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    registry = _Registry()
+    monkeypatch.setattr(cache, "get_registry", lambda: registry)
+    monkeypatch.setattr(cache, "_cache", PredictionCache())
+    return registry
+
+
+def test_int_and_float_rows_share_a_key():
+    assert feature_key("heart", "v1", np.array([[1, 2, 3]])) == feature_key("heart", "v1", [[1.0, 2.0, 3.0]])
+    assert feature_key("heart", "v1", [[1.0, 2.0, 3.0]]) != feature_key("heart", "v2", [[1.0, 2.0, 3.0]])
+
+
+def test_least_recently_used_entries_are_evicted():
+    predictions = PredictionCache(max_entries=2)
+    keys = [feature_key("heart", "v1", [[float(i)]]) for i in range(3)]
+    predictions.put(keys[0], (0, 0.1))
+    predictions.put(keys[1], (0, 0.2))
+    assert predictions.get(keys[0]) == (0, 0.1)
+    predictions.put(keys[2], (1, 0.9))
+    assert predictions.get(keys[1]) is None
+    assert predictions.get(keys[0]) == (0, 0.1)
+    assert predictions.stats()["evictions"] == 1
+
+
+def test_entries_expire():
+    predictions = PredictionCache(ttl_seconds=0.0)
+    key = feature_key("heart", "v1", [[1.0]])
+    predictions.put(key, (0, 0.1))
+    assert predictions.get(key) is None
+    assert predictions.stats()["expirations"] == 1
+
+
+def test_a_new_version_drops_only_that_diseases_entries():
+    predictions = PredictionCache()
+    heart, diabetes = feature_key("heart", "v1", [[1.0]]), feature_key("diabetes", "v1", [[1.0]])
+    predictions.put(heart, (0, 0.1))
+    predictions.put(diabetes, (1, 0.8))
+    assert predictions.get(feature_key("heart", "v2", [[1.0]])) is None
+    assert predictions.stats()["invalidations"] == 1
+    # Going back to the old version does not bring the old answer back
+    assert predictions.get(heart) is None
+    assert predictions.get(diabetes) == (1, 0.8)
+
+
+def test_cached_prediction_recomputes_after_a_model_is_republished(registry):
+    calls = []
+
+    def predict():
+        calls.append(registry.versions["heart"])
+        return 1, 0.5 + 0.1 * len(calls)
+
+    row = np.ones((1, 13))
+    first = cached_prediction("heart", row, predict)
+    again = cached_prediction("heart", row, predict)
+    assert (first.probability, first.version) == (0.6, "v1") and first.scoring_seconds is not None
+    assert (again.probability, again.scoring_seconds) == (0.6, None)
+
+    registry.versions["heart"] = "v2"
+    republished = cached_prediction("heart", row, predict)
+    assert (republished.probability, republished.version) == (0.7, "v2")
+    assert republished.scoring_seconds is not None
+    assert calls == ["v1", "v2"]
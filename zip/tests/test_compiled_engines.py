@@ -0,0 +1,216 @@
+"""
+The compiled scoring engines against the sklearn model and scaler they were built from.
+
+The heart engine is built from the served pickles. The served diabetes
+forest is built by train.py and is not in the repository, so a small
+forest is fitted here on the bundled CSV instead.
+
+Rows come from the bundled CSVs, plus rows with missing (NaN) and
+out-of-range inputs. Batches of PER_TREE_MIN_ROWS rows or more take the
+forests' one-tree-at-a-time path, so both traversal paths are covered.
+"""
+import pickle
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.preprocessing import StandardScaler
+
+from compiled import FusedLinearModel, fuse_model
+from datastore import DATA_DIR
+from explain import forest_contributions
+from forest import LEAF_LEVELS, PER_TREE_MIN_ROWS, FlatForest, QuantizedForest
+from quantize import QUANTIZE_BOUNDS
+from utils import MODELS_DIR, build_diabetes_feature_matrix, build_heart_feature_matrix
+
+ROWS = 3000
+SEED = 0
+# Fixture forest: enough trees and depth to exercise every traversal path
+FIXTURE_ROWS = 20000
+FIXTURE_TREES = 25
+FIXTURE_DEPTH = 12
+# Fused engines only reorder float64 arithmetic
+EXACT = 1e-12
+# uint8 leaf probabilities are within half a step of the original
+QUANTIZED = 1 / (2 * LEAF_LEVELS)
+
+
+def _load(disease):
+    """Load the served model and scaler pickles."""
+    with open(MODELS_DIR / f"{disease}_model.pkl", "rb") as f:
+        model = pickle.load(f)
+    with open(MODELS_DIR / f"{disease}_scaler.pkl", "rb") as f:
+        scaler = pickle.load(f)
+    return model, scaler
+
+
+def _fit_diabetes():
+    """Fit a small scaler + forest like train.py's diabetes pipeline."""
+    frame = pd.read_csv(DATA_DIR / "diabetes.csv").sample(n=FIXTURE_ROWS, random_state=SEED + 1)
+    features = build_diabetes_feature_matrix(frame.reset_index(drop=True))
+    scaler = StandardScaler().fit(features)
+    model = RandomForestClassifier(
+        n_estimators=FIXTURE_TREES, max_depth=FIXTURE_DEPTH, random_state=SEED, n_jobs=1
+    )
+    model.fit(scaler.transform(features), frame["diabetes"].to_numpy())
+    return model, scaler
+
+
+def _sample(builder, path):
+    frame = pd.read_csv(path).sample(n=ROWS, random_state=SEED)
+    return builder(frame.reset_index(drop=True))
+
+
+def _out_of_range(features, columns, rng):
+    """Copy rows with the given columns pushed far below and above anything in the data."""
+    rows = features[:200].copy()
+    for column in columns:
+        span = np.ptp(features[:, column]) + 1
+        rows[::2, column] = features[:, column].min() - rng.uniform(1, 10, size=len(rows[::2])) * span
+        rows[1::2, column] = features[:, column].max() + rng.uniform(1, 10, size=len(rows[1::2])) * span
+    return rows
+
+
+def _missing(features, columns, rng):
+    """Copy rows with NaN in one, several or all of the given columns."""
+    rows = features[:300].copy()
+    for i in range(len(rows)):
+        chosen = rng.choice(columns, size=1 + i % len(columns), replace=False)
+        rows[i, chosen] = np.nan
+    return rows
+
+
+def _expected(model, scaler, features):
+    return model.predict_proba(scaler.transform(features))[:, 1]
+
+
+@pytest.fixture(scope="module")
+def heart():
+    model, scaler = _load("heart")
+    features = _sample(build_heart_feature_matrix, DATA_DIR / "cleaned_heart.csv")
+    return model, scaler, features
+
+
+@pytest.fixture(scope="module")
+def diabetes():
+    model, scaler = _fit_diabetes()
+    features = _sample(build_diabetes_feature_matrix, DATA_DIR / "diabetes.csv")
+    rng = np.random.default_rng(SEED)
+    # age, bmi, HbA1c_level, blood_glucose_level
+    continuous = [0, 3, 4, 5]
+    out_of_range = _out_of_range(features, continuous, rng)
+    missing = _missing(features, continuous, rng)
+    return model, scaler, features, out_of_range, missing
+
+
+@pytest.fixture(scope="module")
+def flat_forest(diabetes):
+    model, scaler = diabetes[:2]
+    return FlatForest.from_sklearn(model, scaler)
+
+
+def _assert_close(engine, model, scaler, features, tolerance):
+    expected = _expected(model, scaler, features)
+    # Small batches walk every tree at once, large ones one tree at a time
+    for rows in (features[:PER_TREE_MIN_ROWS - 1], features):
+        actual = engine.predict_proba(rows)[:, 1]
+        np.testing.assert_allclose(actual, expected[:len(rows)], rtol=0, atol=tolerance)
+
+
+def test_heart_model_fuses_to_linear(heart):
+    model, scaler, _ = heart
+    assert isinstance(fuse_model(model, scaler), FusedLinearModel)
+
+
+def test_fused_linear_matches_sklearn(heart):
+    model, scaler, features = heart
+    fused = fuse_model(model, scaler)
+    rows = np.vstack([features, _out_of_range(features, [1, 3, 4, 5, 6, 12], np.random.default_rng(SEED))])
+    expected = _expected(model, scaler, rows)
+    np.testing.assert_allclose(fused.predict_proba(rows)[:, 1], expected, rtol=0, atol=EXACT)
+    np.testing.assert_array_equal(fused.predict(rows), model.predict(scaler.transform(rows)))
+
+
+@pytest.mark.parametrize("value", [np.nan, np.inf])
+def test_fused_linear_rejects_non_finite_rows_like_sklearn(heart, value):
+    model, scaler, features = heart
+    rows = features[:5].copy()
+    rows[2, 5] = value
+    with pytest.raises(ValueError):
+        model.predict_proba(scaler.transform(rows))
+    with pytest.raises(ValueError):
+        fuse_model(model, scaler).predict_proba(rows)
+
+
+def test_diabetes_model_fuses_to_flat_forest(diabetes):
+    model, scaler = diabetes[:2]
+    assert isinstance(fuse_model(model, scaler), FlatForest)
+
+
+def test_flat_forest_matches_sklearn(diabetes, flat_forest):
+    model, scaler, features = diabetes[:3]
+    _assert_close(flat_forest, model, scaler, features, EXACT)
+
+
+def test_flat_forest_out_of_range_rows(diabetes, flat_forest):
+    model, scaler, _, out_of_range, _ = diabetes
+    _assert_close(flat_forest, model, scaler, out_of_range, EXACT)
+
+
+def test_flat_forest_routes_missing_values_like_sklearn(diabetes, flat_forest):
+    model, scaler, features, _, missing = diabetes
+    _assert_close(flat_forest, model, scaler, missing, EXACT)
+    # The one-tree-at-a-time path with missing values mixed into a large batch
+    rows = np.vstack([features, missing])
+    np.testing.assert_allclose(
+        flat_forest.predict_proba(rows)[:, 1], _expected(model, scaler, rows), rtol=0, atol=EXACT
+    )
+
+
+def test_flat_forest_round_trips_through_arrays(diabetes, flat_forest):
+    model, scaler, _, _, missing = diabetes
+    arrays, meta = flat_forest.to_arrays()
+    _assert_close(FlatForest.from_arrays(arrays, meta), model, scaler, missing, EXACT)
+
+
+@pytest.fixture(scope="module")
+def quantized(flat_forest):
+    return flat_forest.quantize(QUANTIZE_BOUNDS["diabetes"])
+
+
+def test_quantized_forest_matches_sklearn(diabetes, quantized):
+    model, scaler, features = diabetes[:3]
+    _assert_close(quantized, model, scaler, features, QUANTIZED)
+
+
+def test_quantized_forest_out_of_range_rows(diabetes, quantized):
+    # Rows are clipped to the quantization bounds; no split lies outside them
+    model, scaler, _, out_of_range, _ = diabetes
+    _assert_close(quantized, model, scaler, out_of_range, QUANTIZED)
+
+
+def test_quantized_forest_routes_missing_values_like_sklearn(diabetes, quantized):
+    model, scaler, features, _, missing = diabetes
+    _assert_close(quantized, model, scaler, missing, QUANTIZED)
+    rows = np.vstack([features, missing])
+    np.testing.assert_allclose(
+        quantized.predict_proba(rows)[:, 1], _expected(model, scaler, rows), rtol=0, atol=QUANTIZED
+    )
+
+
+def test_quantized_forest_round_trips_through_arrays(diabetes, quantized):
+    model, scaler, _, _, missing = diabetes
+    arrays, meta = quantized.to_arrays()
+    _assert_close(QuantizedForest.from_arrays(arrays, meta), model, scaler, missing, QUANTIZED)
+
+
+@pytest.mark.parametrize("engine", ["flat_forest", "quantized"])
+def test_forest_contributions_follow_missing_value_routing(diabetes, engine, request):
+    forest = request.getfixturevalue(engine)
+    _, _, features, _, missing = diabetes
+    rows = np.vstack([features[:50], missing[:50]])
+    contributions, base_values, probabilities = forest_contributions(forest, rows, block_rows=40)
+    expected = forest.predict_proba(rows)[:, 1]
+    np.testing.assert_allclose(probabilities, expected, rtol=0, atol=1e-12)
+    np.testing.assert_allclose(base_values + contributions.sum(axis=1), expected, rtol=0, atol=1e-9)
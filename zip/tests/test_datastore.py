@@ -0,0 +1,59 @@
+"""
+The dataset store: columns read back as cleaned, and datasets are rebuilt only when the source content changes.
+"""
+import os
+
+import pandas as pd
+import pytest
+
+import datastore
+
+
+@pytest.fixture
+def source(tmp_path, monkeypatch):
+    """A small diabetes CSV and an empty store, both under tmp_path."""
+    monkeypatch.setattr(datastore, "STORE_DIR", tmp_path / "store")
+    path = tmp_path / "diabetes.csv"
+    with open(datastore.DATA_DIR / "diabetes.csv") as f:
+        path.write_text("".join(next(f) for _ in range(501)))
+    return path
+
+
+def test_stored_frame_matches_cleaning_in_memory(source):
+    stored, digest = datastore.load_frame("diabetes", source=source)
+    cleaned, _ = datastore.load_frame("diabetes", source=source, build=False)
+    assert digest == datastore.file_sha256(source)
+    pd.testing.assert_frame_equal(
+        stored.astype({"gender": str, "smoking_history": str}),
+        cleaned.astype({"gender": str, "smoking_history": str}).reset_index(drop=True),
+        check_dtype=False,
+    )
+    # Columns are stored in their narrow dtypes
+    assert stored["blood_glucose_level"].dtype == "int16"
+
+
+def test_touched_source_is_not_rebuilt(source):
+    first = datastore.ensure_dataset("diabetes", source)
+    stat = source.stat()
+    os.utime(source, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    second = datastore.ensure_dataset("diabetes", source)
+    assert second["directory"] == first["directory"]
+    assert second["source_stamp"] != first["source_stamp"]
+    # The refreshed stamp was written, so the next check does not hash again
+    assert datastore.read_manifest("diabetes")["source_stamp"] == second["source_stamp"]
+
+
+def test_changed_source_is_rebuilt(source):
+    first = datastore.ensure_dataset("diabetes", source)
+    lines = source.read_text().splitlines(keepends=True)
+    source.write_text("".join(lines[:-100]))
+    second = datastore.ensure_dataset("diabetes", source)
+    assert second["directory"] != first["directory"]
+    assert second["rows"] < first["rows"]
+
+
+def test_read_only_loads_do_not_build_the_store(source):
+    frame, _ = datastore.load_frame("diabetes", source=source, build=False)
+    assert len(frame) > 0
+    assert datastore.read_manifest("diabetes") is None
+    assert datastore.stored_manifest("diabetes", source) is None
@@ -0,0 +1,57 @@
+"""
+Drift checks: the background thread keeps running when a reference cannot be loaded.
+"""
+import threading
+
+import pytest
+
+import drift
+
+
+@pytest.fixture
+def monitors(monkeypatch):
+    monkeypatch.setattr(drift, "_monitors", {})
+    monkeypatch.setattr(drift, "DriftMonitor", lambda disease, reference: (disease, reference))
+    monkeypatch.setattr(drift, "check", lambda min_rows: checked.set())
+    checked = threading.Event()
+    yield drift._monitors, checked
+    drift.disable()
+
+
+def test_failed_reference_loads_are_retried(monitors, monkeypatch):
+    started, checked = monitors
+    attempts = []
+
+    def load_reference(disease):
+        attempts.append(disease)
+        if disease == "heart" and attempts.count("heart") == 1:
+            raise OSError("models/drift is not writable")
+        return {"disease": disease}
+
+    monkeypatch.setattr(drift, "load_reference", load_reference)
+    stop = drift.start_drift_checks(interval=0.01)
+    try:
+        assert checked.wait(5)
+        # The diabetes monitor was started even though heart failed first
+        assert started["diabetes"] == ("diabetes", {"disease": "diabetes"})
+        # Missing references are retried before every check
+        assert started["heart"] == ("heart", {"disease": "heart"})
+    finally:
+        stop.set()
+    # Each reference is loaded once it has succeeded
+    assert attempts.count("diabetes") == 1 and attempts.count("heart") == 2
+
+
+def test_a_failing_reference_does_not_stop_the_checks(monitors, monkeypatch):
+    started, checked = monitors
+
+    def load_reference(disease):
+        raise ValueError("corrupt reference")
+
+    monkeypatch.setattr(drift, "load_reference", load_reference)
+    stop = drift.start_drift_checks(interval=0.01)
+    try:
+        assert checked.wait(5)
+    finally:
+        stop.set()
+    assert started == {}
@@ -0,0 +1,66 @@
+"""
+The micro-batcher: concurrent requests are scored together and each caller gets its own rows back.
+"""
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from datastore import DATA_DIR
+from microbatch import MicroBatcher
+from registry import get_registry
+from utils import build_heart_feature_matrix, predict_risk
+
+
+@pytest.fixture(scope="module")
+def features():
+    return build_heart_feature_matrix(pd.read_csv(DATA_DIR / "cleaned_heart.csv", nrows=64))
+
+
+def test_concurrent_requests_match_direct_scoring(features):
+    expected = predict_risk(get_registry().get_compiled("heart"), None, features)
+    # A long window so every request lands in the same batch
+    batcher = MicroBatcher("heart", window_seconds=1.0, max_batch_rows=len(features))
+    results = [None] * len(features)
+    barrier = threading.Barrier(len(features))
+
+    def request(i):
+        barrier.wait()
+        results[i] = batcher.predict(features[i], timeout=10)
+
+    threads = [threading.Thread(target=request, args=(i,)) for i in range(len(features))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    batcher.close()
+
+    assert [label for label, _ in results] == expected.labels.tolist()
+    np.testing.assert_allclose([p for _, p in results], expected.probabilities, rtol=0, atol=1e-12)
+    stats = batcher.stats()
+    assert stats["requests"] == stats["rows"] == len(features)
+    assert stats["batches"] < len(features)
+
+
+def test_batches_are_capped_at_max_batch_rows(features):
+    batcher = MicroBatcher("heart", window_seconds=1.0, max_batch_rows=8)
+    futures = [batcher.submit(features[i]) for i in range(20)]
+    for future in futures:
+        future.result(timeout=10)
+    batcher.close()
+    stats = batcher.stats()
+    assert stats["batches"] >= 3
+    assert max(stats["batch_size_histogram"]) <= 8
+
+
+def test_a_failing_model_fails_every_request_in_the_batch(features):
+    def broken():
+        raise RuntimeError("model unavailable")
+
+    batcher = MicroBatcher("heart", window_seconds=0.5, max_batch_rows=2, model_loader=broken)
+    futures = [batcher.submit(features[i]) for i in range(2)]
+    for future in futures:
+        with pytest.raises(RuntimeError, match="model unavailable"):
+            future.result(timeout=10)
+    batcher.close()
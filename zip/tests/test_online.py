@@ -0,0 +1,78 @@
+"""
+Online updates: a new version is only published when it scores at least as well as the served model.
+"""
+import os
+
+import pandas as pd
+import pytest
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+import online
+from datastore import DATA_DIR
+from registry import PUBLISH_LOCK_NAME
+
+
+@pytest.fixture
+def published(tmp_path, monkeypatch):
+    """Keep versions, state and the publish lock in tmp_path and record what would be published."""
+    calls = []
+
+    def publish_version(disease, version_dir):
+        calls.append((version_dir.name, _lock_is_held(tmp_path)))
+
+    def save_version(disease, model, scaler, metadata):
+        version_dir = tmp_path / "versions" / f"v{len(list(tmp_path.glob('versions/*'))) + 1}"
+        version_dir.mkdir(parents=True)
+        (version_dir / "metadata.json").write_text(pd.Series(metadata).to_json())
+        return version_dir
+
+    monkeypatch.setattr(online, "MODELS_DIR", tmp_path)
+    monkeypatch.setattr(online, "ONLINE_DIR", tmp_path / "online")
+    monkeypatch.setattr(online, "publish_version", publish_version)
+    monkeypatch.setattr(online, "save_version", save_version)
+    return calls
+
+
+def _lock_is_held(models_dir):
+    """Whether another open of the lock file would have to wait for it."""
+    if fcntl is None:
+        return True
+    fd = os.open(models_dir / PUBLISH_LOCK_NAME, os.O_RDWR)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_SH | fcntl.LOCK_NB)
+    except BlockingIOError:
+        return True
+    finally:
+        os.close(fd)
+    return False
+
+
+def _records(tmp_path, flip_labels=False, rows=5000):
+    frame = pd.read_csv(DATA_DIR / "cleaned_heart.csv", nrows=rows).drop(columns=["id", "bmi"])
+    if flip_labels:
+        frame["target"] = 1 - frame["target"]
+    path = tmp_path / "outcomes.csv"
+    frame.to_csv(path, index=False)
+    return path
+
+
+def test_an_update_that_scores_as_well_is_published_under_the_lock(tmp_path, published, monkeypatch):
+    monkeypatch.setattr(online, "holdout_roc_auc", lambda *args: 0.75)
+    rows_added, version_dir, was_published = online.update("heart", [_records(tmp_path)])
+    assert rows_added == 5000 and was_published
+    assert published == [(version_dir.name, True)]
+    assert not _lock_is_held(tmp_path)
+
+
+def test_an_update_that_scores_worse_is_saved_but_not_published(tmp_path, published):
+    rows_added, version_dir, was_published = online.update("heart", [_records(tmp_path, flip_labels=True)])
+    assert rows_added == 5000 and not was_published
+    assert published == []
+    metadata = pd.read_json(version_dir / "metadata.json", typ="series")
+    assert metadata["holdout_roc_auc"] < metadata["served_holdout_roc_auc"]
+    # Learning carries on from the held-back state
+    assert online.load_state("heart").rows_seen == 5000
@@ -0,0 +1,48 @@
+"""
+The worker pool: workers score on models rebuilt over one shared memory segment.
+"""
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import pool
+from datastore import DATA_DIR
+from registry import get_registry
+from utils import build_heart_feature_matrix, predict_risk
+
+
+@pytest.fixture(scope="module")
+def features():
+    return build_heart_feature_matrix(pd.read_csv(DATA_DIR / "cleaned_heart.csv", nrows=5000))
+
+
+def test_shared_arrays_rebuild_the_same_model(features, monkeypatch):
+    monkeypatch.setattr(pool, "_worker_models", {})
+    model = get_registry().get_compiled("heart")
+    segment, layout = pool._pack({"heart": model})
+    try:
+        pool._attach(segment.name, layout)
+        rebuilt = pool._worker_models["heart"]
+        np.testing.assert_array_equal(rebuilt.predict_proba(features), model.predict_proba(features))
+        pool._worker_segment.close()
+    finally:
+        segment.close()
+        segment.unlink()
+
+
+def test_split_batches_match_in_process_scoring(features):
+    expected = predict_risk(get_registry().get_compiled("heart"), None, features)
+    with pool.WorkerPool(diseases=["heart"], workers=2, start_method="spawn") as workers:
+        segment_name = workers._segment.name
+        # 5000 rows are split across both workers; one row goes to a single worker
+        result = workers.predict_risk("heart", features)
+        single = workers.predict_risk("heart", features[0])
+    np.testing.assert_array_equal(result.labels, expected.labels)
+    # Matrix products over a different number of rows may differ in the last bit
+    np.testing.assert_allclose(result.probabilities, expected.probabilities, rtol=0, atol=1e-12)
+    np.testing.assert_allclose(single.probabilities, expected.probabilities[:1], rtol=0, atol=1e-12)
+    # Closing the pool frees the segment
+    with pytest.raises(FileNotFoundError):
+        shared_memory.SharedMemory(name=segment_name)
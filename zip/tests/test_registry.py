@@ -0,0 +1,155 @@
+"""
+ModelRegistry versions, which key the prediction cache and decide when artifacts are reloaded.
+"""
+import os
+import pickle
+import shutil
+import threading
+
+import numpy as np
+import pytest
+
+import artifacts
+import compiled
+import registry
+import utils
+from artifacts import write_artifact
+from compiled import export_compiled
+from registry import ModelRegistry
+from utils import ArtifactLoadError
+
+SOURCES = ("heart_model.pkl", "heart_scaler.pkl")
+
+
+@pytest.fixture
+def models_dir(tmp_path, monkeypatch):
+    """A models directory holding a copy of the served heart pickles."""
+    for name in SOURCES:
+        shutil.copy(utils.MODELS_DIR / name, tmp_path / name)
+    for module in (utils, registry, artifacts, compiled):
+        monkeypatch.setattr(module, "MODELS_DIR", tmp_path)
+    return tmp_path
+
+
+def _loaded_from():
+    """Load the heart model with a fresh registry and return the name it was recorded under."""
+    fresh = ModelRegistry()
+    fresh.get_compiled("heart")
+    return [name for name in fresh.stats() if name not in SOURCES]
+
+
+def _touch(models_dir):
+    """Give the sources new mtimes without changing their contents, as a checkout or copy does."""
+    for name in SOURCES:
+        stat = (models_dir / name).stat()
+        os.utime(models_dir / name, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+
+def _change_scaler(models_dir):
+    with open(models_dir / "heart_scaler.pkl", "rb") as f:
+        scaler = pickle.load(f)
+    scaler.mean_ = scaler.mean_ + 1.0
+    with open(models_dir / "heart_scaler.pkl", "wb") as f:
+        pickle.dump(scaler, f)
+
+
+def test_array_artifact_is_used_after_mtimes_change(models_dir):
+    loader = ModelRegistry()
+    _, scaler = loader.get("heart")
+    write_artifact(
+        "heart", loader.get_compiled("heart"), scaler, loader.source_version("heart"), loader.source_stamp("heart")
+    )
+    assert _loaded_from()[0].startswith("heart_artifact/")
+    _touch(models_dir)
+    assert _loaded_from()[0].startswith("heart_artifact/")
+    _change_scaler(models_dir)
+    assert _loaded_from() == ["heart (fused in memory)"]
+
+
+def test_compiled_pickle_is_used_after_mtimes_change(models_dir):
+    loader = ModelRegistry()
+    model, scaler = loader.get("heart")
+    export_compiled("heart", model, scaler, loader.source_version("heart"), loader.source_stamp("heart"))
+    assert _loaded_from() == ["heart_compiled.pkl"]
+    _touch(models_dir)
+    assert _loaded_from() == ["heart_compiled.pkl"]
+    _change_scaler(models_dir)
+    assert _loaded_from() == ["heart (fused in memory)"]
+
+
+def test_source_version_is_a_content_hash(models_dir):
+    before = ModelRegistry()
+    version, stamp = before.source_version("heart"), before.source_stamp("heart")
+    _touch(models_dir)
+    after = ModelRegistry()
+    assert after.source_version("heart") == version
+    assert after.source_stamp("heart") != stamp
+    # Any change to the files still changes the cache version
+    assert after.version("heart") != before.version("heart")
+
+
+def test_version_changes_when_a_model_is_republished(models_dir):
+    watcher = ModelRegistry(check_interval=0.0)
+    first = watcher.get_compiled("heart")
+    version = watcher.version("heart")
+    _change_scaler(models_dir)
+    assert watcher.version("heart") != version
+    second = watcher.get_compiled("heart")
+    assert second is not first
+    rows = np.ones((1, 13))
+    assert second.predict_proba(rows)[0, 1] != first.predict_proba(rows)[0, 1]
+
+
+def _version_in_thread(registry, disease):
+    versions = []
+    thread = threading.Thread(target=lambda: versions.append(registry.version(disease)), daemon=True)
+    thread.start()
+    thread.join(timeout=5)
+    return versions
+
+
+@pytest.mark.parametrize("check_interval", [60.0, 0.0])
+def test_version_does_not_wait_for_a_load_in_progress(check_interval):
+    registry = ModelRegistry(check_interval=check_interval)
+    registry.get_compiled("heart")
+    expected = registry.version("heart")
+    # A cold load or fuse on another thread holds the disease's lock throughout
+    with registry._locks["heart"]:
+        assert _version_in_thread(registry, "heart") == [expected]
+
+
+def test_version_before_any_load():
+    assert ModelRegistry().version("heart") == ModelRegistry().version("heart")
+
+
+def test_version_rejects_unknown_diseases():
+    with pytest.raises(ArtifactLoadError):
+        ModelRegistry().version("flu")
+
+
+def test_stats_report_memory_and_file_sizes(models_dir):
+    loader = ModelRegistry()
+    model, _ = loader.get("heart")
+    fused = loader.get_compiled("heart")
+    stats = loader.stats()
+    assert stats["heart_model.pkl"]["file_bytes"] == (models_dir / "heart_model.pkl").stat().st_size
+    assert stats["heart_model.pkl"]["memory_bytes"] >= model.coef_.nbytes + model.intercept_.nbytes
+    arrays, _ = fused.to_arrays()
+    assert stats["heart (fused in memory)"]["memory_bytes"] == sum(array.nbytes for array in arrays.values())
+    assert stats["heart (fused in memory)"]["file_bytes"] is None
+
+
+def test_failed_export_keeps_the_previous_compiled_pickle(models_dir, monkeypatch):
+    loader = ModelRegistry()
+    model, scaler = loader.get("heart")
+    path = export_compiled("heart", model, scaler, loader.source_version("heart"))
+    before = path.read_bytes()
+
+    def fail(*args, **kwargs):
+        raise OSError("No space left on device")
+
+    monkeypatch.setattr(compiled.pickle, "dump", fail)
+    with pytest.raises(OSError):
+        export_compiled("heart", model, scaler, "another-version")
+    assert path.read_bytes() == before
+    assert list(models_dir.glob(".*.tmp-*")) == []
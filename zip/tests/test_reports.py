@@ -0,0 +1,56 @@
+"""
+PDF reports: rendered per call, and only when a deferred report is actually downloaded.
+"""
+import re
+from datetime import datetime
+
+import pytest
+
+import reports
+from registry import get_registry
+from utils import build_heart_features
+from whatif import risk_curves
+
+pytestmark = pytest.mark.skipif(not reports.pdf_available(), reason="fpdf2 is not installed")
+
+REPORT = {
+    "disease_name": "Heart Disease",
+    "patient_name": "Test Patient",
+    "inputs": {"Age": 45, "Gender": "Female", "BMI": "25.7"},
+    "prediction_label": "High Risk",
+    "probability_percent": 71.5,
+    "generated_at": datetime(2024, 1, 2, 3, 4),
+}
+
+
+def _content(document):
+    """The document without its creation time and the file ID derived from it."""
+    return re.sub(rb"/(CreationDate|ID) [^\n]*", b"", document)
+
+
+def test_report_is_a_single_page_pdf():
+    document = reports.build_pdf_report(**REPORT)
+    assert document.startswith(b"%PDF")
+    assert b"/Count 1" in document
+
+
+def test_reports_are_independent_of_each_other():
+    first = _content(reports.build_pdf_report(**REPORT))
+    reports.build_pdf_report(**{**REPORT, "patient_name": "Someone Else", "factors": [("Age", 0.2)]})
+    assert _content(reports.build_pdf_report(**REPORT)) == first
+
+
+def test_what_if_charts_are_drawn():
+    features, _ = build_heart_features(45, "Female", 165, 70.0, 130, 85, 2, 1, False, False, True)
+    curves = risk_curves(get_registry().get_compiled("heart"), "heart", features)
+    document = reports.build_pdf_report(**REPORT, curves=curves)
+    assert len(document) > len(reports.build_pdf_report(**REPORT))
+
+
+def test_deferred_report_renders_only_when_called(monkeypatch):
+    calls = []
+    monkeypatch.setattr(reports, "build_pdf_report", lambda **report: calls.append(report) or b"%PDF")
+    render = reports.deferred_pdf_report(**REPORT)
+    assert calls == []
+    assert render() == b"%PDF"
+    assert calls == [REPORT]
@@ -0,0 +1,70 @@
+"""
+Shadow scoring: candidates score copies of live requests in a worker process, never in the serving one.
+"""
+import shutil
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import shadow
+from datastore import DATA_DIR
+from registry import get_registry
+from utils import MODELS_DIR, build_heart_feature_matrix, predict_risk
+
+
+@pytest.fixture(scope="module")
+def candidate(tmp_path_factory):
+    """A candidate directory holding a copy of the served heart model."""
+    path = tmp_path_factory.mktemp("versions") / "copy-of-served"
+    path.mkdir()
+    for name in ("heart_model.pkl", "heart_scaler.pkl"):
+        shutil.copy(MODELS_DIR / name, path / name)
+    return path
+
+
+@pytest.fixture(scope="module")
+def requests():
+    features = build_heart_feature_matrix(pd.read_csv(DATA_DIR / "cleaned_heart.csv", nrows=200))
+    probabilities = predict_risk(get_registry().get_compiled("heart"), None, features).probabilities
+    return features, probabilities
+
+
+def test_candidates_score_in_a_worker_process(candidate, tmp_path, requests):
+    features, probabilities = requests
+    scorer = shadow.ShadowScorer("heart", [candidate, tmp_path / "missing"], max_queue=len(features))
+    for row, probability in zip(features, probabilities):
+        scorer.submit(row, probability, seconds=1e-5)
+    scorer.stop()
+
+    report = scorer.report()
+    assert report["submitted"] == len(features) and report["dropped"] == 0
+    assert report["primary"]["latency"]["calls"] == len(features)
+    # The missing candidate is skipped; the copy agrees with the served model
+    assert list(report["candidates"]) == [candidate.name]
+    stats = report["candidates"][candidate.name]
+    assert stats["rows"] == len(features) and stats["errors"] == 0
+    assert stats["agreement_rate"] == 1.0
+    assert stats["max_abs_delta"] < 1e-9
+    # Nothing was loaded into this process
+    assert shadow._worker_candidates == {}
+
+
+def test_requests_are_dropped_when_the_queue_is_full(candidate, requests):
+    features, probabilities = requests
+    # Nothing is drained until the worker process has started and loaded the candidate
+    scorer = shadow.ShadowScorer("heart", [candidate], max_queue=2)
+    for row, probability in zip(features[:10], probabilities[:10]):
+        scorer.submit(row, probability)
+    scorer.stop()
+    report = scorer.report()
+    assert report["submitted"] + report["dropped"] == 10
+    assert report["dropped"] > 0
+    assert report["candidates"][candidate.name]["rows"] == report["submitted"]
+
+
+def test_worker_score_reports_candidate_errors(monkeypatch):
+    broken = shadow.Candidate("broken", "heart", object())
+    monkeypatch.setitem(shadow._worker_candidates, "broken", broken)
+    probabilities, seconds, error = shadow._worker_score(np.zeros((1, 13)), 0.5)["broken"]
+    assert probabilities is None and seconds is None and error
@@ -0,0 +1,222 @@
+import argparse
+import json
+import pickle
+import platform
+import shutil
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+import sklearn
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.linear_model import LogisticRegression
+from sklearn.metrics import accuracy_score, roc_auc_score
+from sklearn.model_selection import GridSearchCV, StratifiedKFold, train_test_split
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+
+from datastore import DATASETS, load_frame
+from utils import MODELS_DIR, atomic_write, build_diabetes_feature_matrix, build_heart_feature_matrix
+
+
+VERSIONS_DIR = MODELS_DIR / "versions"
+DEFAULT_SEED = 42
+DEFAULT_CV_FOLDS = 5
+TEST_SIZE = 0.2
+
+
+# Per disease: target column, feature builder, estimator and search grid.
+# The grids bracket the settings the notebooks arrived at by hand.
+TRAINING_SPECS = {
+    "diabetes": {
+        "target": "diabetes",
+        "features": build_diabetes_feature_matrix,
+        "estimator": lambda seed: RandomForestClassifier(random_state=seed, n_jobs=1),
+        "param_grid": {
+            "model__n_estimators": [300],
+            "model__max_depth": [10, 15],
+            "model__min_samples_leaf": [1, 2],
+        },
+    },
+    "heart": {
+        "target": "target",
+        "features": build_heart_feature_matrix,
+        "estimator": lambda seed: LogisticRegression(max_iter=1000, random_state=seed),
+        "param_grid": {
+            "model__C": [0.01, 0.1, 1.0, 10.0],
+        },
+    },
+}
+
+
+def train(disease, source=None, seed=DEFAULT_SEED, cv_folds=DEFAULT_CV_FOLDS, n_jobs=-1, param_grid=None):
+    """
+    Search hyperparameters and fit one disease's model on its cleaned dataset.
+
+    The scaler is part of the searched pipeline, so every cross-validation
+    fold fits its own scaler on its own training rows. Folds and candidates
+    run in parallel worker processes (n_jobs=-1 uses every core). Features
+    come from the same matrix builders the app uses, so a trained model sees
+    exactly the columns it will be scored on.
+
+    Returns:
+        tuple: (model, scaler, metadata)
+    """
+    spec = TRAINING_SPECS[disease]
+    start = time.perf_counter()
+    frame, source_hash = load_frame(disease, source=source)
+    load_seconds = time.perf_counter() - start
+
+    features = spec["features"](frame)
+    target = frame[spec["target"]].to_numpy()
+    x_train, x_test, y_train, y_test = train_test_split(
+        features, target, test_size=TEST_SIZE, random_state=seed, stratify=target
+    )
+
+    pipeline = Pipeline([("scaler", StandardScaler()), ("model", spec["estimator"](seed))])
+    search = GridSearchCV(
+        pipeline,
+        param_grid or spec["param_grid"],
+        scoring="roc_auc",
+        cv=StratifiedKFold(n_splits=cv_folds, shuffle=True, random_state=seed),
+        n_jobs=n_jobs,
+        refit=True,
+    )
+    search.fit(x_train, y_train)
+    best = search.best_estimator_
+
+    probabilities = best.predict_proba(x_test)[:, 1]
+    metadata = {
+        "disease": disease,
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "source": str(source or DATASETS[disease]["source"]),
+        "source_sha256": source_hash,
+        "rows": len(frame),
+        "seed": seed,
+        "cv_folds": cv_folds,
+        "candidates": len(search.cv_results_["params"]),
+        "best_params": {name.split("__", 1)[1]: value for name, value in search.best_params_.items()},
+        "cv_roc_auc": float(search.best_score_),
+        "test_accuracy": float(accuracy_score(y_test, best.predict(x_test))),
+        "test_roc_auc": float(roc_auc_score(y_test, probabilities)),
+        "load_seconds": load_seconds,
+        "train_seconds": time.perf_counter() - start - load_seconds,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "sklearn": sklearn.__version__,
+    }
+    return best.named_steps["model"], best.named_steps["scaler"], metadata
+
+
+def _dump_pickle(obj, path):
+    with atomic_write(path, "wb") as f:
+        pickle.dump(obj, f)
+
+
+def _load_pickle(path):
+    with open(path, "rb") as f:
+        return pickle.load(f)
+
+
+def save_version(disease, model, scaler, metadata):
+    """
+    Write a trained model, its scaler and metadata.json to models/versions/<disease>/<version>.
+
+    The version is the training timestamp plus the first 8 hex digits of the
+    source data hash.
+
+    Returns:
+        Path: The version directory
+    """
+    stamp = datetime.fromisoformat(metadata["created_at"]).strftime("%Y%m%d-%H%M%S")
+    version = f"{stamp}-{metadata['source_sha256'][:8]}"
+    version_dir = VERSIONS_DIR / disease / version
+    version_dir.mkdir(parents=True, exist_ok=True)
+    _dump_pickle(model, version_dir / f"{disease}_model.pkl")
+    _dump_pickle(scaler, version_dir / f"{disease}_scaler.pkl")
+    with open(version_dir / "metadata.json", "w") as f:
+        json.dump(dict(metadata, version=version), f, indent=2)
+    return version_dir
+
+
+def publish_version(disease, version_dir):
+    """
+    Make a saved version the one the app serves.
+
+    The model and scaler pickles are copied next to the other artifacts and
+    both renamed into place under the publish lock, so the registry's
+    file-stamp check picks up the new pair together on its next look.
+
+    If array artifacts were deployed, the new model is fused before anything
+    is swapped, and the artifact is rebuilt from it afterwards. A quantized
+    forest is quantized again (see quantize.py) when the new model is still
+    a random forest. Any other array model, such as the logistic model from
+    online.py --bootstrap, gets a plain array artifact of its own kind. A
+    model that cannot be stored as arrays leaves the old artifact in place,
+    and the registry ignores it because its source version no longer matches.
+    """
+    from artifacts import read_manifest, write_artifact
+    from compiled import ARRAY_MODEL_TYPES, fuse_model
+    from forest import FlatForest
+    from registry import get_registry, publish_lock
+
+    names = (f"{disease}_model.pkl", f"{disease}_scaler.pkl")
+    manifest = read_manifest(disease)
+    compiled = None
+    if manifest is not None:
+        model, scaler = (_load_pickle(version_dir / name) for name in names)
+        compiled = fuse_model(model, scaler)
+        if not isinstance(compiled, tuple(ARRAY_MODEL_TYPES.values())):
+            compiled = None
+        requantize = manifest["kind"] == "quantized_forest" and isinstance(compiled, FlatForest)
+
+    with publish_lock(MODELS_DIR, exclusive=True):
+        for name in names:
+            with open(version_dir / name, "rb") as source, atomic_write(MODELS_DIR / name, "wb") as f:
+                shutil.copyfileobj(source, f)
+
+    if compiled is None:
+        return
+    registry = get_registry()
+    registry.clear()
+    if requantize:
+        from quantize import quantize_disease
+
+        quantize_disease(disease)
+        return
+    write_artifact(disease, compiled, scaler, registry.source_version(disease), registry.source_stamp(disease))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Clean data, search hyperparameters and train the models.")
+    parser.add_argument("diseases", nargs="*", help="Defaults to every disease")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--cv", type=int, default=DEFAULT_CV_FOLDS, help="Cross-validation folds")
+    parser.add_argument("--jobs", type=int, default=-1, help="Parallel fits; -1 uses every core")
+    parser.add_argument("--publish", action="store_true", help="Serve the new models once trained")
+    args = parser.parse_args(argv)
+    unknown = set(args.diseases) - set(TRAINING_SPECS)
+    if unknown:
+        parser.error(f"unknown disease(s): {', '.join(sorted(unknown))}")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    for disease in args.diseases or sorted(TRAINING_SPECS):
+        model, scaler, metadata = train(disease, seed=args.seed, cv_folds=args.cv, n_jobs=args.jobs)
+        version_dir = save_version(disease, model, scaler, metadata)
+        print(
+            f"{disease}: {metadata['best_params']} cv_roc_auc={metadata['cv_roc_auc']:.4f} "
+            f"test_roc_auc={metadata['test_roc_auc']:.4f} test_accuracy={metadata['test_accuracy']:.4f} "
+            f"({metadata['train_seconds']:.1f}s) -> {version_dir}",
+            file=sys.stderr,
+        )
+        if args.publish:
+            publish_version(disease, version_dir)
+            print(f"{disease}: published {version_dir.name}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
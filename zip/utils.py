@@ -1,8 +1,68 @@
+import hashlib
+import os
 import pickle
+import shutil
+import tempfile
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
 from pathlib import Path
 import numpy as np
-import pandas as pd
-from sklearn.preprocessing import StandardScaler
+
+from metrics import stage_timer, timed
+
+
+MODELS_DIR = Path(__file__).parent / "models"
+
+# Probabilities strictly above this are labelled high risk, matching model.predict()
+DEFAULT_THRESHOLD = 0.5
+
+RiskResult = namedtuple("RiskResult", ["labels", "probabilities"])
+
+# Raw input columns, as found in diabetes.csv and cleaned_heart.csv
+DIABETES_RAW_COLUMNS = [
+    "gender",
+    "age",
+    "hypertension",
+    "heart_disease",
+    "smoking_history",
+    "bmi",
+    "HbA1c_level",
+    "blood_glucose_level",
+]
+HEART_RAW_COLUMNS = [
+    "age",
+    "gender",
+    "height",
+    "weight",
+    "systolic_bp",
+    "diastolic_bp",
+    "cholesterol",
+    "gluc",
+    "smoke",
+    "alco",
+    "active",
+]
+SMOKING_CATEGORIES = ["current", "ever", "former", "never", "not current"]
+
+# Choices offered for the categorical inputs, in the app's display order
+DIABETES_GENDER_OPTIONS = ["Female", "Male", "Other"]
+SMOKING_OPTIONS = ["never", "former", "ever", "current", "not current"]
+YES_NO_OPTIONS = ["No", "Yes"]
+HEART_GENDER_OPTIONS = ["Male", "Female"]
+
+# (lower, upper) per diabetes feature, in build_diabetes_features order. The
+# app's input ranges, widened to cover diabetes.csv (ages from 0.08, BMI up
+# to 95.7) so cohort rows are not clipped by a quantized model.
+DIABETES_FEATURE_BOUNDS = [
+    (0.0, 120.0),  # age
+    (0.0, 1.0),  # hypertension
+    (0.0, 1.0),  # heart_disease
+    (10.0, 100.0),  # bmi
+    (3.0, 15.0),  # HbA1c
+    (50.0, 300.0),  # blood glucose
+] + [(0.0, 1.0)] * 7  # gender and smoking one-hot columns
 
 
 class ArtifactLoadError(Exception):
@@ -10,9 +70,108 @@ class ArtifactLoadError(Exception):
     pass
 
 
+def file_sha256(path, block_size=1 << 20):
+    """Return the SHA-256 hex digest of a file's contents, read in blocks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# File inside a versioned directory naming its current version (see publish_dir)
+POINTER_NAME = "CURRENT"
+# Superseded versions are kept this long for readers that resolved the pointer just before
+RETIRE_SECONDS = 60.0
+
+
+@contextmanager
+def atomic_write(path, mode="w"):
+    """
+    Write a file under a temporary name and move it over path when the block ends.
+
+    Readers see either the old file or the complete new one. If the block
+    raises, the temporary file is removed and path is left as it was.
+
+    Args:
+        path: File to replace
+        mode: Mode to open the temporary file with, "w" or "wb"
+
+    Yields:
+        The open temporary file
+    """
+    path = Path(path)
+    tmp_path = path.with_name(f".{path.name}.tmp-{os.getpid()}-{threading.get_ident()}")
+    try:
+        with open(tmp_path, mode) as f:
+            yield f
+        os.replace(tmp_path, path)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+
+def current_dir(root):
+    """Return the version directory a versioned directory's pointer names, or None if none is published."""
+    try:
+        name = (Path(root) / POINTER_NAME).read_text().strip()
+    except FileNotFoundError:
+        return None
+    return Path(root) / name
+
+
+@contextmanager
+def publish_dir(root):
+    """
+    Build a new version of a versioned directory and publish it when the block ends.
+
+    The block fills a hidden staging directory under root. On success it is
+    renamed to a new version name and root's pointer file is atomically
+    replaced to name it, so a reader that resolves the pointer with
+    current_dir() always finds a complete version and there is never a
+    moment without one. A version is removed by a later publish once it has
+    been superseded for RETIRE_SECONDS, so readers that resolved the pointer
+    just before it moved can still open their files. If the block raises,
+    the staging directory is removed and nothing changes.
+
+    Yields:
+        Path: The staging directory to write into
+    """
+    root = Path(root)
+    root.mkdir(parents=True, exist_ok=True)
+    staged = Path(tempfile.mkdtemp(prefix=".tmp-", dir=root))
+    try:
+        yield staged
+        previous = current_dir(root)
+        version = root / f"{time.strftime('%Y%m%d-%H%M%S')}-{staged.name[len('.tmp-'):]}"
+        staged.rename(version)
+    except BaseException:
+        shutil.rmtree(staged, ignore_errors=True)
+        raise
+    with atomic_write(root / POINTER_NAME) as f:
+        f.write(version.name)
+    # A version's mtime is when it was superseded
+    if previous is not None and previous != root and previous.is_dir():
+        os.utime(previous)
+    cutoff = time.time() - RETIRE_SECONDS
+    for child in root.iterdir():
+        # Hidden entries are other writers' staging directories and temporary files
+        if child.name in (POINTER_NAME, version.name) or child.name.startswith("."):
+            continue
+        try:
+            if child.stat().st_mtime >= cutoff:
+                continue
+        except FileNotFoundError:
+            continue
+        if child.is_dir():
+            shutil.rmtree(child, ignore_errors=True)
+        else:
+            child.unlink(missing_ok=True)
+
+
 def load_diabetes_model():
     """Load the diabetes prediction model from pickle file."""
-    model_path = Path(__file__).parent / "models" / "diabetes_model.pkl"
+    model_path = MODELS_DIR / "diabetes_model.pkl"
     try:
         with open(model_path, "rb") as f:
             return pickle.load(f)
@@ -24,7 +183,7 @@ def load_diabetes_model():
 
 def load_diabetes_scaler():
     """Load the diabetes scaler from pickle file."""
-    scaler_path = Path(__file__).parent / "models" / "diabetes_scaler.pkl"
+    scaler_path = MODELS_DIR / "diabetes_scaler.pkl"
     try:
         with open(scaler_path, "rb") as f:
             return pickle.load(f)
@@ -36,7 +195,7 @@ def load_diabetes_scaler():
 
 def load_heart_model():
     """Load the heart disease prediction model from pickle file."""
-    model_path = Path(__file__).parent / "models" / "heart_model.pkl"
+    model_path = MODELS_DIR / "heart_model.pkl"
     try:
         with open(model_path, "rb") as f:
             return pickle.load(f)
@@ -48,7 +207,7 @@ def load_heart_model():
 
 def load_heart_scaler():
     """Load the heart scaler from pickle file."""
-    scaler_path = Path(__file__).parent / "models" / "heart_scaler.pkl"
+    scaler_path = MODELS_DIR / "heart_scaler.pkl"
     try:
         with open(scaler_path, "rb") as f:
             return pickle.load(f)
@@ -58,6 +217,36 @@ def load_heart_scaler():
         raise ArtifactLoadError(f"Failed to load heart scaler: {e}")
 
 
+def predict_risk(model, scaler, features, threshold=DEFAULT_THRESHOLD):
+    """
+    Score a batch of feature rows with a single scaler and predict_proba call.
+    
+    The label is derived from the positive-class probability instead of a
+    second model.predict call, so tree ensembles are only walked once.
+    
+    Args:
+        model: Loaded classifier exposing predict_proba
+        scaler: Loaded scaler matching the model, or None for a compiled model
+            that already has the scaler fused in
+        features: Feature array of shape (n_rows, n_features)
+        threshold: Probability above which a row is labelled 1
+    
+    Returns:
+        RiskResult: (labels, probabilities) arrays of length n_rows
+    """
+    if scaler is None:
+        scaled_features = features
+    else:
+        with stage_timer("scaler_transform"):
+            scaled_features = scaler.transform(features)
+    with stage_timer("predict_proba"):
+        probabilities = model.predict_proba(scaled_features)[:, 1]
+    labels = (probabilities > threshold).astype(np.int8)
+    
+    return RiskResult(labels, probabilities)
+
+
+@timed("build_diabetes_features")
 def build_diabetes_features(
     age,
     hypertension_opt,
@@ -109,25 +298,25 @@ def build_diabetes_features(
     return features
 
 
-def predict_diabetes(model, scaler, features):
+def predict_diabetes(model, scaler, features, threshold=DEFAULT_THRESHOLD):
     """
     Predict diabetes risk using the loaded model and scaler.
     
     Args:
         model: Loaded diabetes model
-        scaler: Loaded diabetes scaler
+        scaler: Loaded diabetes scaler, or None for a compiled model
         features: Feature array from build_diabetes_features()
+        threshold: Probability above which the prediction is 1
     
     Returns:
         tuple: (prediction, probability) where prediction is 0 or 1 and probability is float [0, 1]
     """
-    scaled_features = scaler.transform(features)
-    prediction = model.predict(scaled_features)[0]
-    probability = model.predict_proba(scaled_features)[0][1]
+    result = predict_risk(model, scaler, features, threshold=threshold)
     
-    return int(prediction), float(probability)
+    return int(result.labels[0]), float(result.probabilities[0])
 
 
+@timed("build_heart_features")
 def build_heart_features(
     age,
     gender,
@@ -177,20 +366,92 @@ def build_heart_features(
     return features, bmi
 
 
-def predict_heart(model, scaler, features):
+def _flag_column(values):
+    """Convert a column of 0/1 numbers or "Yes"/"No" strings to 0/1 floats."""
+    values = np.asarray(values)
+    if values.dtype.kind in "OUS":
+        return (values == "Yes").astype(np.float64)
+    return values.astype(np.float64)
+
+
+@timed("build_diabetes_feature_matrix")
+def build_diabetes_feature_matrix(frame):
+    """
+    Build the diabetes feature matrix for a whole table at once.
+    
+    Args:
+        frame: DataFrame with the DIABETES_RAW_COLUMNS of diabetes.csv
+    
+    Returns:
+        np.ndarray: Feature array with shape (n_rows, 13), same column order as build_diabetes_features()
+    """
+    gender = frame["gender"].to_numpy()
+    smoking = frame["smoking_history"].to_numpy()
+    
+    features = np.empty((len(frame), 13), dtype=np.float64)
+    features[:, 0] = frame["age"].to_numpy(dtype=np.float64)
+    features[:, 1] = _flag_column(frame["hypertension"])
+    features[:, 2] = _flag_column(frame["heart_disease"])
+    features[:, 3] = frame["bmi"].to_numpy(dtype=np.float64)
+    features[:, 4] = frame["HbA1c_level"].to_numpy(dtype=np.float64)
+    features[:, 5] = frame["blood_glucose_level"].to_numpy(dtype=np.float64)
+    features[:, 6] = gender == "Male"
+    features[:, 7] = gender == "Other"
+    for offset, category in enumerate(SMOKING_CATEGORIES):
+        features[:, 8 + offset] = smoking == category
+    
+    return features
+
+
+@timed("build_heart_feature_matrix")
+def build_heart_feature_matrix(frame):
+    """
+    Build the heart disease feature matrix for a whole table at once.
+    
+    Args:
+        frame: DataFrame with the HEART_RAW_COLUMNS of cleaned_heart.csv; gender may be
+            1/2 or "Male"/"Female"
+    
+    Returns:
+        np.ndarray: Feature array with shape (n_rows, 13), same column order as build_heart_features()
+    """
+    gender = frame["gender"].to_numpy()
+    if gender.dtype.kind in "OUS":
+        gender = np.where(gender == "Male", 1.0, 2.0)
+    height_cm = frame["height"].to_numpy(dtype=np.float64)
+    weight_kg = frame["weight"].to_numpy(dtype=np.float64)
+    
+    features = np.empty((len(frame), 13), dtype=np.float64)
+    features[:, 0] = 0  # id placeholder
+    features[:, 1] = frame["age"].to_numpy(dtype=np.float64)
+    features[:, 2] = gender
+    features[:, 3] = height_cm
+    features[:, 4] = weight_kg
+    features[:, 5] = frame["systolic_bp"].to_numpy(dtype=np.float64)
+    features[:, 6] = frame["diastolic_bp"].to_numpy(dtype=np.float64)
+    features[:, 7] = frame["cholesterol"].to_numpy(dtype=np.float64)
+    features[:, 8] = frame["gluc"].to_numpy(dtype=np.float64)
+    features[:, 9] = _flag_column(frame["smoke"])
+    features[:, 10] = _flag_column(frame["alco"])
+    features[:, 11] = _flag_column(frame["active"])
+    features[:, 12] = weight_kg / (height_cm / 100) ** 2
+    
+    return features
+
+
+def predict_heart(model, scaler, features, threshold=DEFAULT_THRESHOLD):
     """
     Predict heart disease risk using the loaded model and scaler.
     
     Args:
         model: Loaded heart disease model
-        scaler: Loaded heart disease scaler
+        scaler: Loaded heart disease scaler, or None for a compiled model
         features: Feature array from build_heart_features()
+        threshold: Probability above which the prediction is 1
     
     Returns:
         tuple: (prediction, probability) where prediction is 0 or 1 and probability is float [0, 1]
     """
-    scaled_features = scaler.transform(features)
-    prediction = model.predict(scaled_features)[0]
-    probability = model.predict_proba(scaled_features)[0][1]
+    result = predict_risk(model, scaler, features, threshold=threshold)
     
-    return int(prediction), float(probability)
+    return int(result.labels[0]), float(result.probabilities[0])
@@ -0,0 +1,100 @@
+from collections import namedtuple
+
+import numpy as np
+
+from metrics import stage_timer
+from utils import predict_risk
+
+
+# Points per curve; every curve of a disease is scored in one model call
+DEFAULT_POINTS = 49
+
+Curve = namedtuple("Curve", ["name", "label", "values", "probabilities", "current_value", "current_probability"])
+
+# Per disease: inputs to sweep as (name, label, feature column, low, high),
+# over the same ranges the app's inputs accept
+SWEEPS = {
+    "diabetes": [
+        ("bmi", "BMI (kg/m²)", 3, 10.0, 60.0),
+        ("hba1c", "HbA1c Level (%)", 4, 3.0, 15.0),
+        ("glucose", "Blood Glucose (mg/dL)", 5, 50.0, 300.0),
+        ("age", "Age (years)", 0, 1.0, 120.0),
+    ],
+    "heart": [
+        ("systolic_bp", "Systolic BP (mmHg)", 5, 80.0, 200.0),
+        ("weight", "Weight (kg)", 4, 30.0, 200.0),
+        ("diastolic_bp", "Diastolic BP (mmHg)", 6, 50.0, 120.0),
+        ("age", "Age (years)", 1, 1.0, 120.0),
+    ],
+}
+
+# Heart feature columns for height (cm), weight (kg) and the BMI derived from them
+HEART_HEIGHT_COLUMN = 3
+HEART_WEIGHT_COLUMN = 4
+HEART_BMI_COLUMN = 12
+
+
+def sweep_grid(disease, features, sweeps=None, points=DEFAULT_POINTS):
+    """
+    Expand one patient's feature row into a grid varying one input at a time.
+
+    Each sweep contributes ``points`` copies of the row with its column set
+    to evenly spaced values over its range. For heart, BMI is recomputed
+    from height and weight on every row, so sweeping weight moves BMI too.
+
+    Args:
+        disease: "diabetes" or "heart"
+        features: Feature array of shape (1, n_features) from build_*_features()
+        sweeps: Sweep names to include; defaults to all of the disease's sweeps
+        points: Values per sweep
+
+    Returns:
+        tuple: (grid, specs, values) where grid has len(specs) * points rows,
+            specs are the SWEEPS entries used and values is (len(specs), points)
+    """
+    specs = [spec for spec in SWEEPS[disease] if sweeps is None or spec[0] in sweeps]
+    row = np.asarray(features, dtype=np.float64).reshape(1, -1)
+    values = np.array([np.linspace(low, high, points) for _, _, _, low, high in specs])
+    grid = np.repeat(row, len(specs) * points, axis=0)
+    for i, (_, _, column, _, _) in enumerate(specs):
+        grid[i * points:(i + 1) * points, column] = values[i]
+    if disease == "heart":
+        height_m = grid[:, HEART_HEIGHT_COLUMN] / 100
+        grid[:, HEART_BMI_COLUMN] = grid[:, HEART_WEIGHT_COLUMN] / height_m ** 2
+    return grid, specs, values
+
+
+def risk_curves(model, disease, features, scaler=None, sweeps=None, points=DEFAULT_POINTS):
+    """
+    Compute how predicted risk changes as each input varies with the others held fixed.
+
+    The whole grid goes through a single predict_risk call (one scaler
+    transform and one predict_proba), along with the patient's own row.
+
+    Args:
+        model: Loaded classifier, usually the compiled model from the registry
+        disease: "diabetes" or "heart"
+        features: Feature array of shape (1, n_features) from build_*_features()
+        scaler: Scaler for an uncompiled model, or None
+        sweeps: Sweep names to include; defaults to all of the disease's sweeps
+        points: Values per sweep
+
+    Returns:
+        list: One Curve per sweep, with probabilities in [0, 1]
+    """
+    with stage_timer("risk_curves"):
+        grid, specs, values = sweep_grid(disease, features, sweeps=sweeps, points=points)
+        row = np.asarray(features, dtype=np.float64).reshape(1, -1)
+        probabilities = predict_risk(model, scaler, np.vstack([grid, row])).probabilities
+        current_probability = float(probabilities[-1])
+        return [
+            Curve(
+                name=name,
+                label=label,
+                values=values[i],
+                probabilities=probabilities[i * points:(i + 1) * points],
+                current_value=float(row[0, column]),
+                current_probability=current_probability,
+            )
+            for i, (name, label, column, _, _) in enumerate(specs)
+        ]